@@ -0,0 +1,57 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.core import startup, offload
+from app.core.config import settings
+from app.core.loop_monitor import loop_monitor
+from app.core.rate_limit import admission
+from app.models.base import get_pool_metrics
+from app.services import book_service, market_cache
+
+router = APIRouter()
+
+def _pool_exhausted(pool: dict) -> bool:
+    """Все соединения пула выданы, новые запросы будут ждать"""
+    return pool["checked_out"] >= pool["size"] + max(pool["max_overflow"], 0)
+
+@router.get("/live")
+async def liveness():
+    """Проба живости: цикл событий обработал запрос.
+    Заблокированный цикл не ответит вовсе, и оркестратор перезапустит процесс."""
+    return {"status": "alive", "loop": loop_monitor.metrics()}
+
+@router.get("/ready")
+async def readiness():
+    """Проба готовности: 503, пока идет прогрев, цикл событий отстает,
+    исчерпан пул соединений или достигнут лимит одновременных запросов.
+    Не обращается к БД, поэтому отвечает сразу."""
+    pool = get_pool_metrics()
+    checks = {
+        "warmed_up": startup.is_ready(),
+        "loop": loop_monitor.max_lag() <= settings.LOOP_LAG_THRESHOLD_SECONDS,
+        "db_pool": not _pool_exhausted(pool),
+        "admission": admission.max_inflight <= 0 or admission.inflight < admission.max_inflight,
+    }
+    ready = all(checks.values())
+    content = {
+        "status": "ready" if ready else "not_ready",
+        "checks": checks,
+        "loop": loop_monitor.metrics(),
+        "db_pool": {
+            "size": pool["size"],
+            "checked_out": pool["checked_out"],
+            "overflow": pool["overflow"],
+            "wait_seconds_max": pool["wait_seconds_max"],
+        },
+        "cache": {
+            "books_ready": book_service.is_ready(),
+            **book_service.stats(),
+            **market_cache.stats(),
+        },
+        "queue": {
+            "inflight_requests": admission.inflight,
+            "max_inflight": admission.max_inflight,
+            "writes_queued": offload.writes.queued(),
+            "reads_queued": offload.reads.queued(),
+        },
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=content)
@@ -1,12 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
 from sqlalchemy.orm import Session
+from typing import Optional
 from uuid import UUID
-from app.models.base import get_db
+from app.models.base import get_db, get_pool_metrics
 from app.core.security import verify_admin_key
+from app.core.rate_limit import admission
+from app.core.idempotency import run_idempotent
+from app.core import startup, offload
+from app.core.config import settings
 from app.schemas.user import User
-from app.schemas.instrument import Instrument
+from app.schemas.instrument import NewInstrument, InstrumentRules, InstrumentSpec
+from app.schemas.outbox import EventBatch
+from app.schemas.reconciliation import ReconciliationReport
 from app.schemas.balance import Body_deposit_api_v1_admin_balance_deposit_post, Body_withdraw_api_v1_admin_balance_withdraw_post
-from app.services import user_service, instrument_service, balance_service
+from app.services import user_service, instrument_service, balance_service, candle_service, book_service, outbox_service
 import logging
 
 router = APIRouter()
@@ -20,11 +27,11 @@ async def delete_user(
     """Удаление пользователя"""
     logger = logging.getLogger(__name__)
     logger.info(f"[VALIDATION] Received user deletion request: user_id={user_id}")
-    return await user_service.delete_user(db, user_id)
+    return await offload.run_write(user_service.delete_user, db, user_id)
 
 @router.post("/instrument")
 async def add_instrument(
-    instrument: Instrument,
+    instrument: NewInstrument,
     _: bool = Depends(verify_admin_key),
     db: Session = Depends(get_db)
 ):
@@ -32,7 +39,7 @@ async def add_instrument(
     logger = logging.getLogger(__name__)
     logger.info(f"[VALIDATION] Received instrument data: ticker={instrument.ticker}, name={instrument.name}")
     try:
-        return await instrument_service.add_instrument(db, instrument)
+        return await offload.run_write(instrument_service.add_instrument, db, instrument)
     except HTTPException as e:
         logger.error(f"[VALIDATION] Failed to add instrument: {e.detail}")
         raise
@@ -49,36 +56,142 @@ async def delete_instrument(
     """Удаление инструмента"""
     logger = logging.getLogger(__name__)
     logger.info(f"[VALIDATION] Received instrument deletion request: ticker={ticker}")
-    return await instrument_service.delete_instrument(db, ticker)
+    return await offload.run_write(instrument_service.delete_instrument, db, ticker)
+
+@router.patch("/instrument/{ticker}", response_model=InstrumentSpec)
+async def update_instrument_rules(
+    ticker: str,
+    rules: InstrumentRules,
+    _: bool = Depends(verify_admin_key),
+    db: Session = Depends(get_db)
+):
+    """Изменение шага цены, размера лота и диапазона цены инструмента"""
+    logger = logging.getLogger(__name__)
+    logger.info(f"[VALIDATION] Received instrument rules update: ticker={ticker}")
+    return await offload.run_write(instrument_service.update_instrument_rules, db, ticker, rules)
 
 @router.post("/balance/deposit")
 async def deposit(
     deposit_data: Body_deposit_api_v1_admin_balance_deposit_post,
+    response: Response,
     _: bool = Depends(verify_admin_key),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """Пополнение баланса пользователя"""
     logger = logging.getLogger(__name__)
     logger.info(f"[VALIDATION] Received deposit data: user_id={deposit_data.user_id}, ticker={deposit_data.ticker}, amount={deposit_data.amount}")
-    return await balance_service.deposit(
-        db,
-        user_id=deposit_data.user_id,
-        ticker=deposit_data.ticker,
-        amount=deposit_data.amount
+    result, replayed = await run_idempotent(
+        ("admin", "deposit"),
+        idempotency_key,
+        deposit_data.model_dump(mode="json"),
+        lambda remember: offload.run_write(
+            balance_service.deposit,
+            db,
+            deposit_data.user_id,
+            deposit_data.ticker,
+            deposit_data.amount
+        )
     )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
 @router.post("/balance/withdraw")
 async def withdraw(
     withdraw_data: Body_withdraw_api_v1_admin_balance_withdraw_post,
+    response: Response,
     _: bool = Depends(verify_admin_key),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """Списание с баланса пользователя"""
     logger = logging.getLogger(__name__)
     logger.info(f"[VALIDATION] Received withdraw data: user_id={withdraw_data.user_id}, ticker={withdraw_data.ticker}, amount={withdraw_data.amount}")
-    return await balance_service.withdraw(
-        db,
-        user_id=withdraw_data.user_id,
-        ticker=withdraw_data.ticker,
-        amount=withdraw_data.amount
-    ) 
\ No newline at end of file
+    result, replayed = await run_idempotent(
+        ("admin", "withdraw"),
+        idempotency_key,
+        withdraw_data.model_dump(mode="json"),
+        lambda remember: offload.run_write(
+            balance_service.withdraw,
+            db,
+            withdraw_data.user_id,
+            withdraw_data.ticker,
+            withdraw_data.amount
+        )
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result 
+
+@router.post("/candles/backfill")
+async def backfill_candles(
+    ticker: Optional[str] = None,
+    _: bool = Depends(verify_admin_key),
+    db: Session = Depends(get_db)
+):
+    """Пересчет свечей по истории сделок"""
+    logger = logging.getLogger(__name__)
+    logger.info(f"[VALIDATION] Received candles backfill request: ticker={ticker}")
+    await offload.run_write(candle_service.backfill_candles, db, ticker)
+    return {"success": True}
+
+@router.get("/events", response_model=EventBatch)
+async def get_events(
+    after: int = 0,
+    limit: int = 100,
+    _: bool = Depends(verify_admin_key),
+    db: Session = Depends(get_db)
+):
+    """Лента изменений: события ордеров, сделок и балансов после курсора after.
+    Читается из основной БД в пуле чтений, чтобы не блокировать цикл событий"""
+    return await offload.run_read(outbox_service.get_events, db, after, limit)
+
+@router.get("/reconciliation", response_model=ReconciliationReport)
+async def get_reconciliation_report(_: bool = Depends(verify_admin_key)):
+    """Отчет фоновой сверки: курсор, статистика и найденные расхождения"""
+    from app.services import reconciliation_service
+    return reconciliation_service.get_report()
+
+@router.post("/reconciliation/run", response_model=ReconciliationReport)
+async def run_reconciliation(
+    _: bool = Depends(verify_admin_key),
+    db: Session = Depends(get_db)
+):
+    """Внеочередной запуск сверки"""
+    from app.services import reconciliation_service
+    await offload.run_write(reconciliation_service.reconcile, db)
+    return reconciliation_service.get_report()
+
+@router.post("/snapshot")
+async def take_snapshot(
+    _: bool = Depends(verify_admin_key),
+    db: Session = Depends(get_db)
+):
+    """Внеочередной снимок стаканов, например перед плановым переключением"""
+    from app.services import snapshot_service
+    if not settings.SNAPSHOT_PATH:
+        raise HTTPException(status_code=400, detail="Снимки стаканов не настроены")
+    if not book_service.is_ready():
+        raise HTTPException(status_code=503, detail="Стаканы еще не загружены")
+    return await snapshot_service.take_snapshot(db)
+
+@router.get("/metrics")
+async def get_metrics(_: bool = Depends(verify_admin_key)):
+    """Служебные метрики сервиса"""
+    from app.services import snapshot_service
+    return {
+        "startup": startup.metrics(),
+        "books": {
+            "ready": book_service.is_ready(),
+            **book_service.load_metrics()
+        },
+        "db_pool": get_pool_metrics(),
+        "offload": offload.metrics(),
+        "snapshot": snapshot_service.metrics(),
+        "admission": {
+            "inflight": admission.inflight,
+            "max_inflight": admission.max_inflight,
+            "rejected": admission.rejected
+        }
+    }
\ No newline at end of file
@@ -1,31 +1,83 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import List
-from app.models.base import get_db
+from app.models.base import get_db, get_read_db, prefer_primary
 from app.core.security import create_api_key
+from app.core.rate_limit import ip_rate_limit
+from app.core import offload
+from app.core.config import settings
+from app.core.serialization import wants_msgpack, JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE
 from app.schemas.user import NewUser, User
-from app.schemas.instrument import Instrument, L2OrderBook
+from app.schemas.instrument import Instrument, InstrumentSpec, L2OrderBook, Ticker
 from app.schemas.transaction import Transaction
-from app.services import user_service, instrument_service, order_service
+from app.schemas.candle import Candle
+from app.services import (
+    user_service, instrument_service, order_service, candle_service, ticker_service, transaction_service, market_cache
+)
 
 router = APIRouter()
 
-@router.post("/register", response_model=User)
+@router.post("/register", response_model=User, dependencies=[Depends(ip_rate_limit(10))])
 async def register(user_data: NewUser, db: Session = Depends(get_db)):
     """Регистрация нового пользователя"""
-    return await user_service.create_user(db, user_data)
+    return await offload.run_write(user_service.create_user, db, user_data)
 
-@router.get("/instrument", response_model=List[Instrument])
-async def list_instruments(db: Session = Depends(get_db)):
+@router.get("/instrument", response_model=List[Instrument], dependencies=[Depends(ip_rate_limit(1))])
+async def list_instruments(request: Request, db: Session = Depends(get_read_db)):
     """Получение списка доступных инструментов"""
-    return await instrument_service.get_instruments(db)
+    return await market_cache.conditional_response(
+        request,
+        market_cache.etag(market_cache.INSTRUMENTS),
+        lambda: offload.run_read(
+            instrument_service.get_instruments_json, prefer_primary(db, market_cache.INSTRUMENTS)
+        )
+    )
 
-@router.get("/orderbook/{ticker}", response_model=L2OrderBook)
-async def get_orderbook(ticker: str, limit: int = 10, db: Session = Depends(get_db)):
-    """Получение стакана заявок"""
-    return await order_service.get_orderbook(db, ticker, limit)
+@router.get("/instrument/{ticker}", response_model=InstrumentSpec, dependencies=[Depends(ip_rate_limit(1))])
+async def get_instrument(ticker: str, db: Session = Depends(get_read_db)):
+    """Торговые параметры инструмента: шаг цены, размер лота и диапазон цены"""
+    return await offload.run_read(
+        instrument_service.get_instrument_spec, prefer_primary(db, market_cache.INSTRUMENTS), ticker
+    )
 
-@router.get("/transactions/{ticker}", response_model=List[Transaction])
-async def get_transaction_history(ticker: str, limit: int = 10, db: Session = Depends(get_db)):
-    """Получение истории сделок"""
-    return await order_service.get_transaction_history(db, ticker, limit) 
\ No newline at end of file
+@router.get("/ticker", response_model=List[Ticker], dependencies=[Depends(ip_rate_limit(1))])
+async def list_tickers(db: Session = Depends(get_read_db)):
+    """Сводка по всем инструментам за 24 часа"""
+    return await offload.run_read(ticker_service.get_tickers, db)
+
+@router.get("/orderbook/{ticker}", response_model=L2OrderBook, dependencies=[Depends(ip_rate_limit(2))])
+async def get_orderbook(request: Request, ticker: str, limit: int = 10, db: Session = Depends(get_read_db)):
+    """Получение стакана заявок (JSON или MessagePack по заголовку Accept)"""
+    compact = wants_msgpack(request)
+    if compact:
+        serialize = order_service.get_orderbook_msgpack
+    elif settings.FAST_JSON_RESPONSES:
+        serialize = order_service.get_orderbook_json
+    else:
+        serialize = order_service.get_orderbook_model_json
+    return await market_cache.conditional_response(
+        request,
+        market_cache.etag(market_cache.orderbook_resource(ticker), limit, *(["msgpack"] if compact else [])),
+        lambda: offload.run_read(serialize, prefer_primary(db, market_cache.orderbook_resource(ticker)), ticker, limit),
+        MSGPACK_MEDIA_TYPE if compact else JSON_MEDIA_TYPE
+    )
+
+@router.get("/transactions/{ticker}", response_model=List[Transaction], dependencies=[Depends(ip_rate_limit(2))])
+async def get_transaction_history(request: Request, ticker: str, limit: int = 10, db: Session = Depends(get_read_db)):
+    """Получение истории сделок (JSON или MessagePack по заголовку Accept)"""
+    compact = wants_msgpack(request)
+    return await market_cache.conditional_response(
+        request,
+        market_cache.etag(market_cache.transactions_resource(ticker), limit, *(["msgpack"] if compact else [])),
+        lambda: offload.run_read(
+            transaction_service.get_transaction_history_msgpack if compact
+            else transaction_service.get_transaction_history_json,
+            prefer_primary(db, market_cache.transactions_resource(ticker)), ticker, limit
+        ),
+        MSGPACK_MEDIA_TYPE if compact else JSON_MEDIA_TYPE
+    )
+
+@router.get("/candles/{ticker}", response_model=List[Candle], dependencies=[Depends(ip_rate_limit(2))])
+async def get_candles(ticker: str, interval: str = "1m", limit: int = 100, db: Session = Depends(get_read_db)):
+    """Получение свечей OHLCV"""
+    return await offload.run_read(candle_service.get_candles, db, ticker, interval, limit)
\ No newline at end of file
@@ -1,32 +1,81 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response
 from sqlalchemy.orm import Session
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Optional
+from datetime import datetime
 from uuid import UUID
-from app.models.base import get_db
+from app.models.base import get_db, get_read_db, prefer_primary
 from app.core.security import verify_api_key
+from app.core.rate_limit import user_rate_limit
+from app.core.idempotency import run_idempotent
+from app.core import offload, startup
+from app.core.config import settings
+from app.core.serialization import json_response, msgpack_response, packb, wants_msgpack, NegotiatedRoute
 from app.schemas.order import (
     LimitOrderBody, MarketOrderBody, CreateOrderResponse,
-    LimitOrder, MarketOrder
+    LimitOrder, MarketOrder, AmendOrderBody
 )
-from app.schemas.balance import BalanceResponse
-from app.services import order_service, balance_service
+from app.schemas.portfolio import Portfolio
+from app.schemas.transaction import Fill
+from app.services import order_service, balance_service, portfolio_service, transaction_service
 import logging
 
-router = APIRouter()
+# Тела запросов принимаются в JSON или MessagePack
+router = APIRouter(route_class=NegotiatedRoute)
 
-@router.get("/balance", response_model=Dict[str, int])
+def get_user_read_db(
+    user_id: UUID = Depends(verify_api_key),
+    db: Session = Depends(get_read_db)
+) -> Session:
+    """Сессия чтения: после недавней записи пользователь читает из основной БД"""
+    return prefer_primary(db, user_id)
+
+@router.get("/balance", response_model=Dict[str, int], dependencies=[Depends(user_rate_limit(1))])
 async def get_balances(
     user_id: UUID = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_read_db)
 ):
     """Получение балансов пользователя"""
-    return await balance_service.get_user_balances(db, user_id)
+    if settings.FAST_JSON_RESPONSES:
+        return json_response(await offload.run_read(balance_service.get_user_balances_json, db, user_id))
+    return await offload.run_read(balance_service.get_user_balances, db, user_id)
+
+@router.get("/portfolio", response_model=Portfolio, dependencies=[Depends(user_rate_limit(1))])
+async def get_portfolio(
+    user_id: UUID = Depends(verify_api_key),
+    db: Session = Depends(get_user_read_db)
+):
+    """Оценка портфеля по текущим ценам с учетом резерва под заявки"""
+    return await offload.run_read(portfolio_service.get_portfolio, db, user_id)
+
+@router.get("/fills", response_model=List[Fill], dependencies=[Depends(user_rate_limit(1))])
+async def get_fills(
+    request: Request,
+    ticker: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 100,
+    user_id: UUID = Depends(verify_api_key),
+    db: Session = Depends(get_user_read_db)
+):
+    """Сделки пользователя за период, новые первыми"""
+    if wants_msgpack(request):
+        return msgpack_response(await offload.run_read(
+            transaction_service.get_fills_msgpack, db, user_id, ticker, since, until, limit
+        ))
+    if settings.FAST_JSON_RESPONSES:
+        return json_response(await offload.run_read(
+            transaction_service.get_fills_json, db, user_id, ticker, since, until, limit
+        ))
+    return await offload.run_read(transaction_service.get_fills, db, user_id, ticker, since, until, limit)
 
-@router.post("/order", response_model=CreateOrderResponse)
+@router.post("/order", response_model=CreateOrderResponse, dependencies=[Depends(startup.require_ready), Depends(user_rate_limit(5))])
 async def create_order(
     order: Union[LimitOrderBody, MarketOrderBody],
+    request: Request,
+    response: Response,
     user_id: UUID = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """Создание ордера"""
     logger = logging.getLogger(__name__)
@@ -34,7 +83,18 @@ async def create_order(
     logger.debug(f"Creating order. User ID: {user_id}")
     logger.debug(f"Order data: {order}")
     try:
-        return await order_service.create_order(db, user_id, order)
+        result, replayed = await run_idempotent(
+            (user_id, "order"),
+            idempotency_key,
+            order.model_dump(mode="json"),
+            lambda remember: offload.run_write(order_service.create_order, db, user_id, order, remember)
+        )
+        if replayed:
+            logger.info(f"Idempotent replay of order creation: user={user_id}, key={idempotency_key}")
+            response.headers["Idempotent-Replayed"] = "true"
+        if wants_msgpack(request):
+            return msgpack_response(packb(result.model_dump()), response)
+        return result
     except HTTPException as e:
         logger.error(f"Failed to create order: {e.detail}")
         raise
@@ -42,28 +102,56 @@ async def create_order(
         logger.error(f"Unexpected error: {str(e)}")
         raise HTTPException(status_code=400, detail="Ошибка при создании ордера")
 
-@router.get("/order", response_model=List[Union[LimitOrder, MarketOrder]])
+@router.get("/order", response_model=List[Union[LimitOrder, MarketOrder]], dependencies=[Depends(user_rate_limit(1))])
 async def list_orders(
+    request: Request,
     user_id: UUID = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_read_db)
 ):
     """Получение списка активных ордеров пользователя"""
-    return await order_service.get_user_orders(db, user_id)
+    if wants_msgpack(request):
+        return msgpack_response(await offload.run_read(order_service.get_user_orders_msgpack, db, user_id))
+    if settings.FAST_JSON_RESPONSES:
+        return json_response(await offload.run_read(order_service.get_user_orders_json, db, user_id))
+    return await offload.run_read(order_service.get_user_orders, db, user_id)
 
-@router.get("/order/{order_id}", response_model=Union[LimitOrder, MarketOrder])
+@router.get("/order/{order_id}", response_model=Union[LimitOrder, MarketOrder], dependencies=[Depends(user_rate_limit(1))])
 async def get_order(
     order_id: UUID,
     user_id: UUID = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_read_db)
 ):
     """Получение информации об ордере"""
-    return await order_service.get_order(db, order_id, user_id)
+    return await offload.run_read(order_service.get_order, db, order_id, user_id)
+
+@router.patch("/order/{order_id}", response_model=CreateOrderResponse, dependencies=[Depends(startup.require_ready), Depends(user_rate_limit(5))])
+async def amend_order(
+    order_id: UUID,
+    amendment: AmendOrderBody,
+    request: Request,
+    response: Response,
+    user_id: UUID = Depends(verify_api_key),
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Изменение объема или цены ордера"""
+    result, replayed = await run_idempotent(
+        (user_id, "amend", order_id),
+        idempotency_key,
+        amendment.model_dump(mode="json"),
+        lambda remember: offload.run_write(order_service.amend_order, db, order_id, user_id, amendment, remember)
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    if wants_msgpack(request):
+        return msgpack_response(packb(result.model_dump()), response)
+    return result
 
-@router.delete("/order/{order_id}")
+@router.delete("/order/{order_id}", dependencies=[Depends(startup.require_ready), Depends(user_rate_limit(2))])
 async def cancel_order(
     order_id: UUID,
     user_id: UUID = Depends(verify_api_key),
     db: Session = Depends(get_db)
 ):
     """Отмена ордера"""
-    return await order_service.cancel_order(db, order_id, user_id)
\ No newline at end of file
+    return await offload.run_write(order_service.cancel_order, db, order_id, user_id)
\ No newline at end of file
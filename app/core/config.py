@@ -4,13 +4,74 @@ from typing import Optional
 class Settings(BaseSettings):
     """Настройки приложения"""
     DATABASE_URL: str
+    # Реплика для чтения; если не задана, все запросы идут в основную БД
+    READ_DATABASE_URL: Optional[str] = None
+    # Сколько секунд после записи пользователь читает из основной БД (read-your-writes)
+    REPLICA_READ_YOUR_WRITES_SECONDS: float = 5.0
     SECRET_KEY: str
     ADMIN_API_KEY: str
     
+    # Пул соединений с БД
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800  # секунд, -1 - без пересоздания
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 500  # размер кэша скомпилированных запросов SQLAlchemy
+    # Потоков для чтений из БД вне цикла событий; 0 - сервисы выполняются в цикле событий.
+    # Изменения при включении выполняются в отдельном единственном потоке.
+    DB_OFFLOAD_THREADS: int = 0
+
+    # Файл снимка стаканов для быстрого перезапуска; пусто - снимки выключены
+    SNAPSHOT_PATH: str = ""
+    # Период записи снимка, секунд
+    SNAPSHOT_INTERVAL_SECONDS: int = 60
+    
+    # Бюджет времени запуска (импорт и инициализация до приема запросов), секунд
+    STARTUP_BUDGET_SECONDS: float = 2.0
+    
+    # Мониторинг задержки цикла событий: при превышении порога сервис не готов принимать трафик
+    LOOP_MONITOR_INTERVAL_SECONDS: float = 0.5
+    LOOP_LAG_THRESHOLD_SECONDS: float = 0.25
+    
     # Настройки SSL/TLS
     SSL_KEYFILE: Optional[str] = None
     SSL_CERTFILE: Optional[str] = None
     
+    # Архивирование завершенных ордеров и секционирование истории
+    ARCHIVE_RETENTION_DAYS: int = 30  # считается от завершения ордера
+    ARCHIVE_INTERVAL_SECONDS: int = 3600
+    ARCHIVE_BATCH_SIZE: int = 1000
+    PARTITION_MONTHS_AHEAD: int = 3
+    OUTBOX_RETENTION_DAYS: int = 7
+    
+    # Периодическая сверка балансов, ордеров и стаканов по ленте событий
+    RECONCILE_INTERVAL_SECONDS: int = 60
+    
+    # Быстрая сериализация ответов горячих GET-запросов без Pydantic
+    FAST_JSON_RESPONSES: bool = False
+    
+    # Ограничение частоты запросов (token bucket) и контроль допуска
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_RATE: float = 50.0  # токенов в секунду на пользователя или IP
+    RATE_LIMIT_BURST: float = 100.0
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    MAX_INFLIGHT_REQUESTS: int = 256  # 0 - без ограничения
+    
+    # Время жизни микрокэша публичных рыночных данных (секунды)
+    MARKET_CACHE_TTL: float = 1.0
+    
+    # Предотвращение сделок с самим собой: CANCEL_NEWEST, CANCEL_OLDEST, DECREMENT_BOTH
+    SELF_TRADE_PREVENTION: str = "CANCEL_OLDEST"
+    # Сколько встречных ордеров читается из БД за один запрос при исполнении
+    MATCH_BATCH_SIZE: int = 100
+    # Максимум активных ордеров одного пользователя; 0 - без ограничения
+    MAX_OPEN_ORDERS_PER_USER: int = 0
+    
+    # Ключи идемпотентности (заголовок Idempotency-Key)
+    IDEMPOTENCY_TTL_SECONDS: float = 86400.0
+    IDEMPOTENCY_MAX_KEYS: int = 100000
+    
     class Config:
         env_file = ".env"
 
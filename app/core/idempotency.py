@@ -0,0 +1,112 @@
+from collections import OrderedDict
+from fastapi import HTTPException
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import hashlib
+import json
+import threading
+import time
+from app.core.config import settings
+from app.core.single_flight import SingleFlight
+
+# Максимальная длина ключа идемпотентности
+MAX_KEY_LENGTH = 255
+
+class IdempotencyStore:
+    """Хранилище результатов операций по ключу идемпотентности.
+    Размер ограничен вытеснением самых старых записей, записи живут ttl секунд.
+    Результат может сохраняться из потока записи, поэтому записи защищены блокировкой."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (expires_at, fingerprint, result)
+        self._entries: "OrderedDict[Tuple, Tuple[float, str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Выполняющиеся операции: key -> fingerprint и их объединение по ключу
+        self._fingerprints: Dict[Tuple, str] = {}
+        self._inflight = SingleFlight()
+
+    def get(self, key: Tuple) -> Optional[Tuple[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[1], entry[2]
+
+    def put(self, key: Tuple, fingerprint: str, result: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, fingerprint, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def run(
+        self,
+        key: Tuple,
+        fingerprint: str,
+        operation: Callable[[Callable[[Any], None]], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """Выполнение операции не более одного раза на ключ.
+        Операция получает функцию remember: результат, переданный в нее, сохраняется сразу,
+        и повтор вернет его, даже если дальше операция завершится ошибкой.
+        Возвращает результат и признак того, что он взят из хранилища или чужой попытки."""
+        cached = self.get(key)
+        if cached is not None:
+            _check_fingerprint(cached[0], fingerprint)
+            return cached[1], True
+
+        pending = self._fingerprints.get(key)
+        if pending is not None:
+            _check_fingerprint(pending, fingerprint)
+            return await self._inflight.wait(key), True
+
+        def remember(result: Any):
+            self.put(key, fingerprint, result)
+
+        self._fingerprints[key] = fingerprint
+        try:
+            # Неуспешные попытки без remember не сохраняются: клиент может повторить запрос
+            result = await self._inflight.run(key, lambda: operation(remember))
+        finally:
+            del self._fingerprints[key]
+        self.put(key, fingerprint, result)
+        return result, False
+
+store = IdempotencyStore(
+    ttl=settings.IDEMPOTENCY_TTL_SECONDS,
+    max_entries=settings.IDEMPOTENCY_MAX_KEYS
+)
+
+def _fingerprint(payload: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+def _check_fingerprint(expected: str, actual: str):
+    if expected != actual:
+        raise HTTPException(
+            status_code=422,
+            detail="Ключ идемпотентности уже использован с другими параметрами"
+        )
+
+async def run_idempotent(
+    scope: Tuple,
+    idempotency_key: Optional[str],
+    payload: Any,
+    operation: Callable[[Callable[[Any], None]], Awaitable[Any]]
+) -> Tuple[Any, bool]:
+    """Выполнение операции не более одного раза на ключ в пределах scope.
+    Повтор с тем же ключом и теми же параметрами возвращает сохраненный результат,
+    одновременный повтор дожидается первой попытки.
+    operation получает функцию remember для сохранения результата до завершения
+    (например, сразу после фиксации ордера, до его исполнения).
+    Возвращает результат и признак того, что он взят из хранилища."""
+    if idempotency_key is None:
+        return await operation(lambda result: None), False
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Неверный ключ идемпотентности")
+
+    return await store.run((*scope, idempotency_key), _fingerprint(payload), operation)
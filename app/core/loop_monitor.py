@@ -0,0 +1,47 @@
+from collections import deque
+from typing import Deque, Dict, Optional
+import asyncio
+import logging
+import time
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class LoopLagMonitor:
+    """Замер задержки цикла событий: фоновая задача засыпает на interval
+    и измеряет, насколько позже она проснулась. Задержка растет, когда
+    цикл заблокирован синхронными вызовами (например, к БД)."""
+
+    def __init__(self, interval: float, window: int = 20):
+        self.interval = interval
+        self.lag = 0.0
+        self.last_tick: Optional[float] = None
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self.lag = max(0.0, now - started - self.interval)
+            self.last_tick = now
+            self._samples.append(self.lag)
+            if self.lag > settings.LOOP_LAG_THRESHOLD_SECONDS:
+                logger.warning(f"[HEALTH] Event loop lag {self.lag * 1000:.1f}ms")
+
+    def max_lag(self) -> float:
+        """Максимальная задержка за окно последних замеров, включая текущую паузу:
+        если монитор давно не просыпался, цикл заблокирован прямо сейчас"""
+        stalled = 0.0
+        if self.last_tick is not None:
+            stalled = max(0.0, time.perf_counter() - self.last_tick - self.interval)
+        return max([stalled, *self._samples])
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "lag_ms": round(self.lag * 1000, 3),
+            "max_lag_ms": round(self.max_lag() * 1000, 3),
+            "interval_ms": round(self.interval * 1000, 3),
+        }
+
+loop_monitor = LoopLagMonitor(interval=settings.LOOP_MONITOR_INTERVAL_SECONDS)
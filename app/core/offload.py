@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import threading
+import time
+from app.core.config import settings
+
+class OffloadPool:
+    """Ограниченный пул потоков для синхронной работы с БД.
+    Каждый рабочий поток держит собственный цикл событий, в котором
+    выполняются async-функции сервисов: они не ожидают ничего, кроме
+    синхронных вызовов SQLAlchemy, поэтому блокируют только свой поток."""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.active = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+        self.run_seconds_max = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_workers > 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    def _thread_loop(self) -> asyncio.AbstractEventLoop:
+        loop = getattr(self._local, "loop", None)
+        if loop is None:
+            loop = self._local.loop = asyncio.new_event_loop()
+        return loop
+
+    def _run(self, submitted_at: float, func: Callable[..., Awaitable[Any]], args: tuple) -> Any:
+        started = time.perf_counter()
+        with self._lock:
+            self.active += 1
+            wait = started - submitted_at
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        try:
+            result = self._thread_loop().run_until_complete(func(*args))
+        except BaseException:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self.run_seconds_total += elapsed
+                self.run_seconds_max = max(self.run_seconds_max, elapsed)
+        return result
+
+    async def run(self, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        """Выполнение async-функции сервиса в пуле. Если пул выключен
+        (0 потоков), функция выполняется в текущем цикле событий, как раньше."""
+        if not self.enabled:
+            return await func(*args)
+        with self._lock:
+            self.submitted += 1
+        return await asyncio.get_running_loop().run_in_executor(
+            self._get_executor(), self._run, time.perf_counter(), func, args
+        )
+
+    def queued(self) -> int:
+        return self.submitted - self.completed - self.active
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "workers": self.max_workers,
+            "active": self.active,
+            "queued": self.queued(),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "wait_seconds_avg": round(self.wait_seconds_total / self.completed, 6) if self.completed else 0.0,
+            "run_seconds_max": round(self.run_seconds_max, 6),
+            "run_seconds_avg": round(self.run_seconds_total / self.completed, 6) if self.completed else 0.0,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+# Чтения: параллельные запросы перекрывают ожидание БД
+reads = OffloadPool("db-read", settings.DB_OFFLOAD_THREADS)
+# Изменения (исполнение ордеров, балансы, инструменты) выполняются по одному в единственном
+# потоке: так они остаются последовательными, как при выполнении в цикле событий
+writes = OffloadPool("db-write", 1 if settings.DB_OFFLOAD_THREADS > 0 else 0)
+
+async def run_read(func: Callable[..., Awaitable[Any]], *args) -> Any:
+    """Выполнение чтения из БД в пуле чтений"""
+    return await reads.run(func, *args)
+
+async def run_write(func: Callable[..., Awaitable[Any]], *args) -> Any:
+    """Выполнение изменения в потоке записи"""
+    return await writes.run(func, *args)
+
+def metrics() -> Dict[str, Dict[str, float]]:
+    return {"reads": reads.metrics(), "writes": writes.metrics()}
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from fastapi import Depends, HTTPException, Request
+from uuid import UUID
+import json
+import math
+import time
+from app.core.config import settings
+from app.core.security import verify_api_key
+
+class TokenBucket:
+    """Корзина токенов: пополняется со скоростью rate, вмещает не более burst"""
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+class RateLimiter:
+    """Ограничитель частоты запросов по ключу (пользователь или IP).
+    Проверка стоит O(1): корзина пополняется лениво при обращении,
+    число ключей ограничено вытеснением давно не использованных."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[object, TokenBucket]" = OrderedDict()
+
+    def acquire(self, key, cost: float = 1) -> float:
+        """Списание cost токенов. Возвращает 0 при успехе,
+        иначе время в секундах до накопления нужного количества токенов."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.burst, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            return 0.0
+        return (cost - bucket.tokens) / self.rate
+
+limiter = RateLimiter(
+    rate=settings.RATE_LIMIT_RATE,
+    burst=settings.RATE_LIMIT_BURST,
+    max_keys=settings.RATE_LIMIT_MAX_KEYS
+)
+
+# Зависимости объявлены как async, чтобы проверка выполнялась в цикле событий,
+# а не в пуле потоков: структуры ограничителя не потокобезопасны
+def _check(key, cost: float):
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    retry_after = limiter.acquire(key, cost)
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Слишком много запросов",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+def user_rate_limit(cost: float = 1):
+    """Зависимость: лимит по пользователю из API ключа с весом маршрута cost"""
+    async def dependency(user_id: UUID = Depends(verify_api_key)):
+        _check(user_id, cost)
+    return dependency
+
+def ip_rate_limit(cost: float = 1):
+    """Зависимость: лимит по IP-адресу клиента для публичных маршрутов"""
+    async def dependency(request: Request):
+        _check(request.client.host if request.client else None, cost)
+    return dependency
+
+class AdmissionController:
+    """Глобальный контроль допуска: учет одновременно обрабатываемых запросов"""
+
+    def __init__(self, max_inflight: int):
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.rejected = 0
+
+    def try_enter(self) -> bool:
+        if self.max_inflight > 0 and self.inflight >= self.max_inflight:
+            self.rejected += 1
+            return False
+        self.inflight += 1
+        return True
+
+    def leave(self):
+        self.inflight -= 1
+
+admission = AdmissionController(max_inflight=settings.MAX_INFLIGHT_REQUESTS)
+
+_OVERLOAD_BODY = json.dumps(
+    {"detail": "Сервис перегружен, повторите запрос позже"}, ensure_ascii=False
+).encode()
+
+# Пробы живости и готовности не проходят контроль допуска и не учитываются в inflight:
+# под нагрузкой проба живости не должна получать 429, а готовность - учитывать саму себя
+EXEMPT_PATH_PREFIX = "/health/"
+
+class AdmissionControlMiddleware:
+    """ASGI middleware: при превышении лимита одновременных запросов новые
+    сразу получают 429, не занимая очередь обработчиков и соединения с БД."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PATH_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        if not admission.try_enter():
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(_OVERLOAD_BODY)).encode()),
+                    (b"retry-after", b"1"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": _OVERLOAD_BODY})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.leave()
@@ -0,0 +1,117 @@
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Callable, Optional
+from uuid import UUID
+import msgpack
+import orjson
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# Встречающиеся на практике варианты типа MessagePack
+_MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+def dumps(content) -> bytes:
+    """Сериализация в компактный JSON (тот же формат, что у JSONResponse)"""
+    return orjson.dumps(content)
+
+def json_response(content: bytes) -> Response:
+    """Ответ с уже сериализованным JSON.
+    Минует повторную валидацию по response_model, схема в OpenAPI остается прежней."""
+    return Response(content=content, media_type=JSON_MEDIA_TYPE)
+
+def _datetime_ns(value: datetime) -> int:
+    """Время в наносекундах Unix epoch; время без часового пояса считается UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+
+def _msgpack_default(value):
+    if isinstance(value, UUID):
+        return value.bytes
+    if isinstance(value, datetime):
+        return _datetime_ns(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Cannot serialize {type(value).__name__} to MessagePack")
+
+def packb(content) -> bytes:
+    """Сериализация в MessagePack: те же поля, что в JSON, но UUID - 16 байт bin,
+    время - целое число наносекунд Unix epoch (UTC)"""
+    return msgpack.packb(content, default=_msgpack_default)
+
+def msgpack_response(content: bytes, response: Optional[Response] = None) -> Response:
+    """Ответ с уже сериализованным MessagePack.
+    Заголовки, выставленные обработчиком в response, переносятся в ответ."""
+    headers = dict(response.headers) if response is not None else None
+    if headers:
+        headers.pop("content-length", None)
+    return Response(content=content, media_type=MSGPACK_MEDIA_TYPE, headers=headers)
+
+def _is_msgpack(media_type: str) -> bool:
+    return media_type.split(";", 1)[0].strip().lower() in _MSGPACK_MEDIA_TYPES
+
+# Типы в Accept, под которые подходит ответ JSON
+_JSON_ACCEPT_TYPES = (JSON_MEDIA_TYPE, "application/*", "*/*")
+
+def _quality(params: str) -> float:
+    """Вес q из параметров типа в Accept; некорректный вес исключает тип"""
+    for param in params.split(";"):
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return min(max(float(value), 0.0), 1.0)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+def wants_msgpack(request: Request) -> bool:
+    """Клиент предпочитает MessagePack по заголовку Accept: вес MessagePack больше нуля
+    и не меньше веса JSON (при равных весах выбирается явно названный MessagePack)"""
+    msgpack_quality = json_quality = 0.0
+    for item in request.headers.get("accept", "").split(","):
+        media_type, _, params = item.partition(";")
+        media_type = media_type.strip().lower()
+        if media_type in _MSGPACK_MEDIA_TYPES:
+            msgpack_quality = max(msgpack_quality, _quality(params))
+        elif media_type in _JSON_ACCEPT_TYPES:
+            json_quality = max(json_quality, _quality(params))
+    return msgpack_quality > 0 and msgpack_quality >= json_quality
+
+def _json_default(value):
+    # Идентификаторы в теле MessagePack могут передаваться 16 байтами
+    if isinstance(value, bytes) and len(value) == 16:
+        return str(UUID(bytes=value))
+    raise TypeError
+
+class _MsgpackRequest(Request):
+    """Запрос с телом MessagePack, которое FastAPI читает как эквивалентный JSON"""
+
+    async def body(self) -> bytes:
+        if not hasattr(self, "_json_body"):
+            try:
+                content = msgpack.unpackb(await super().body())
+                self._json_body = orjson.dumps(content, default=_json_default)
+            except (ValueError, TypeError, msgpack.UnpackException, orjson.JSONEncodeError):
+                raise HTTPException(status_code=400, detail="Неверное тело запроса MessagePack")
+        return self._json_body
+
+class NegotiatedRoute(APIRoute):
+    """Маршрут, принимающий тело запроса в JSON или MessagePack (Content-Type).
+    Тело MessagePack проверяется той же схемой, что и JSON, поэтому OpenAPI не меняется."""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            if _is_msgpack(request.headers.get("content-type", "")):
+                scope = dict(request.scope)
+                scope["headers"] = [
+                    (name, value) for name, value in request.scope["headers"] if name != b"content-type"
+                ] + [(b"content-type", JSON_MEDIA_TYPE.encode())]
+                request = _MsgpackRequest(scope, request.receive)
+            return await handler(request)
+
+        return route_handler
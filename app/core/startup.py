@@ -0,0 +1,42 @@
+from contextlib import contextmanager
+from fastapi import HTTPException
+from typing import Dict
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Длительность этапов запуска в секундах: import, init, warmup
+_phases: Dict[str, float] = {}
+_ready = False
+
+@contextmanager
+def phase(name: str):
+    """Замер этапа запуска"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+def record(name: str, seconds: float):
+    _phases[name] = round(seconds, 6)
+    logger.info(f"[INIT] Startup phase '{name}' took {seconds:.3f}s")
+
+def mark_ready():
+    """Сервис прогрет и готов принимать трафик"""
+    global _ready
+    _ready = True
+
+def is_ready() -> bool:
+    return _ready
+
+async def require_ready():
+    """Зависимость: изменения ордеров принимаются только после прогрева.
+    Во время прогрева стаканы загружаются под их блокировкой вне цикла событий,
+    и синхронизация стакана после commit заблокировала бы цикл до конца загрузки."""
+    if not _ready:
+        raise HTTPException(status_code=503, detail="Сервис еще не готов", headers={"Retry-After": "1"})
+
+def metrics() -> Dict[str, object]:
+    return {"ready": _ready, "phases": dict(_phases)}
@@ -1,14 +1,21 @@
+import time
+_import_started = time.perf_counter()
+
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logging
-from sqlalchemy.orm import Session
 
+from app.api import health
 from app.api.v1 import public, user, admin
+from app.core import startup, offload
 from app.core.config import settings
-from app.models.base import get_db
+from app.core.rate_limit import AdmissionControlMiddleware
+from app.core.loop_monitor import loop_monitor
+from app.models.base import SessionLocal
 from app.models.instrument import Instrument
 from app.schemas.instrument import Instrument as InstrumentSchema
-from app.services import instrument_service
+from app.services import instrument_service, book_service, ticker_service
 
 # Настройка логирования
 logging.basicConfig(
@@ -20,23 +27,64 @@ logger = logging.getLogger(__name__)
 async def init_base_instruments():
     """Инициализация базовых инструментов"""
     try:
-        db: Session = next(get_db())
-        # Проверяем существование RUB
-        rub = db.query(Instrument).filter(Instrument.ticker == "RUB").first()
-        if not rub:
-            logger.info("[INIT] Creating base currency RUB")
-            instrument_data = InstrumentSchema(
-                ticker="RUB",
-                name="Российский рубль"
-            )
-            await instrument_service.add_instrument(db, instrument_data)
-            logger.info("[INIT] Base currency RUB created successfully")
-        else:
-            logger.info("[INIT] Base currency RUB already exists")
+        with SessionLocal() as db:
+            # Проверяем существование RUB
+            rub = db.query(Instrument).filter(Instrument.ticker == "RUB").first()
+            if not rub:
+                logger.info("[INIT] Creating base currency RUB")
+                instrument_data = InstrumentSchema(
+                    ticker="RUB",
+                    name="Российский рубль"
+                )
+                await instrument_service.add_instrument(db, instrument_data)
+                logger.info("[INIT] Base currency RUB created successfully")
+            else:
+                logger.info("[INIT] Base currency RUB already exists")
     except Exception as e:
         logger.error(f"[INIT] Failed to create base currency RUB: {str(e)}")
         raise
 
+async def init_market_data():
+    """Загрузка стаканов (из снимка с догоном по ленте событий или целиком из БД)
+    и скользящей статистики"""
+    from app.services import snapshot_service
+
+    with SessionLocal() as db:
+        if not await snapshot_service.restore(db):
+            await book_service.load_books(db)
+        await ticker_service.load_stats(db)
+
+async def warm_up():
+    """Прогрев после запуска сервера: загрузка рыночных данных и запуск фоновых задач.
+    До завершения проба готовности отвечает 503, а стаканы читаются из БД."""
+    # Фоновые задачи нужны только после прогрева, их модули импортируются здесь
+    from app.services import archive_service, reconciliation_service, snapshot_service
+
+    try:
+        with startup.phase("warmup"):
+            # Загрузка синхронно читает БД и держит блокировку стаканов, поэтому идет не в цикле
+            # событий: в потоке записи, а при выключенном пуле - в отдельном потоке. Пробы и
+            # чтения из БД обслуживаются во время загрузки, а изменения ордеров до готовности
+            # отклоняются с 503 (startup.require_ready) и не ждут блокировку в цикле.
+            if offload.writes.enabled:
+                await offload.run_write(init_market_data)
+            else:
+                await asyncio.to_thread(asyncio.run, init_market_data())
+    except Exception as e:
+        # Сервис остается неготовым, проба готовности продолжает отвечать 503
+        logger.error(f"[INIT] Warm-up failed: {str(e)}")
+        return
+    startup.mark_ready()
+
+    # Фоновое обслуживание секций и архива завершенных ордеров
+    app.state.archiver = asyncio.create_task(archive_service.run_archiver())
+    # Фоновая сверка балансов и стаканов
+    app.state.reconciler = asyncio.create_task(reconciliation_service.run_reconciler())
+    # Периодические снимки стаканов для быстрого перезапуска
+    if settings.SNAPSHOT_PATH:
+        app.state.snapshotter = asyncio.create_task(snapshot_service.run_snapshotter())
+    logger.info("[INIT] Service is ready")
+
 app = FastAPI(
     title="Toy Exchange",
     version="0.1.0",
@@ -46,9 +94,28 @@ app = FastAPI(
 async def startup_event():
     """Действия при запуске приложения"""
     logger.info("[INIT] Starting application initialization")
-    await init_base_instruments()
+    app.state.loop_monitor = asyncio.create_task(loop_monitor.run())
+    with startup.phase("init"):
+        await init_base_instruments()
+    # Загрузка стаканов не задерживает запуск сервера
+    app.state.warmup = asyncio.create_task(warm_up())
+    
+    budget_used = sum(startup.metrics()["phases"].values())
+    if budget_used > settings.STARTUP_BUDGET_SECONDS:
+        logger.warning(f"[INIT] Startup took {budget_used:.3f}s, budget is {settings.STARTUP_BUDGET_SECONDS:.3f}s")
     logger.info("[INIT] Application initialization completed")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Действия при остановке приложения"""
+    # Дожидаемся операций, уже переданных в потоки работы с БД
+    offload.reads.shutdown()
+    offload.writes.shutdown()
+
+# Контроль допуска: сброс нагрузки до постановки запросов в очередь.
+# Добавляется до CORS, чтобы CORS оборачивал его и ответы 429 получали заголовки CORS
+app.add_middleware(AdmissionControlMiddleware)
+
 # Настройка CORS
 app.add_middleware(
     CORSMiddleware,
@@ -61,4 +128,7 @@ app.add_middleware(
 # Подключаем роутеры
 app.include_router(public.router, prefix="/api/v1/public", tags=["public"])
 app.include_router(user.router, prefix="/api/v1", tags=["user"])
-app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"]) 
\ No newline at end of file
+app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"])
+app.include_router(health.router, prefix="/health", tags=["health"])
+
+startup.record("import", time.perf_counter() - _import_started) 
\ No newline at end of file
@@ -1,14 +1,130 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import create_engine, event, Select
+from sqlalchemy.pool import QueuePool
+from typing import Dict
+import time
 from app.core.config import settings
 
+class PoolMetrics:
+    """Метрики пула соединений: выдачи, возвраты и время ожидания соединения"""
+
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def observe_wait(self, seconds: float):
+        self.wait_seconds_total += seconds
+        if seconds > self.wait_seconds_max:
+            self.wait_seconds_max = seconds
+
+pool_metrics = PoolMetrics()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool с измерением времени получения соединения"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_metrics.observe_wait(time.perf_counter() - started)
+
+def _engine_options() -> dict:
+    """Параметры пула и кэша скомпилированных запросов из настроек"""
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "query_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+
 # Создаем движок SQLAlchemy
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(settings.DATABASE_URL, **_engine_options())
+
+# Движок реплики для чтения (или основной, если реплика не настроена)
+read_engine = (
+    create_engine(settings.READ_DATABASE_URL, **_engine_options())
+    if settings.READ_DATABASE_URL else engine
+)
+
+def _instrument(target):
+    @event.listens_for(target, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        pool_metrics.connects += 1
+
+    @event.listens_for(target, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_metrics.checkouts += 1
+
+    @event.listens_for(target, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        pool_metrics.checkins += 1
+
+_instrument(engine)
+if read_engine is not engine:
+    _instrument(read_engine)
+
+def _read_only(target):
+    """В PostgreSQL транзакции сессий чтения открываются в режиме READ ONLY"""
+    return target.execution_options(postgresql_readonly=True) if target.dialect.name == "postgresql" else target
+
+_primary_read_bind = _read_only(engine)
+_replica_read_bind = _read_only(read_engine)
+
+# Недавние записи: ключ (пользователь или ресурс) -> момент истечения окна read-your-writes
+_recent_writes: Dict[object, float] = {}
+_RECENT_WRITES_PRUNE_SIZE = 10000
+
+def mark_write(key):
+    """Отметка записи: чтения по ключу некоторое время идут в основную БД"""
+    if read_engine is engine:
+        return
+    now = time.monotonic()
+    if len(_recent_writes) >= _RECENT_WRITES_PRUNE_SIZE:
+        for stale in [k for k, expires in _recent_writes.items() if expires <= now]:
+            del _recent_writes[stale]
+    _recent_writes[key] = now + settings.REPLICA_READ_YOUR_WRITES_SECONDS
+
+def written_recently(key) -> bool:
+    expires = _recent_writes.get(key)
+    return expires is not None and expires > time.monotonic()
+
+class RoutingSession(Session):
+    """Сессия, направляющая безопасные чтения на реплику.
+    Запись и чтения с флагом info["primary"] выполняются в основной БД."""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get("primary") or self._flushing:
+            return _primary_read_bind
+        if clause is not None and not isinstance(clause, Select):
+            return _primary_read_bind
+        return _replica_read_bind
+
+def prefer_primary(db: Session, key) -> Session:
+    """Переключение сессии чтения на основную БД, если по ключу была недавняя запись"""
+    if written_recently(key):
+        db.info["primary"] = True
+    return db
+
+def reads_primary(db: Session) -> bool:
+    """Чтения сессии идут в основную БД: обычная сессия, сессия чтения после prefer_primary
+    или реплика не настроена"""
+    return read_engine is engine or not isinstance(db, RoutingSession) or bool(db.info.get("primary"))
 
 # Создаем фабрику сессий
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Фабрика сессий только для чтения: без autoflush и без сброса объектов при commit,
+# чтения маршрутизируются на реплику
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, expire_on_commit=False)
+
 # Создаем базовый класс для моделей
 Base = declarative_base()
 
@@ -18,4 +134,37 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+def get_read_db():
+    """Получение сессии БД только для чтения (для GET-запросов)"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def _pool_state(pool) -> Dict[str, int]:
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+
+def get_pool_metrics() -> Dict[str, float]:
+    """Состояние пула соединений"""
+    pool = engine.pool
+    metrics = {
+        **_pool_state(pool),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "connects": pool_metrics.connects,
+        "checkouts": pool_metrics.checkouts,
+        "checkins": pool_metrics.checkins,
+        "wait_seconds_total": round(pool_metrics.wait_seconds_total, 6),
+        "wait_seconds_max": round(pool_metrics.wait_seconds_max, 6),
+        "wait_seconds_avg": round(pool_metrics.wait_seconds_total / pool_metrics.checkouts, 6) if pool_metrics.checkouts else 0.0,
+    }
+    if read_engine is not engine:
+        metrics["replica"] = _pool_state(read_engine.pool)
+    return metrics
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+from app.models.base import Base
+
+class Candle(Base):
+    """Модель свечи OHLCV по инструменту"""
+    __tablename__ = "candles"
+
+    ticker = Column(String, ForeignKey("instruments.ticker"), primary_key=True)
+    interval = Column(String, primary_key=True)  # 1m, 5m, 1h, 1d
+    timestamp = Column(DateTime, primary_key=True)  # Начало интервала (UTC)
+    open = Column(Integer, nullable=False)
+    high = Column(Integer, nullable=False)
+    low = Column(Integer, nullable=False)
+    close = Column(Integer, nullable=False)
+    volume = Column(Integer, nullable=False, default=0)
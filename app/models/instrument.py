@@ -1,10 +1,20 @@
-from sqlalchemy import Column, String, Boolean
+from sqlalchemy import Column, String, Boolean, Integer, CheckConstraint
 from app.models.base import Base
 
 class Instrument(Base):
     """Модель торгового инструмента"""
     __tablename__ = "instruments"
+    __table_args__ = (
+        CheckConstraint("tick_size > 0", name="ck_instruments_tick_size"),
+        CheckConstraint("lot_size > 0", name="ck_instruments_lot_size"),
+    )
 
     ticker = Column(String, primary_key=True)
     name = Column(String, nullable=False)
-    is_active = Column(Boolean, default=True, nullable=False)  # Для мягкого удаления 
\ No newline at end of file
+    is_active = Column(Boolean, default=True, nullable=False)  # Для мягкого удаления
+    # Торговые параметры: цена кратна tick_size, объем кратен lot_size,
+    # цена лимитной заявки в пределах [min_price, max_price] (null - без ограничения)
+    tick_size = Column(Integer, nullable=False, default=1, server_default="1")
+    lot_size = Column(Integer, nullable=False, default=1, server_default="1")
+    min_price = Column(Integer, nullable=True)
+    max_price = Column(Integer, nullable=True)
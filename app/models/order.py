@@ -1,8 +1,8 @@
-from sqlalchemy import Column, String, Integer, Enum as SQLEnum, DateTime, ForeignKey, func
+from sqlalchemy import Column, String, Integer, Boolean, Enum as SQLEnum, DateTime, ForeignKey, func
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from datetime import datetime, timezone
-from app.schemas.order import OrderStatus, Direction
+from app.schemas.order import OrderStatus, Direction, TimeInForce
 from app.models.base import Base
 import logging
 
@@ -20,7 +20,11 @@ class Order(Base):
     qty = Column(Integer, nullable=False)
     price = Column(Integer, nullable=True)  # null для market ордеров
     filled = Column(Integer, nullable=False, default=0)
+    time_in_force = Column(SQLEnum(TimeInForce, name='time_in_force'), nullable=False, default=TimeInForce.GTC)
+    post_only = Column(Boolean, nullable=False, default=False)
     timestamp = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # Время последнего изменения (для завершенного ордера - время завершения), UTC без часового пояса
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __init__(self, **kwargs):
         if 'timestamp' in kwargs:
@@ -41,4 +45,22 @@ class Order(Base):
                    f"timestamp={self.timestamp}")
 
     def __str__(self):
-        return f"Order(id={self.id}, direction={self.direction}, ticker={self.ticker}, qty={self.qty}, price={self.price}, timestamp={self.timestamp})" 
\ No newline at end of file
+        return f"Order(id={self.id}, direction={self.direction}, ticker={self.ticker}, qty={self.qty}, price={self.price}, timestamp={self.timestamp})" 
+
+class OrderArchive(Base):
+    """Архив завершенных ордеров (EXECUTED, CANCELLED).
+    Таблица секционирована по времени создания ордера."""
+    __tablename__ = "orders_archive"
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    ticker = Column(String, ForeignKey("instruments.ticker"), nullable=False)
+    direction = Column(SQLEnum(Direction), nullable=False)
+    status = Column(SQLEnum(OrderStatus), nullable=False)
+    qty = Column(Integer, nullable=False)
+    price = Column(Integer, nullable=True)
+    filled = Column(Integer, nullable=False, default=0)
+    time_in_force = Column(SQLEnum(TimeInForce, name='time_in_force'), nullable=False, default=TimeInForce.GTC)
+    post_only = Column(Boolean, nullable=False, default=False)
+    # Как и orders.timestamp в БД, хранится в UTC без часового пояса
+    timestamp = Column(DateTime, primary_key=True, nullable=False)
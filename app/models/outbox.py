@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, JSON
+from app.models.base import Base
+from datetime import datetime
+
+class OutboxEvent(Base):
+    """Событие для внешних потребителей (transactional outbox).
+    Записывается в той же транзакции, что и изменение состояния."""
+    __tablename__ = "outbox_events"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    event_type = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    timestamp = Column(DateTime, nullable=False, default=datetime.utcnow)
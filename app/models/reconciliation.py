@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, Integer, BigInteger
+from sqlalchemy.dialects.postgresql import UUID
+from app.models.base import Base
+
+class ReconciliationState(Base):
+    """Курсор ленты событий, до которого выполнена сверка (одна строка)"""
+    __tablename__ = "reconciliation_state"
+
+    id = Column(Integer, primary_key=True, default=1)
+    watermark = Column(BigInteger, nullable=False)
+
+class ExpectedBalance(Base):
+    """Баланс, ожидаемый по сделкам и пополнениям на момент курсора сверки"""
+    __tablename__ = "reconciliation_balances"
+
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    ticker = Column(String, primary_key=True)
+    amount = Column(Integer, nullable=False)
+
+class ExpectedFill(Base):
+    """Исполненный объем активного ордера, ожидаемый по его сделкам"""
+    __tablename__ = "reconciliation_orders"
+
+    order_id = Column(UUID(as_uuid=True), primary_key=True)
+    filled = Column(Integer, nullable=False)
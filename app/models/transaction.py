@@ -14,4 +14,5 @@ class Transaction(Base):
     seller_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     amount = Column(Integer, nullable=False)
     price = Column(Integer, nullable=False)
-    timestamp = Column(DateTime, nullable=False, default=datetime.utcnow) 
\ No newline at end of file
+    # Таблица секционирована по времени, поэтому timestamp входит в первичный ключ
+    timestamp = Column(DateTime, primary_key=True, nullable=False, default=datetime.utcnow) 
\ No newline at end of file
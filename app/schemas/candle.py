@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+class Candle(BaseModel):
+    """Свеча OHLCV"""
+    ticker: str
+    interval: str
+    timestamp: datetime
+    open: int
+    high: int
+    low: int
+    close: int
+    volume: int
+
+    class Config:
+        from_attributes = True
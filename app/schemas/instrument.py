@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional
 
 class Instrument(BaseModel):
     """Схема инструмента"""
@@ -8,6 +9,30 @@ class Instrument(BaseModel):
     class Config:
         from_attributes = True
 
+class InstrumentRules(BaseModel):
+    """Торговые параметры инструмента"""
+    tick_size: int = Field(1, ge=1)  # шаг цены
+    lot_size: int = Field(1, ge=1)  # размер лота
+    min_price: Optional[int] = Field(None, ge=1)
+    max_price: Optional[int] = Field(None, ge=1)
+
+    @model_validator(mode="after")
+    def check_price_band(self):
+        if self.min_price is not None and self.max_price is not None and self.min_price > self.max_price:
+            raise ValueError("min_price больше max_price")
+        return self
+
+class NewInstrument(Instrument, InstrumentRules):
+    """Схема добавления инструмента с необязательными торговыми параметрами"""
+
+class InstrumentSpec(InstrumentRules):
+    """Инструмент и его торговые параметры"""
+    ticker: str
+    name: str
+
+    class Config:
+        from_attributes = True
+
 class Level(BaseModel):
     """Уровень в стакане"""
     price: int
@@ -16,4 +41,14 @@ class Level(BaseModel):
 class L2OrderBook(BaseModel):
     """Стакан заявок"""
     bid_levels: list[Level]
-    ask_levels: list[Level] 
\ No newline at end of file
+    ask_levels: list[Level] 
+
+class Ticker(BaseModel):
+    """Сводка по инструменту за последние 24 часа"""
+    ticker: str
+    last_price: Optional[int] = None
+    volume_24h: int = 0
+    high_24h: Optional[int] = None
+    low_24h: Optional[int] = None
+    best_bid: Optional[int] = None
+    best_ask: Optional[int] = None
\ No newline at end of file
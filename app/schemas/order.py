@@ -1,5 +1,5 @@
 from enum import Enum
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime, timezone
 from typing import Optional
 from uuid import UUID
@@ -19,12 +19,32 @@ class OrderStatus(str, Enum):
     PARTIALLY_EXECUTED = "PARTIALLY_EXECUTED"
     CANCELLED = "CANCELLED"
 
+class SelfTradePrevention(str, Enum):
+    """Режим предотвращения сделок пользователя с самим собой"""
+    CANCEL_NEWEST = "CANCEL_NEWEST"    # отменяется входящий ордер
+    CANCEL_OLDEST = "CANCEL_OLDEST"    # отменяется стоящий в стакане ордер
+    DECREMENT_BOTH = "DECREMENT_BOTH"  # оба ордера уменьшаются на пересекающийся объем
+
+class TimeInForce(str, Enum):
+    """Срок действия лимитного ордера"""
+    GTC = "GTC"  # до отмены
+    IOC = "IOC"  # исполнить доступное, остаток отменить
+    FOK = "FOK"  # исполнить полностью или отменить
+
 class LimitOrderBody(BaseModel):
     """Тело запроса для создания лимитного ордера"""
     direction: Direction
     ticker: str
     qty: int = Field(..., gt=0)
     price: int = Field(..., gt=0)
+    time_in_force: TimeInForce = TimeInForce.GTC
+    post_only: bool = False
+
+    @model_validator(mode="after")
+    def check_post_only(self):
+        if self.post_only and self.time_in_force != TimeInForce.GTC:
+            raise ValueError("post_only допустим только для GTC ордеров")
+        return self
 
 class MarketOrderBody(BaseModel):
     """Тело запроса для создания рыночного ордера"""
@@ -32,6 +52,21 @@ class MarketOrderBody(BaseModel):
     ticker: str
     qty: int = Field(..., gt=0)
 
+    class Config:
+        # Невалидное тело лимитного ордера не должно приниматься как рыночный ордер
+        extra = "forbid"
+
+class AmendOrderBody(BaseModel):
+    """Тело запроса для изменения лимитного ордера"""
+    qty: Optional[int] = Field(None, gt=0)
+    price: Optional[int] = Field(None, gt=0)
+
+    @model_validator(mode="after")
+    def check_changes(self):
+        if self.qty is None and self.price is None:
+            raise ValueError("Нужно указать qty или price")
+        return self
+
 class CreateOrderResponse(BaseModel):
     """Ответ на создание ордера"""
     success: bool = True
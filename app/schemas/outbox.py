@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Any, Dict, List
+
+class OutboxEvent(BaseModel):
+    """Событие ленты изменений"""
+    id: int
+    event_type: str
+    payload: Dict[str, Any]
+    timestamp: datetime
+
+    class Config:
+        from_attributes = True
+
+class EventBatch(BaseModel):
+    """Пачка событий ленты изменений и курсор для следующего запроса"""
+    events: List[OutboxEvent]
+    next_after: int
@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class Position(BaseModel):
+    """Позиция пользователя по инструменту"""
+    ticker: str
+    amount: int
+    reserved: int = 0  # заблокировано стоящими заявками
+    available: int  # amount - reserved, отрицательно при заявках сверх баланса
+    mark_price: Optional[int] = None  # в RUB, None - нет ни сделок, ни заявок
+    value: Optional[int] = None  # amount * mark_price
+
+class Portfolio(BaseModel):
+    """Оценка портфеля пользователя в RUB"""
+    positions: List[Position]
+    total_value: int
+    unpriced: List[str] = []  # инструменты без цены, не вошедшие в total_value
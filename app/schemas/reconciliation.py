@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+
+class Discrepancy(BaseModel):
+    """Расхождение, найденное сверкой"""
+    kind: str  # balance, balance_chain, trade_balance, order_filled, book
+    subject: str
+    expected: str
+    actual: str
+    detected_at: datetime
+
+class ReconciliationReport(BaseModel):
+    """Состояние фоновой сверки"""
+    watermark: Optional[int] = None
+    last_run: Optional[datetime] = None
+    runs: int = 0
+    events_processed: int = 0
+    last_run_seconds: float = 0.0
+    tracked_balances: int = 0
+    tracked_orders: int = 0
+    discrepancies: List[Discrepancy] = []
@@ -1,5 +1,7 @@
 from pydantic import BaseModel
 from datetime import datetime
+from uuid import UUID
+from app.schemas.order import Direction
 
 class Transaction(BaseModel):
     """Схема транзакции согласно OpenAPI"""
@@ -9,4 +11,16 @@ class Transaction(BaseModel):
     timestamp: datetime
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class Fill(BaseModel):
+    """Сделка пользователя"""
+    transaction_id: UUID
+    ticker: str
+    direction: Direction  # сторона пользователя в сделке
+    amount: int
+    price: int
+    timestamp: datetime
+
+    class Config:
+        from_attributes = True
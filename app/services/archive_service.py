@@ -0,0 +1,117 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, delete, text
+from datetime import date, datetime, timedelta, timezone
+from typing import List
+import asyncio
+import logging
+from app.core.config import settings
+from app.core import offload
+from app.models.base import SessionLocal
+from app.models.order import Order as OrderModel, OrderArchive
+from app.schemas.order import OrderStatus
+from app.services import outbox_service
+
+logger = logging.getLogger(__name__)
+
+# Секционированные по времени таблицы
+PARTITIONED_TABLES = ("transactions", "orders_archive")
+
+# Колонки, переносимые в архив
+_ARCHIVE_COLUMNS = [
+    "id", "user_id", "ticker", "direction", "status", "qty", "price", "filled",
+    "time_in_force", "post_only", "timestamp"
+]
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+def partition_bounds(months_ahead: int, start: date = None) -> List[date]:
+    """Границы месячных секций от начала месяца start до months_ahead месяцев вперед"""
+    first = (start or datetime.now(timezone.utc).date()).replace(day=1)
+    last = _add_months(datetime.now(timezone.utc).date().replace(day=1), months_ahead)
+    bounds = [first]
+    while bounds[-1] <= last:
+        bounds.append(_add_months(bounds[-1], 1))
+    return bounds
+
+def create_partitions_sql(table: str, bounds: List[date]) -> List[str]:
+    """DDL месячных секций таблицы для PostgreSQL"""
+    return [
+        f"CREATE TABLE IF NOT EXISTS {table}_{lower:%Y%m} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        for lower, upper in zip(bounds, bounds[1:])
+    ]
+
+async def ensure_partitions(db: Session, months_ahead: int = None):
+    """Создание секций на ближайшие месяцы, чтобы новые строки не попадали в секцию DEFAULT"""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    bounds = partition_bounds(months_ahead if months_ahead is not None else settings.PARTITION_MONTHS_AHEAD)
+    try:
+        for table in PARTITIONED_TABLES:
+            for statement in create_partitions_sql(table, bounds):
+                db.execute(text(statement))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[ARCHIVE] Failed to create partitions: {str(e)}")
+        raise
+
+async def archive_orders(db: Session, retention_days: int = None, batch_size: int = None) -> int:
+    """Перенос в архив ордеров, завершенных раньше окна хранения.
+    Окно отсчитывается от завершения ордера (updated_at), а не от создания:
+    долго стоявший в стакане ордер остается в orders еще retention_days после закрытия.
+    Каждая пачка переносится одной транзакцией: INSERT ... SELECT и DELETE."""
+    retention_days = retention_days if retention_days is not None else settings.ARCHIVE_RETENTION_DAYS
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+
+    moved = 0
+    while True:
+        ids = db.execute(
+            select(OrderModel.id).where(
+                OrderModel.status.in_([OrderStatus.EXECUTED, OrderStatus.CANCELLED]),
+                OrderModel.updated_at < cutoff
+            ).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        try:
+            db.execute(
+                insert(OrderArchive).from_select(
+                    _ARCHIVE_COLUMNS,
+                    select(*[getattr(OrderModel, column) for column in _ARCHIVE_COLUMNS]).where(
+                        OrderModel.id.in_(ids)
+                    )
+                )
+            )
+            db.execute(delete(OrderModel).where(OrderModel.id.in_(ids)))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[ARCHIVE] Failed to archive orders: {str(e)}")
+            raise
+
+        moved += len(ids)
+        # Отдаем управление циклу событий между пачками
+        await asyncio.sleep(0)
+
+    if moved:
+        logger.info(f"[ARCHIVE] Archived {moved} closed orders older than {cutoff.isoformat()}")
+    return moved
+
+async def run_archiver():
+    """Периодическое обслуживание секций, архивирование ордеров и очистка ленты событий"""
+    while True:
+        try:
+            with SessionLocal() as db:
+                # Каждый шаг - отдельная операция потока записи, чтобы изменения
+                # ордеров могли выполняться между ними
+                await offload.run_write(ensure_partitions, db)
+                await offload.run_write(archive_orders, db)
+                await offload.run_write(outbox_service.prune_events, db, settings.OUTBOX_RETENTION_DAYS)
+        except Exception as e:
+            logger.error(f"[ARCHIVE] Archiver iteration failed: {str(e)}")
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
@@ -1,10 +1,13 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import select
 from fastapi import HTTPException
 from typing import Dict
 from uuid import UUID
 from app.models.balance import Balance
+from app.models.base import mark_write
 from app.models.instrument import Instrument
-from app.services import user_service, instrument_service
+from app.services import user_service, instrument_service, outbox_service
+from app.core.serialization import dumps
 import logging
 
 async def get_user_balances(db: Session, user_id: UUID) -> Dict[str, int]:
@@ -15,6 +18,15 @@ async def get_user_balances(db: Session, user_id: UUID) -> Dict[str, int]:
     balances = db.query(Balance).filter(Balance.user_id == user_id).all()
     return {balance.ticker: balance.amount for balance in balances}
 
+async def get_user_balances_json(db: Session, user_id: UUID) -> bytes:
+    """Балансы пользователя, сериализованные сразу из строк БД"""
+    await user_service.get_user(db, user_id)
+    
+    rows = db.execute(
+        select(Balance.ticker, Balance.amount).where(Balance.user_id == user_id)
+    )
+    return dumps({ticker: amount for ticker, amount in rows})
+
 async def check_balance(db: Session, user_id: UUID, ticker: str, amount: int) -> bool:
     """Проверка достаточности средств"""
     balance = db.query(Balance).filter(
@@ -36,8 +48,8 @@ async def _get_instrument_for_balance(db: Session, ticker: str):
     
     return instrument
 
-async def deposit(db: Session, user_id: UUID, ticker: str, amount: int):
-    """Пополнение баланса"""
+async def deposit(db: Session, user_id: UUID, ticker: str, amount: int, reason: str = "admin"):
+    """Пополнение баланса. reason - источник изменения для ленты событий (admin, trade)"""
     logger = logging.getLogger(__name__)
     logger.info(f"[DEPOSIT] Starting deposit flow: user={user_id}, ticker={ticker}, amount={amount}")
 
@@ -68,10 +80,19 @@ async def deposit(db: Session, user_id: UUID, ticker: str, amount: int):
         balance = Balance(user_id=user_id, ticker=ticker, amount=amount)
         db.add(balance)
     
+    outbox_service.add_event(db, outbox_service.BALANCE_CHANGED, {
+        "user_id": str(user_id),
+        "ticker": ticker,
+        "delta": amount,
+        "amount": balance.amount,
+        "reason": reason,
+    })
+    
     try:
         logger.info("[DEPOSIT] Committing transaction...")
         db.commit()
         db.refresh(balance)
+        mark_write(user_id)
         logger.info(f"[DEPOSIT] Successfully deposited {amount} {ticker}. Final balance: {balance.amount}")
     except Exception as e:
         db.rollback()
@@ -80,8 +101,8 @@ async def deposit(db: Session, user_id: UUID, ticker: str, amount: int):
     
     return {"success": True}
 
-async def withdraw(db: Session, user_id: UUID, ticker: str, amount: int):
-    """Списание с баланса"""
+async def withdraw(db: Session, user_id: UUID, ticker: str, amount: int, reason: str = "admin"):
+    """Списание с баланса. reason - источник изменения для ленты событий (admin, trade)"""
     logger = logging.getLogger(__name__)
     logger.info(f"[WITHDRAW] Starting withdraw flow: user={user_id}, ticker={ticker}, amount={amount}")
 
@@ -110,10 +131,19 @@ async def withdraw(db: Session, user_id: UUID, ticker: str, amount: int):
     balance.amount -= amount
     logger.info(f"[WITHDRAW] Updated balance: from={balance.amount + amount} to={balance.amount}")
     
+    outbox_service.add_event(db, outbox_service.BALANCE_CHANGED, {
+        "user_id": str(user_id),
+        "ticker": ticker,
+        "delta": -amount,
+        "amount": balance.amount,
+        "reason": reason,
+    })
+    
     try:
         logger.info("[WITHDRAW] Committing transaction...")
         db.commit()
         db.refresh(balance)
+        mark_write(user_id)
         logger.info(f"[WITHDRAW] Successfully withdrawn {amount} {ticker}. Final balance: {balance.amount}")
     except Exception as e:
         db.rollback()
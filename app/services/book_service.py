@@ -0,0 +1,357 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from uuid import UUID
+from bisect import insort, bisect_left
+from contextlib import contextmanager
+from functools import wraps
+import threading
+from datetime import datetime, timezone
+import time
+from app.models.order import Order as OrderModel
+from app.schemas.order import OrderStatus, Direction, TimeInForce
+from app.schemas.instrument import L2OrderBook, Level
+from app.services import market_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+class BookOrder:
+    """Активная заявка (статус NEW). Лимитные заявки стоят в стакане,
+    рыночные (price=None) только учитываются в индексе заявок пользователя."""
+    __slots__ = (
+        "id", "user_id", "ticker", "direction", "price", "qty", "filled", "timestamp",
+        "time_in_force", "post_only"
+    )
+
+    def __init__(self, id: UUID, user_id: UUID, ticker: str, direction: Direction,
+                 price: Optional[int], qty: int, filled: int, timestamp: datetime,
+                 time_in_force: Optional[TimeInForce] = None, post_only: Optional[bool] = None):
+        self.id = id
+        self.user_id = user_id
+        self.ticker = ticker
+        self.direction = direction
+        self.price = price
+        self.qty = qty
+        self.filled = filled
+        # Колонка orders.timestamp с часовым поясом, но SQLite возвращает ее без него,
+        # а снимок - с ним; в стаканах время всегда в UTC с часовым поясом, иначе
+        # заявки из разных источников нельзя сравнить
+        self.timestamp = timestamp if timestamp.tzinfo is not None else timestamp.replace(tzinfo=timezone.utc)
+        self.time_in_force = time_in_force
+        self.post_only = post_only
+
+    @property
+    def remaining(self) -> int:
+        return self.qty - self.filled
+
+    @property
+    def status(self) -> OrderStatus:
+        return OrderStatus.NEW
+
+    def row(self) -> tuple:
+        """Колонки в порядке, который ожидает order_row_to_dict"""
+        return (
+            self.id, OrderStatus.NEW, self.user_id, self.timestamp, self.filled, self.direction,
+            self.ticker, self.qty, self.price, self.time_in_force, self.post_only
+        )
+
+class OrderBook:
+    """Стакан инструмента: агрегированные объемы по уровням цен"""
+
+    def __init__(self, ticker: str):
+        self.ticker = ticker
+        self.bids: Dict[int, int] = {}  # price -> total_qty
+        self.asks: Dict[int, int] = {}  # price -> total_qty
+        # Отсортированные по возрастанию цены непустых уровней
+        self.bid_prices: List[int] = []
+        self.ask_prices: List[int] = []
+
+    def change_level(self, direction: Direction, price: int, delta: int):
+        """Изменение объема на уровне цены"""
+        levels, prices = (
+            (self.bids, self.bid_prices) if direction == Direction.BUY
+            else (self.asks, self.ask_prices)
+        )
+        qty = levels.get(price, 0) + delta
+        if qty > 0:
+            if price not in levels:
+                insort(prices, price)
+            levels[price] = qty
+        elif price in levels:
+            del levels[price]
+            del prices[bisect_left(prices, price)]
+
+    def best_bid(self) -> Optional[int]:
+        return self.bid_prices[-1] if self.bid_prices else None
+
+    def best_ask(self) -> Optional[int]:
+        return self.ask_prices[0] if self.ask_prices else None
+
+    def snapshot(self, limit: int) -> L2OrderBook:
+        """Срез стакана на limit уровней с каждой стороны"""
+        bid_prices = self.bid_prices[-limit:][::-1] if limit > 0 else []
+        ask_prices = self.ask_prices[:limit] if limit > 0 else []
+        return L2OrderBook(
+            bid_levels=[Level(price=price, qty=self.bids[price]) for price in bid_prices],
+            ask_levels=[Level(price=price, qty=self.asks[price]) for price in ask_prices]
+        )
+
+# Размер пачки при потоковой загрузке ордеров из БД
+LOAD_BATCH_SIZE = 10000
+
+# Стаканы по тикерам и все активные заявки
+_books: Dict[str, OrderBook] = {}
+_orders: Dict[UUID, BookOrder] = {}
+# Активные заявки по пользователям; размер множества - счетчик для лимита заявок
+_user_orders: Dict[UUID, Set[UUID]] = {}
+_ready = False
+
+# Метрики последней загрузки стаканов
+_load_metrics: Dict[str, float] = {}
+
+# Стаканы меняются в потоке записи и читаются из цикла событий при выносе работы с БД в потоки
+_lock = threading.RLock()
+
+def _synchronized(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with _lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+@contextmanager
+def exclusive() -> Iterator[None]:
+    """Монопольный доступ к стаканам: изменения из других потоков ждут выхода из блока"""
+    with _lock:
+        yield
+
+def _is_open(order: OrderModel) -> bool:
+    """Заявка активна: ожидает исполнения. В стакане стоят только лимитные"""
+    return order.status == OrderStatus.NEW
+
+def _get_book(ticker: str) -> OrderBook:
+    book = _books.get(ticker)
+    if book is None:
+        book = _books[ticker] = OrderBook(ticker)
+    return book
+
+def _add(entry: BookOrder):
+    _orders[entry.id] = entry
+    _user_orders.setdefault(entry.user_id, set()).add(entry.id)
+    if entry.price is not None:
+        _get_book(entry.ticker).change_level(entry.direction, entry.price, entry.remaining)
+
+def _remove(order_id: UUID) -> Optional[BookOrder]:
+    entry = _orders.pop(order_id, None)
+    if entry is not None:
+        if entry.price is not None:
+            _get_book(entry.ticker).change_level(entry.direction, entry.price, -entry.remaining)
+        user_orders = _user_orders.get(entry.user_id)
+        if user_orders is not None:
+            user_orders.discard(order_id)
+            if not user_orders:
+                del _user_orders[entry.user_id]
+    return entry
+
+@_synchronized
+def sync_order(order: OrderModel):
+    """Приведение стакана и индекса активных заявок в соответствие
+    с зафиксированным состоянием ордера. Вызывается после каждого commit, меняющего ордер."""
+    removed = _remove(order.id)
+    is_open = _is_open(order)
+    if order.price is not None and (removed is not None or is_open):
+        market_cache.bump(market_cache.orderbook_resource(order.ticker))
+    if is_open:
+        _add(BookOrder(
+            id=order.id,
+            user_id=order.user_id,
+            ticker=order.ticker,
+            direction=order.direction,
+            price=order.price,
+            qty=order.qty,
+            filled=order.filled or 0,
+            timestamp=order.timestamp,
+            time_in_force=order.time_in_force,
+            post_only=order.post_only
+        ))
+
+@_synchronized
+def discard(order_id: UUID):
+    """Удаление заявки, которой больше нет среди активных"""
+    entry = _remove(order_id)
+    if entry is not None and entry.price is not None:
+        market_cache.bump(market_cache.orderbook_resource(entry.ticker))
+
+@_synchronized
+def best_prices(ticker: str) -> Tuple[Optional[int], Optional[int]]:
+    """Лучшие цены покупки и продажи"""
+    book = _books.get(ticker)
+    if book is None:
+        return None, None
+    return book.best_bid(), book.best_ask()
+
+@_synchronized
+def get_snapshot(ticker: str, limit: int) -> L2OrderBook:
+    """Срез стакана из памяти"""
+    book = _books.get(ticker)
+    if book is None:
+        return L2OrderBook(bid_levels=[], ask_levels=[])
+    return book.snapshot(limit)
+
+@_synchronized
+def get_snapshot_dict(ticker: str, limit: int) -> dict:
+    """Срез стакана из памяти в виде словаря ответа L2OrderBook"""
+    book = _books.get(ticker)
+    if book is None or limit <= 0:
+        return {"bid_levels": [], "ask_levels": []}
+    return {
+        "bid_levels": [
+            {"price": price, "qty": book.bids[price]} for price in book.bid_prices[-limit:][::-1]
+        ],
+        "ask_levels": [
+            {"price": price, "qty": book.asks[price]} for price in book.ask_prices[:limit]
+        ],
+    }
+
+@_synchronized
+def reserved(user_id: UUID) -> Dict[str, int]:
+    """Средства пользователя, зарезервированные стоящими заявками: ticker -> amount.
+    Заявка на покупку резервирует RUB, на продажу - сам инструмент."""
+    result: Dict[str, int] = {}
+    for order_id in _user_orders.get(user_id, ()):
+        entry = _orders[order_id]
+        if entry.price is None:
+            continue
+        if entry.direction == Direction.BUY:
+            result["RUB"] = result.get("RUB", 0) + entry.remaining * entry.price
+        else:
+            result[entry.ticker] = result.get(entry.ticker, 0) + entry.remaining
+    return result
+
+@_synchronized
+def open_order_count(user_id: UUID) -> int:
+    """Число активных заявок пользователя"""
+    return len(_user_orders.get(user_id, ()))
+
+@_synchronized
+def user_orders(user_id: UUID) -> List[BookOrder]:
+    """Активные заявки пользователя в порядке создания"""
+    return sorted(
+        (_orders[order_id] for order_id in _user_orders.get(user_id, ())),
+        key=lambda entry: entry.timestamp
+    )
+
+@_synchronized
+def get_levels(ticker: str) -> Dict[Tuple[Direction, int], int]:
+    """Все уровни стакана: (direction, price) -> total_qty"""
+    book = _books.get(ticker)
+    if book is None:
+        return {}
+    levels = {(Direction.BUY, price): qty for price, qty in book.bids.items()}
+    levels.update({(Direction.SELL, price): qty for price, qty in book.asks.items()})
+    return levels
+
+def get_db_best_prices(db: Session, ticker: str) -> Tuple[Optional[int], Optional[int]]:
+    """Лучшие цены покупки и продажи по активным лимитным ордерам в БД"""
+    return tuple(db.execute(
+        select(
+            func.max(OrderModel.price).filter(OrderModel.direction == Direction.BUY),
+            func.min(OrderModel.price).filter(OrderModel.direction == Direction.SELL)
+        ).where(
+            OrderModel.ticker == ticker,
+            OrderModel.status == OrderStatus.NEW,
+            OrderModel.price.isnot(None)
+        )
+    ).one())
+
+def get_db_levels(db: Session, ticker: str) -> Dict[Tuple[Direction, int], int]:
+    """Уровни стакана, посчитанные по активным лимитным ордерам в БД"""
+    return {
+        (direction, price): qty
+        for direction, price, qty in db.execute(
+            select(OrderModel.direction, OrderModel.price, func.sum(OrderModel.qty - OrderModel.filled)).where(
+                OrderModel.ticker == ticker,
+                OrderModel.status == OrderStatus.NEW,
+                OrderModel.price.isnot(None)
+            ).group_by(OrderModel.direction, OrderModel.price)
+        )
+    }
+
+def stats() -> Dict[str, int]:
+    """Текущий размер стаканов и индекса активных заявок в памяти.
+    Вызывается пробой готовности, поэтому не ждет блокировку, которую держит загрузка"""
+    return {"books": len(_books), "orders": len(_orders), "users": len(_user_orders)}
+
+@_synchronized
+def export_orders() -> List[BookOrder]:
+    """Копия всех активных заявок для снимка. Записи не изменяются на месте
+    (sync_order заменяет их), поэтому достаточно скопировать список ссылок."""
+    return list(_orders.values())
+
+@_synchronized
+def restore(entries: Iterable[BookOrder]):
+    """Замена стаканов заявками из снимка. Чтение из стаканов
+    разрешается вызовом mark_ready после применения изменений после снимка."""
+    clear()
+    for entry in entries:
+        _add(entry)
+
+def mark_ready():
+    global _ready
+    _ready = True
+
+def load_metrics() -> Dict[str, float]:
+    """Метрики последней загрузки стаканов"""
+    return dict(_load_metrics)
+
+def is_ready() -> bool:
+    """Стаканы загружены и согласованы с БД"""
+    return _ready
+
+@_synchronized
+def clear():
+    """Сброс всех стаканов"""
+    global _ready
+    _ready = False
+    _books.clear()
+    _orders.clear()
+    _user_orders.clear()
+
+async def load_books(db: Session):
+    """Загрузка стаканов и индекса заявок пользователей из активных ордеров в БД.
+    Ордера читаются потоком через Core SELECT только нужных колонок,
+    без создания ORM-объектов; чтение из стаканов разрешается после полной загрузки."""
+    global _ready
+    with _lock:
+        clear()
+        started = time.perf_counter()
+
+        rows = db.execute(
+            select(
+                OrderModel.id,
+                OrderModel.user_id,
+                OrderModel.ticker,
+                OrderModel.direction,
+                OrderModel.price,
+                OrderModel.qty,
+                OrderModel.filled,
+                OrderModel.timestamp,
+                OrderModel.time_in_force,
+                OrderModel.post_only
+            ).where(
+                OrderModel.status == OrderStatus.NEW
+            ).execution_options(yield_per=LOAD_BATCH_SIZE)
+        )
+        for row in rows:
+            _add(BookOrder(*row))
+
+        elapsed = time.perf_counter() - started
+        _load_metrics.update({
+            "orders": len(_orders),
+            "books": len(_books),
+            "seconds": round(elapsed, 6),
+            "orders_per_second": round(len(_orders) / elapsed, 1) if elapsed > 0 else 0.0,
+        })
+        _ready = True
+        logger.info(f"[BOOK] Loaded {len(_orders)} open orders into {len(_books)} books in {elapsed:.3f}s")
@@ -0,0 +1,131 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, insert
+from fastapi import HTTPException
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from app.models.candle import Candle as CandleModel
+from app.models.transaction import Transaction
+from app.schemas.candle import Candle
+from app.services import instrument_service
+import logging
+
+# Поддерживаемые интервалы свечей (в секундах)
+CANDLE_INTERVALS: Dict[str, int] = {
+    "1m": 60,
+    "5m": 300,
+    "1h": 3600,
+    "1d": 86400,
+}
+
+# Размер пачки при потоковом чтении истории сделок
+BACKFILL_BATCH_SIZE = 5000
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _bucket_start(timestamp: datetime, seconds: int) -> datetime:
+    """Начало интервала, в который попадает момент времени (naive UTC)"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    offset = int((timestamp - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=offset - offset % seconds)
+
+async def apply_trade(db: Session, ticker: str, price: int, amount: int, timestamp: datetime):
+    """Обновление свечей всех интервалов по новой сделке.
+    Изменения добавляются в сессию и фиксируются вместе со сделкой."""
+    for interval, seconds in CANDLE_INTERVALS.items():
+        start = _bucket_start(timestamp, seconds)
+        candle = db.get(CandleModel, (ticker, interval, start))
+        if candle is None:
+            db.add(CandleModel(
+                ticker=ticker,
+                interval=interval,
+                timestamp=start,
+                open=price,
+                high=price,
+                low=price,
+                close=price,
+                volume=amount
+            ))
+        else:
+            candle.high = max(candle.high, price)
+            candle.low = min(candle.low, price)
+            candle.close = price
+            candle.volume += amount
+
+async def backfill_candles(db: Session, ticker: Optional[str] = None) -> int:
+    """Пересчет свечей по всей истории сделок.
+    Сделки читаются потоком в порядке времени, свечи вставляются одной пачкой."""
+    logger = logging.getLogger(__name__)
+    logger.info(f"[CANDLES] Starting backfill for {ticker if ticker else 'all tickers'}")
+
+    query = select(
+        Transaction.ticker,
+        Transaction.price,
+        Transaction.amount,
+        Transaction.timestamp
+    ).order_by(Transaction.ticker, Transaction.timestamp)
+    if ticker:
+        query = query.where(Transaction.ticker == ticker)
+
+    # (ticker, interval, start) -> [open, high, low, close, volume]
+    buckets: Dict[Tuple[str, str, datetime], List[int]] = {}
+    trades = 0
+    for tx_ticker, price, amount, timestamp in db.execute(
+        query.execution_options(yield_per=BACKFILL_BATCH_SIZE)
+    ):
+        trades += 1
+        for interval, seconds in CANDLE_INTERVALS.items():
+            key = (tx_ticker, interval, _bucket_start(timestamp, seconds))
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [price, price, price, price, amount]
+            else:
+                if price > bucket[1]:
+                    bucket[1] = price
+                if price < bucket[2]:
+                    bucket[2] = price
+                bucket[3] = price
+                bucket[4] += amount
+
+    try:
+        cleanup = delete(CandleModel)
+        if ticker:
+            cleanup = cleanup.where(CandleModel.ticker == ticker)
+        db.execute(cleanup)
+        if buckets:
+            db.execute(insert(CandleModel), [
+                {
+                    "ticker": key[0],
+                    "interval": key[1],
+                    "timestamp": key[2],
+                    "open": values[0],
+                    "high": values[1],
+                    "low": values[2],
+                    "close": values[3],
+                    "volume": values[4],
+                }
+                for key, values in buckets.items()
+            ])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[CANDLES] Backfill failed: {str(e)}")
+        raise HTTPException(status_code=400, detail="Ошибка при пересчете свечей")
+
+    logger.info(f"[CANDLES] Backfill completed: trades={trades}, candles={len(buckets)}")
+    return len(buckets)
+
+async def get_candles(db: Session, ticker: str, interval: str = "1m", limit: int = 100) -> List[Candle]:
+    """Получение последних свечей по инструменту"""
+    if interval not in CANDLE_INTERVALS:
+        raise HTTPException(status_code=400, detail="Неизвестный интервал")
+
+    # Проверяем существование инструмента
+    await instrument_service.get_instrument(db, ticker)
+
+    candles = db.query(CandleModel).filter(
+        CandleModel.ticker == ticker,
+        CandleModel.interval == interval
+    ).order_by(CandleModel.timestamp.desc()).limit(limit).all()
+
+    return [Candle.model_validate(candle) for candle in reversed(candles)]
@@ -1,10 +1,27 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
+from app.models.base import reads_primary
 from app.models.instrument import Instrument
-from app.schemas.instrument import Instrument as InstrumentSchema
-from typing import List
+from app.schemas.instrument import Instrument as InstrumentSchema, InstrumentRules, InstrumentSpec
+from app.services import market_cache
+from app.core.serialization import dumps
+from typing import Dict, List, Tuple
 import logging
 
+# Торговые параметры активных инструментов: ticker -> (версия списка инструментов, InstrumentSpec).
+# Читаются при каждой заявке, поэтому хранятся в памяти; любое изменение инструментов
+# меняет версию (market_cache.bump), и устаревшая запись перечитывается из БД.
+# Заполняется только чтениями из основной БД: реплика может отставать от версии
+_specs: Dict[str, Tuple[str, InstrumentSpec]] = {}
+
+def _rules(instrument_data) -> Dict[str, object]:
+    """Торговые параметры из схемы добавления; без них - значения по умолчанию"""
+    defaults = InstrumentRules()
+    return {
+        field: getattr(instrument_data, field, getattr(defaults, field))
+        for field in InstrumentRules.model_fields
+    }
+
 async def add_instrument(db: Session, instrument_data: InstrumentSchema):
     """Добавление нового инструмента"""
     logger = logging.getLogger(__name__)
@@ -30,8 +47,11 @@ async def add_instrument(db: Session, instrument_data: InstrumentSchema):
                 logger.info(f"[DB] Reactivating existing instrument: ticker={instrument_data.ticker}")
                 existing_instrument.is_active = True
                 existing_instrument.name = instrument_data.name  # Обновляем имя
+                for field, value in _rules(instrument_data).items():
+                    setattr(existing_instrument, field, value)
                 db.commit()
                 db.refresh(existing_instrument)
+                market_cache.bump(market_cache.INSTRUMENTS)
                 logger.info(f"[DB] Successfully reactivated instrument: ticker={instrument_data.ticker}")
                 return {"success": True}
         
@@ -39,12 +59,14 @@ async def add_instrument(db: Session, instrument_data: InstrumentSchema):
         instrument = Instrument(
             name=instrument_data.name,
             ticker=instrument_data.ticker,
-            is_active=True
+            is_active=True,
+            **_rules(instrument_data)
         )
         db.add(instrument)
         logger.info(f"[DB] Committing new instrument: ticker={instrument_data.ticker}")
         db.commit()
         db.refresh(instrument)
+        market_cache.bump(market_cache.INSTRUMENTS)
         logger.info(f"[DB] Successfully created new instrument: ticker={instrument_data.ticker}")
     except HTTPException:
         raise
@@ -73,12 +95,18 @@ async def delete_instrument(db: Session, ticker: str):
         db.rollback()
         raise HTTPException(status_code=400, detail="Ошибка при удалении инструмента")
     
+    market_cache.bump(market_cache.INSTRUMENTS)
     return {"success": True}
 
 async def get_instruments(db: Session) -> List[Instrument]:
     """Получение списка активных инструментов"""
     return db.query(Instrument).filter(Instrument.is_active == True).all()
 
+async def get_instruments_json(db: Session) -> bytes:
+    """Список активных инструментов, сериализованный в JSON"""
+    instruments = await get_instruments(db)
+    return dumps([InstrumentSchema.model_validate(instrument).model_dump(mode="json") for instrument in instruments])
+
 async def get_instrument(db: Session, ticker: str) -> Instrument:
     """Получение инструмента по тикеру"""
     instrument = db.query(Instrument).filter(
@@ -89,4 +117,45 @@ async def get_instrument(db: Session, ticker: str) -> Instrument:
     if not instrument:
         raise HTTPException(status_code=404, detail="Инструмент не найден")
     
-    return instrument
\ No newline at end of file
+    return instrument
+
+async def get_instrument_spec(db: Session, ticker: str) -> InstrumentSpec:
+    """Торговые параметры активного инструмента (из кэша в памяти)"""
+    # Версия берется до чтения: изменение во время чтения не оставит в кэше старые параметры
+    version = market_cache.etag(market_cache.INSTRUMENTS)
+    cached = _specs.get(ticker)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    spec = InstrumentSpec.model_validate(await get_instrument(db, ticker))
+    # Реплика под новой версией может вернуть еще прежние параметры
+    if reads_primary(db):
+        _specs[ticker] = (version, spec)
+    return spec
+
+async def update_instrument_rules(db: Session, ticker: str, rules: InstrumentRules) -> InstrumentSpec:
+    """Изменение торговых параметров инструмента.
+    Меняются только переданные поля; активные заявки не пересматриваются."""
+    logger = logging.getLogger(__name__)
+    instrument = await get_instrument(db, ticker)
+    for field, value in rules.model_dump(exclude_unset=True).items():
+        setattr(instrument, field, value)
+    
+    # Диапазон проверяется после объединения с текущими значениями
+    if instrument.min_price is not None and instrument.max_price is not None and instrument.min_price > instrument.max_price:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Минимальная цена больше максимальной")
+    
+    try:
+        db.commit()
+        db.refresh(instrument)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[DB] Failed to update instrument rules: {str(e)}")
+        raise HTTPException(status_code=400, detail="Ошибка при изменении инструмента")
+    
+    market_cache.bump(market_cache.INSTRUMENTS)
+    logger.info(
+        f"[DB] Updated instrument rules: ticker={ticker}, tick_size={instrument.tick_size}, "
+        f"lot_size={instrument.lot_size}, min_price={instrument.min_price}, max_price={instrument.max_price}"
+    )
+    return InstrumentSpec.model_validate(instrument)
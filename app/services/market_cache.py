@@ -0,0 +1,92 @@
+from collections import OrderedDict
+from fastapi import Request, Response
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from uuid import uuid4
+import time
+from app.core.config import settings
+from app.core.single_flight import SingleFlight
+from app.models.base import mark_write
+
+# Идентификатор запуска: ETag предыдущего процесса не совпадет с текущими версиями
+_EPOCH = uuid4().hex[:8]
+
+# Версии публичных ресурсов, увеличиваются при каждом изменении
+_versions: Dict[str, int] = {}
+
+# Микрокэш сериализованных ответов: etag -> (expires_at, content)
+_cache: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+_MAX_ENTRIES = 1024
+
+# Выполняющиеся вычисления по etag
+_inflight = SingleFlight()
+
+INSTRUMENTS = "instruments"
+
+def orderbook_resource(ticker: str) -> str:
+    return f"orderbook:{ticker}"
+
+def transactions_resource(ticker: str) -> str:
+    return f"transactions:{ticker}"
+
+def bump(resource: str):
+    """Отметка изменения ресурса"""
+    _versions[resource] = _versions.get(resource, 0) + 1
+    # Новую версию вычисляем по основной БД, пока реплика могла не догнать изменение
+    mark_write(resource)
+
+def etag(resource: str, *params) -> str:
+    """ETag текущей версии ресурса с учетом параметров запроса"""
+    suffix = "".join(f"-{param}" for param in params)
+    return f'"{_EPOCH}-{resource}-{_versions.get(resource, 0)}{suffix}"'
+
+def stats() -> Dict[str, int]:
+    """Заполненность микрокэша"""
+    return {"entries": len(_cache), "inflight": len(_inflight), "resources": len(_versions)}
+
+async def get_or_compute(tag: str, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+    """Ответ из микрокэша по ETag. Одновременные запросы одного и того же
+    ответа ждут единственное вычисление вместо повторной работы с БД."""
+    now = time.monotonic()
+    entry = _cache.get(tag)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    async def compute_and_store() -> bytes:
+        content = await compute()
+        _cache[tag] = (time.monotonic() + settings.MARKET_CACHE_TTL, content)
+        _cache.move_to_end(tag)
+        if len(_cache) > _MAX_ENTRIES:
+            _cache.popitem(last=False)
+        return content
+
+    return await _inflight.run(tag, compute_and_store)
+
+def etag_matches(header: Optional[str], tag: str) -> bool:
+    """Сравнение If-None-Match с ETag: список через запятую, "*" совпадает с любым,
+    слабые ETag (W/) сравниваются без префикса, как требует RFC 9110 для GET"""
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == tag:
+            return True
+    return False
+
+async def conditional_response(
+    request: Request,
+    tag: str,
+    compute: Callable[[], Awaitable[bytes]],
+    media_type: str = "application/json"
+) -> Response:
+    """Ответ на условный GET: 304 при совпадении If-None-Match
+    до обращения к БД, иначе ответ из микрокэша с заголовком ETag.
+    Представления разных форматов должны иметь разные ETag."""
+    headers = {"ETag": tag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if etag_matches(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers=headers)
+    content = await get_or_compute(tag, compute)
+    return Response(content=content, media_type=media_type, headers=headers)
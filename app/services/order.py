@@ -6,12 +6,28 @@ from app.models.order import Order as OrderModel
 from app.schemas.order import (
     OrderStatus,
     Direction,
+    TimeInForce,
     LimitOrder,
     MarketOrder,
     LimitOrderBody,
     MarketOrderBody,
 )
 
+def format_timestamp(timestamp: datetime) -> str:
+    """Форматирует время ордера в ISO 8601 (UTC) с явно указанным timezone"""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    else:
+        timestamp = timestamp.astimezone(timezone.utc)
+
+    # Конвертируем в ISO 8601 строку с timezone
+    timestamp_str = timestamp.isoformat()
+    
+    # Убеждаемся, что timezone указан явно
+    if not timestamp_str.endswith('Z') and '+' not in timestamp_str and '-' not in timestamp_str[10:]:
+        timestamp_str += 'Z'
+    return timestamp_str
+
 def convert_order_to_schema(order: OrderModel) -> Union[LimitOrder, MarketOrder]:
     """Конвертирует модель ордера в схему"""
     logger = logging.getLogger(__name__)
@@ -27,16 +43,8 @@ def convert_order_to_schema(order: OrderModel) -> Union[LimitOrder, MarketOrder]
     # Убеждаемся, что timestamp имеет timezone
     if timestamp.tzinfo is None:
         logger.warning(f"Service: Timestamp without timezone detected for order {order.id}. Adding UTC timezone.")
-        timestamp = timestamp.replace(tzinfo=timezone.utc)
-    else:
-        timestamp = timestamp.astimezone(timezone.utc)
 
-    # Конвертируем в ISO 8601 строку с timezone
-    timestamp_str = timestamp.isoformat()
-    
-    # Убеждаемся, что timezone указан явно
-    if not timestamp_str.endswith('Z') and '+' not in timestamp_str and '-' not in timestamp_str[10:]:
-        timestamp_str += 'Z'
+    timestamp_str = format_timestamp(timestamp)
 
     # Создаем базовые поля, общие для обоих типов ордеров
     base_fields = {
@@ -53,7 +61,9 @@ def convert_order_to_schema(order: OrderModel) -> Union[LimitOrder, MarketOrder]
             direction=order.direction,
             ticker=order.ticker,
             qty=order.qty,
-            price=order.price
+            price=order.price,
+            time_in_force=order.time_in_force or TimeInForce.GTC,
+            post_only=order.post_only or False
         )
         return LimitOrder(**base_fields, body=body)
     else:  # Это MarketOrder
@@ -64,4 +74,27 @@ def convert_order_to_schema(order: OrderModel) -> Union[LimitOrder, MarketOrder]
         )
         return MarketOrder(**base_fields, body=body)
 
+def order_row_to_dict(row, raw: bool = False) -> dict:
+    """Конвертирует строку ордера из БД в словарь ответа без создания Pydantic-моделей.
+    Порядок полей совпадает с LimitOrder/MarketOrder.
+    Ожидаемые колонки: id, status, user_id, timestamp, filled, direction, ticker, qty, price,
+    time_in_force, post_only.
+    raw=True оставляет UUID и datetime как есть для двоичной сериализации."""
+    (order_id, status, user_id, timestamp, filled, direction, ticker, qty, price,
+     time_in_force, post_only) = row
+    body = {"direction": direction.value, "ticker": ticker, "qty": qty}
+    if price is not None:
+        body["price"] = price
+        body["time_in_force"] = (time_in_force or TimeInForce.GTC).value
+        body["post_only"] = bool(post_only)
+    timestamp = timestamp or datetime.now(timezone.utc)
+    return {
+        "id": order_id if raw else str(order_id),
+        "status": status.value,
+        "user_id": user_id if raw else str(user_id),
+        "timestamp": timestamp if raw else format_timestamp(timestamp),
+        "filled": filled or 0,
+        "body": body,
+    }
+
 # ... остальной код без изменений ... 
\ No newline at end of file
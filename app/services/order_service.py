@@ -1,17 +1,22 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import select, func, or_, and_
 from fastapi import HTTPException
-from typing import List, Union, Dict, Optional
+from typing import Callable, List, Union, Dict, Optional
 from datetime import datetime
-from uuid import UUID
-from app.models.order import Order as OrderModel
+from uuid import UUID, uuid4
+from app.models.order import Order as OrderModel, OrderArchive
 from app.models.transaction import Transaction
+from app.models.base import mark_write
+from app.models.balance import Balance
 from app.schemas.order import (
-    LimitOrder, MarketOrder, OrderStatus,
-    Direction, CreateOrderResponse, LimitOrderBody, MarketOrderBody
+    LimitOrder, MarketOrder, OrderStatus, SelfTradePrevention, TimeInForce,
+    Direction, CreateOrderResponse, LimitOrderBody, MarketOrderBody, AmendOrderBody
 )
-from app.schemas.instrument import L2OrderBook, Level
-from app.services import balance_service, instrument_service
-from app.services.order import convert_order_to_schema
+from app.schemas.instrument import L2OrderBook, Level, InstrumentSpec
+from app.services import balance_service, instrument_service, candle_service, book_service, ticker_service, market_cache, outbox_service
+from app.services.order import convert_order_to_schema, order_row_to_dict
+from app.core.serialization import dumps, packb
+from app.core.config import settings
 import logging
 
 async def get_orders(db: Session, user_id: Optional[UUID] = None) -> List[Union[LimitOrder, MarketOrder]]:
@@ -20,23 +25,106 @@ async def get_orders(db: Session, user_id: Optional[UUID] = None) -> List[Union[
     logger.info(f"Getting orders for user {user_id if user_id else 'all'}")
     
     query = db.query(OrderModel)
+    archive_query = db.query(OrderArchive)
     if user_id:
         query = query.filter(OrderModel.user_id == user_id)
+        archive_query = archive_query.filter(OrderArchive.user_id == user_id)
     
-    orders = query.all()
+    # Завершенные ордера могут находиться в архиве
+    orders = query.all() + archive_query.all()
     return [convert_order_to_schema(order) for order in orders]
 
 async def create_order(
     db: Session,
     user_id: UUID,
-    order_data: Union[LimitOrderBody, MarketOrderBody]
+    order_data: Union[LimitOrderBody, MarketOrderBody],
+    on_created: Optional[Callable[[CreateOrderResponse], None]] = None
 ) -> CreateOrderResponse:
-    """Создание ордера"""
+    """Создание ордера.
+    on_created вызывается сразу после фиксации ордера, до исполнения: ордер уже
+    существует, даже если исполнение завершится ошибкой (для ключей идемпотентности)."""
     logger = logging.getLogger(__name__)
     logger.debug(f"Creating order: direction={order_data.direction}, ticker={order_data.ticker}, qty={order_data.qty}")
     
-    # Проверяем существование инструмента
-    await instrument_service.get_instrument(db, order_data.ticker)
+    await _check_order(db, user_id, order_data)
+    await _check_open_orders_limit(db, user_id)
+    
+    # Создаем ордер
+    order = OrderModel(
+        user_id=user_id,
+        ticker=order_data.ticker,
+        direction=order_data.direction,
+        qty=order_data.qty,
+        price=getattr(order_data, 'price', None),  # None для рыночных ордеров
+        time_in_force=getattr(order_data, 'time_in_force', TimeInForce.GTC),
+        post_only=getattr(order_data, 'post_only', False)
+    )
+    
+    db.add(order)
+    try:
+        db.flush()
+        outbox_service.add_event(db, outbox_service.ORDER_CREATED, outbox_service.order_payload(order))
+        db.commit()
+        db.refresh(order)
+        mark_write(user_id)
+        logger.debug(f"Successfully created order {order.id}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to create order: {str(e)}")
+        raise HTTPException(status_code=400, detail="Ошибка при создании ордера")
+    
+    result = CreateOrderResponse(success=True, order_id=order.id)
+    if on_created is not None:
+        on_created(result)
+    
+    # Пытаемся исполнить ордер
+    await try_execute_order(db, order)
+    book_service.sync_order(order)
+    
+    return result
+
+async def _check_open_orders_limit(db: Session, user_id: UUID):
+    """Проверка лимита активных ордеров пользователя.
+    Счетчик берется из индекса в памяти; до загрузки стаканов - из БД."""
+    limit = settings.MAX_OPEN_ORDERS_PER_USER
+    if limit <= 0:
+        return
+    if book_service.is_ready():
+        open_orders = book_service.open_order_count(user_id)
+    else:
+        open_orders = db.execute(
+            select(func.count()).select_from(OrderModel).where(
+                OrderModel.user_id == user_id,
+                OrderModel.status == OrderStatus.NEW
+            )
+        ).scalar()
+    if open_orders >= limit:
+        logging.getLogger(__name__).info(f"[ORDER] Open orders limit reached: user_id={user_id}, open={open_orders}, limit={limit}")
+        raise HTTPException(status_code=400, detail="Превышено допустимое число активных ордеров")
+
+def _check_instrument_rules(spec: InstrumentSpec, qty: int, price: Optional[int]):
+    """Проверка объема и цены по торговым параметрам инструмента.
+    У рыночной заявки (price=None) проверяется только объем."""
+    if qty % spec.lot_size:
+        raise HTTPException(status_code=400, detail=f"Объем должен быть кратен размеру лота ({spec.lot_size})")
+    if price is None:
+        return
+    if price % spec.tick_size:
+        raise HTTPException(status_code=400, detail=f"Цена должна быть кратна шагу цены ({spec.tick_size})")
+    if (spec.min_price is not None and price < spec.min_price) or (spec.max_price is not None and price > spec.max_price):
+        raise HTTPException(status_code=400, detail="Цена вне допустимого диапазона")
+
+async def _check_order(
+    db: Session,
+    user_id: UUID,
+    order_data: Union[LimitOrderBody, MarketOrderBody]
+):
+    """Проверки ордера перед записью: инструмент, баланс и условия исполнения"""
+    logger = logging.getLogger(__name__)
+    
+    # Проверяем существование инструмента и его торговые параметры
+    spec = await instrument_service.get_instrument_spec(db, order_data.ticker)
+    _check_instrument_rules(spec, order_data.qty, getattr(order_data, 'price', None))
     
     # Проверяем баланс
     if order_data.direction == Direction.SELL:
@@ -60,38 +148,86 @@ async def create_order(
                 logger.error(f"Insufficient RUB balance for BUY order. Required: {required_amount}")
                 raise HTTPException(status_code=400, detail="Недостаточно средств в RUB")
     
-    # Создаем ордер
-    order = OrderModel(
-        user_id=user_id,
-        ticker=order_data.ticker,
-        direction=order_data.direction,
-        qty=order_data.qty,
-        price=getattr(order_data, 'price', None)  # None для рыночных ордеров
-    )
+    # Условия исполнения проверяются до изменения состояния
+    if isinstance(order_data, LimitOrderBody):
+        if order_data.post_only and await _crosses_book(db, order_data):
+            logger.info(f"[ORDER] Post-only order would cross the book: ticker={order_data.ticker}, price={order_data.price}")
+            raise HTTPException(status_code=400, detail="Post-only ордер пересекает стакан")
+        if order_data.time_in_force == TimeInForce.FOK:
+            filled = await _executable_qty(db, user_id, order_data)
+            if filled < order_data.qty:
+                logger.info(f"[ORDER] FOK order killed: ticker={order_data.ticker}, qty={order_data.qty}, executable={filled}")
+                raise HTTPException(status_code=400, detail="Недостаточно ликвидности для исполнения FOK ордера")
+
+async def _crosses_book(db: Session, order_data: LimitOrderBody) -> bool:
+    """Лимитный ордер исполнится сразу: цена достигает лучшей встречной"""
+    if book_service.is_ready():
+        best_bid, best_ask = book_service.best_prices(order_data.ticker)
+    else:
+        best_bid, best_ask = db.query(
+            func.max(OrderModel.price).filter(OrderModel.direction == Direction.BUY),
+            func.min(OrderModel.price).filter(OrderModel.direction == Direction.SELL)
+        ).filter(
+            OrderModel.ticker == order_data.ticker,
+            OrderModel.status == OrderStatus.NEW
+        ).one()
     
-    db.add(order)
-    try:
-        db.commit()
-        db.refresh(order)
-        logger.debug(f"Successfully created order {order.id}")
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Failed to create order: {str(e)}")
-        raise HTTPException(status_code=400, detail="Ошибка при создании ордера")
+    if order_data.direction == Direction.BUY:
+        return best_ask is not None and order_data.price >= best_ask
+    return best_bid is not None and order_data.price <= best_bid
+
+async def _executable_qty(db: Session, user_id: UUID, order_data: LimitOrderBody) -> int:
+    """Объем, который исполнит обход встречных ордеров в try_execute_order, без изменения состояния.
+    Повторяет его правила: ордера продавцов и покупателей без средств пропускаются,
+    балансы меняются по мере сделок, а встреча с собственным ордером в режимах
+    CANCEL_NEWEST и DECREMENT_BOTH завершает исполнение входящего ордера.
+    Записи выполняются в одном потоке, поэтому между проверкой и исполнением стакан не меняется."""
+    stp_mode = SelfTradePrevention(settings.SELF_TRADE_PREVENTION)
+    balances: Dict[tuple, int] = {}
     
-    # Пытаемся исполнить ордер
-    await try_execute_order(db, order)
+    def balance(owner: UUID, ticker: str) -> int:
+        key = (owner, ticker)
+        if key not in balances:
+            balances[key] = db.execute(
+                select(Balance.amount).where(Balance.user_id == owner, Balance.ticker == ticker)
+            ).scalar() or 0
+        return balances[key]
     
-    return CreateOrderResponse(success=True, order_id=order.id)
+    remaining_qty = order_data.qty
+    for opposite_order in _iter_opposite_orders(db, order_data):
+        if remaining_qty == 0:
+            break
+        if opposite_order.user_id == user_id:
+            if stp_mode == SelfTradePrevention.CANCEL_OLDEST:
+                continue
+            break
+        
+        execute_qty = min(remaining_qty, opposite_order.qty - opposite_order.filled)
+        cost = execute_qty * opposite_order.price
+        if order_data.direction == Direction.BUY:
+            buyer_id, seller_id = user_id, opposite_order.user_id
+        else:
+            buyer_id, seller_id = opposite_order.user_id, user_id
+        if balance(buyer_id, "RUB") < cost or balance(seller_id, order_data.ticker) < execute_qty:
+            continue
+        
+        balances[(buyer_id, "RUB")] -= cost
+        balances[(seller_id, order_data.ticker)] -= execute_qty
+        balances[(seller_id, "RUB")] = balance(seller_id, "RUB") + cost
+        balances[(buyer_id, order_data.ticker)] = balance(buyer_id, order_data.ticker) + execute_qty
+        remaining_qty -= execute_qty
+    
+    return order_data.qty - remaining_qty
 
 async def cancel_order(db: Session, order_id: UUID, user_id: UUID):
     """Отмена ордера"""
-    order = await get_order(db, order_id, user_id)
+    order = await _get_order_model(db, order_id, user_id)
     
     if order.status != OrderStatus.NEW:
         raise HTTPException(status_code=400, detail="Ордер нельзя отменить")
     
     order.status = OrderStatus.CANCELLED
+    outbox_service.add_event(db, outbox_service.ORDER_CANCELLED, outbox_service.order_payload(order))
     try:
         db.commit()
         db.refresh(order)
@@ -99,14 +235,112 @@ async def cancel_order(db: Session, order_id: UUID, user_id: UUID):
         db.rollback()
         raise HTTPException(status_code=400, detail="Ошибка при отмене ордера")
     
+    mark_write(user_id)
+    book_service.sync_order(order)
     return {"success": True}
 
-async def get_order(db: Session, order_id: UUID, user_id: UUID) -> Union[LimitOrder, MarketOrder]:
-    """Получение ордера"""
+async def amend_order(
+    db: Session,
+    order_id: UUID,
+    user_id: UUID,
+    amend_data: AmendOrderBody,
+    on_created: Optional[Callable[[CreateOrderResponse], None]] = None
+) -> CreateOrderResponse:
+    """Изменение лимитного ордера.
+    Уменьшение объема по той же цене выполняется на месте с сохранением приоритета
+    по времени; изменение цены или увеличение объема - атомарная замена ордера:
+    отмена старого и создание нового фиксируются одним commit.
+    on_created вызывается после фиксации замены, до исполнения нового ордера."""
+    logger = logging.getLogger(__name__)
+    order = await _get_order_model(db, order_id, user_id)
+    
+    if order.status != OrderStatus.NEW or order.price is None:
+        raise HTTPException(status_code=400, detail="Ордер нельзя изменить")
+    
+    new_qty = amend_data.qty if amend_data.qty is not None else order.qty
+    new_price = amend_data.price if amend_data.price is not None else order.price
+    
+    if new_qty == order.qty and new_price == order.price:
+        return CreateOrderResponse(success=True, order_id=order.id)
+    
+    if new_price == order.price and new_qty < order.qty:
+        if new_qty <= order.filled:
+            raise HTTPException(status_code=400, detail="Объем меньше исполненного")
+        spec = await instrument_service.get_instrument_spec(db, order.ticker)
+        _check_instrument_rules(spec, new_qty, None)
+        order.qty = new_qty
+        outbox_service.add_event(db, outbox_service.ORDER_UPDATED, outbox_service.order_payload(order))
+        try:
+            db.commit()
+            db.refresh(order)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[ORDER] Failed to amend order: {str(e)}")
+            raise HTTPException(status_code=400, detail="Ошибка при изменении ордера")
+        
+        mark_write(user_id)
+        book_service.sync_order(order)
+        logger.info(f"[ORDER] Amended order in place: id={order.id}, qty={new_qty}")
+        return CreateOrderResponse(success=True, order_id=order.id)
+    
+    order_data = LimitOrderBody(
+        direction=order.direction,
+        ticker=order.ticker,
+        qty=new_qty,
+        price=new_price,
+        time_in_force=order.time_in_force,
+        post_only=order.post_only
+    )
+    await _check_order(db, user_id, order_data)
+    
+    order.status = OrderStatus.CANCELLED
+    replacement = OrderModel(
+        user_id=user_id,
+        ticker=order_data.ticker,
+        direction=order_data.direction,
+        qty=order_data.qty,
+        price=order_data.price,
+        time_in_force=order_data.time_in_force,
+        post_only=order_data.post_only
+    )
+    db.add(replacement)
+    try:
+        db.flush()
+        outbox_service.add_event(db, outbox_service.ORDER_CANCELLED, outbox_service.order_payload(order))
+        outbox_service.add_event(db, outbox_service.ORDER_CREATED, outbox_service.order_payload(replacement))
+        db.commit()
+        db.refresh(order)
+        db.refresh(replacement)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[ORDER] Failed to replace order: {str(e)}")
+        raise HTTPException(status_code=400, detail="Ошибка при изменении ордера")
+    
+    mark_write(user_id)
+    book_service.sync_order(order)
+    logger.info(f"[ORDER] Replaced order: old_id={order.id}, new_id={replacement.id}, qty={new_qty}, price={new_price}")
+    
+    result = CreateOrderResponse(success=True, order_id=replacement.id)
+    if on_created is not None:
+        on_created(result)
+    
+    await try_execute_order(db, replacement)
+    book_service.sync_order(replacement)
+    
+    return result
+
+async def _get_order_model(
+    db: Session,
+    order_id: UUID,
+    user_id: UUID,
+    include_archive: bool = False
+) -> Union[OrderModel, OrderArchive]:
+    """Получение модели ордера с проверкой владельца"""
     logger = logging.getLogger(__name__)
-    logger.info(f"[ORDER] Getting order: id={order_id}, user_id={user_id}")
     
     order = db.query(OrderModel).filter(OrderModel.id == order_id).first()
+    if not order and include_archive:
+        order = db.query(OrderArchive).filter(OrderArchive.id == order_id).first()
     if not order:
         logger.error(f"[ORDER] Order not found: id={order_id}")
         raise HTTPException(status_code=404, detail="Ордер не найден")
@@ -115,6 +349,15 @@ async def get_order(db: Session, order_id: UUID, user_id: UUID) -> Union[LimitOr
         logger.error(f"[ORDER] Access denied: order_user_id={order.user_id}, request_user_id={user_id}")
         raise HTTPException(status_code=403, detail="Нет доступа к ордеру")
     
+    return order
+
+async def get_order(db: Session, order_id: UUID, user_id: UUID) -> Union[LimitOrder, MarketOrder]:
+    """Получение ордера"""
+    logger = logging.getLogger(__name__)
+    logger.info(f"[ORDER] Getting order: id={order_id}, user_id={user_id}")
+    
+    order = await _get_order_model(db, order_id, user_id, include_archive=True)
+    
     try:
         result = convert_order_to_schema(order)
         logger.info(f"[ORDER] Successfully converted order to schema: id={order_id}, type={'limit' if order.price is not None else 'market'}")
@@ -128,6 +371,10 @@ async def get_user_orders(db: Session, user_id: UUID) -> List[Union[LimitOrder,
     logger = logging.getLogger(__name__)
     logger.info(f"[ORDER] Getting active orders for user: {user_id}")
     
+    # Индекс активных заявок в памяти согласован с БД после загрузки при старте
+    if book_service.is_ready():
+        return [convert_order_to_schema(entry) for entry in book_service.user_orders(user_id)]
+    
     orders = db.query(OrderModel).filter(
         OrderModel.user_id == user_id,
         OrderModel.status == OrderStatus.NEW
@@ -141,11 +388,46 @@ async def get_user_orders(db: Session, user_id: UUID) -> List[Union[LimitOrder,
         logger.error(f"[ORDER] Failed to convert orders to schema: {str(e)}")
         raise HTTPException(status_code=500, detail="Ошибка при обработке ордеров")
 
+def _user_order_rows(db: Session, user_id: UUID):
+    """Строки активных ордеров пользователя из индекса в памяти или из БД"""
+    if book_service.is_ready():
+        return [entry.row() for entry in book_service.user_orders(user_id)]
+    return db.execute(
+        select(
+            OrderModel.id,
+            OrderModel.status,
+            OrderModel.user_id,
+            OrderModel.timestamp,
+            OrderModel.filled,
+            OrderModel.direction,
+            OrderModel.ticker,
+            OrderModel.qty,
+            OrderModel.price,
+            OrderModel.time_in_force,
+            OrderModel.post_only
+        ).where(
+            OrderModel.user_id == user_id,
+            OrderModel.status == OrderStatus.NEW
+        )
+    )
+
+async def get_user_orders_json(db: Session, user_id: UUID) -> bytes:
+    """Список активных ордеров пользователя, сериализованный сразу из строк БД или индекса в памяти"""
+    return dumps([order_row_to_dict(row) for row in _user_order_rows(db, user_id)])
+
+async def get_user_orders_msgpack(db: Session, user_id: UUID) -> bytes:
+    """Список активных ордеров пользователя в MessagePack"""
+    return packb([order_row_to_dict(row, raw=True) for row in _user_order_rows(db, user_id)])
+
 async def get_orderbook(db: Session, ticker: str, limit: int = 10) -> L2OrderBook:
     """Получение стакана заявок"""
     # Проверяем существование инструмента
     await instrument_service.get_instrument(db, ticker)
     
+    # Стаканы в памяти согласованы с БД после загрузки при старте
+    if book_service.is_ready():
+        return book_service.get_snapshot(ticker, limit)
+    
     # Получаем активные ордера
     orders = db.query(OrderModel).filter(
         OrderModel.ticker == ticker,
@@ -178,50 +460,142 @@ async def get_orderbook(db: Session, ticker: str, limit: int = 10) -> L2OrderBoo
     
     return L2OrderBook(bid_levels=bid_levels, ask_levels=ask_levels)
 
-async def get_transaction_history(
-    db: Session,
-    ticker: str,
-    limit: int = 10
-) -> List[Transaction]:
-    """Получение истории сделок"""
-    # Проверяем существование инструмента
-    await instrument_service.get_instrument(db, ticker)
-    
-    return db.query(Transaction).filter(
-        Transaction.ticker == ticker
-    ).order_by(Transaction.timestamp.desc()).limit(limit).all()
+async def get_orderbook_json(db: Session, ticker: str, limit: int = 10) -> bytes:
+    """Стакан заявок, сериализованный сразу из структур в памяти"""
+    if book_service.is_ready():
+        await instrument_service.get_instrument(db, ticker)
+        return dumps(book_service.get_snapshot_dict(ticker, limit))
+    return await get_orderbook_model_json(db, ticker, limit)
 
-async def try_execute_order(db: Session, order: OrderModel):
-    """Попытка исполнить ордер"""
-    logger = logging.getLogger(__name__)
-    logger.info(f"[ORDER] Trying to execute order: id={order.id}, direction={order.direction}, ticker={order.ticker}, qty={order.qty}, price={order.price}")
+async def get_orderbook_model_json(db: Session, ticker: str, limit: int = 10) -> bytes:
+    """Стакан заявок, сериализованный через схему L2OrderBook (без быстрого пути)"""
+    orderbook = await get_orderbook(db, ticker, limit)
+    return dumps(orderbook.model_dump(mode="json"))
+
+async def get_orderbook_msgpack(db: Session, ticker: str, limit: int = 10) -> bytes:
+    """Стакан заявок в MessagePack"""
+    if book_service.is_ready():
+        await instrument_service.get_instrument(db, ticker)
+        return packb(book_service.get_snapshot_dict(ticker, limit))
+    orderbook = await get_orderbook(db, ticker, limit)
+    return packb(orderbook.model_dump())
 
-    # Определяем направление для поиска встречных ордеров
+def _iter_opposite_orders(db: Session, order: Union[OrderModel, LimitOrderBody]):
+    """Встречные ордера в порядке приоритета цена-время.
+    Читаются пачками по MATCH_BATCH_SIZE, поэтому обход затрагивает только
+    исполняемые уровни, а не всю противоположную сторону стакана."""
     opposite_direction = Direction.SELL if order.direction == Direction.BUY else Direction.BUY
     
-    # Получаем список встречных ордеров
-    opposite_orders = db.query(OrderModel).filter(
+    # Рыночные ордера не стоят в стакане: у встречных ордеров всегда есть цена
+    query = db.query(OrderModel).filter(
         OrderModel.ticker == order.ticker,
         OrderModel.direction == opposite_direction,
         OrderModel.status == OrderStatus.NEW,
-        OrderModel.user_id != order.user_id  # Исключаем ордера того же пользователя
+        OrderModel.price.isnot(None)
     )
     
     # Для лимитных ордеров добавляем условие по цене
     if order.direction == Direction.BUY:
-        if order.price is not None:  # Для лимитных ордеров
-            opposite_orders = opposite_orders.filter(OrderModel.price <= order.price)
-        opposite_orders = opposite_orders.order_by(OrderModel.price.asc())
+        if order.price is not None:
+            query = query.filter(OrderModel.price <= order.price)
+        query = query.order_by(OrderModel.price.asc(), OrderModel.timestamp.asc(), OrderModel.id.asc())
+        worse_price = lambda price: OrderModel.price > price
     else:
-        if order.price is not None:  # Для лимитных ордеров
-            opposite_orders = opposite_orders.filter(OrderModel.price >= order.price)
-        opposite_orders = opposite_orders.order_by(OrderModel.price.desc())
+        if order.price is not None:
+            query = query.filter(OrderModel.price >= order.price)
+        query = query.order_by(OrderModel.price.desc(), OrderModel.timestamp.asc(), OrderModel.id.asc())
+        worse_price = lambda price: OrderModel.price < price
+    
+    # Пропущенные ордера остаются NEW, поэтому каждая следующая пачка начинается
+    # строго после последнего ключа (price, timestamp, id) предыдущей
+    last = None
+    while True:
+        page_query = query
+        if last is not None:
+            price, timestamp, order_id = last
+            page_query = query.filter(or_(
+                worse_price(price),
+                and_(OrderModel.price == price, or_(
+                    OrderModel.timestamp > timestamp,
+                    and_(OrderModel.timestamp == timestamp, OrderModel.id > order_id)
+                ))
+            ))
+        page = page_query.limit(settings.MATCH_BATCH_SIZE).all()
+        for opposite_order in page:
+            last = (opposite_order.price, opposite_order.timestamp, opposite_order.id)
+            yield opposite_order
+        if len(page) < settings.MATCH_BATCH_SIZE:
+            return
+
+async def _prevent_self_trade(
+    db: Session,
+    order: OrderModel,
+    opposite_order: OrderModel,
+    remaining_qty: int,
+    mode: SelfTradePrevention
+):
+    """Применение режима предотвращения сделки с самим собой.
+    Возвращает новый остаток входящего ордера и признак его отмены."""
+    logger = logging.getLogger(__name__)
+    logger.info(f"[ORDER] Self-trade prevented ({mode.value}): order_id={order.id}, resting_order_id={opposite_order.id}")
+    
+    if mode == SelfTradePrevention.CANCEL_NEWEST:
+        # Входящий ордер отменяется в итоговом commit исполнения
+        return remaining_qty, True
+    
+    taker_cancelled = False
+    if mode == SelfTradePrevention.CANCEL_OLDEST:
+        opposite_order.status = OrderStatus.CANCELLED
+    else:
+        decrement = min(remaining_qty, opposite_order.qty - opposite_order.filled)
+        # Ордер без остатка отменяется, объем при этом не уменьшается до нуля
+        if decrement == opposite_order.qty - opposite_order.filled:
+            opposite_order.status = OrderStatus.CANCELLED
+        else:
+            opposite_order.qty -= decrement
+        if decrement == remaining_qty:
+            taker_cancelled = True
+        else:
+            order.qty -= decrement
+            remaining_qty -= decrement
+    
+    event_type = (
+        outbox_service.ORDER_CANCELLED if opposite_order.status == OrderStatus.CANCELLED
+        else outbox_service.ORDER_UPDATED
+    )
+    outbox_service.add_event(db, event_type, outbox_service.order_payload(opposite_order))
+    try:
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[ORDER] Failed to apply self-trade prevention: {str(e)}")
+        return remaining_qty, taker_cancelled
     
+    mark_write(opposite_order.user_id)
+    book_service.sync_order(opposite_order)
+    return remaining_qty, taker_cancelled
+
+async def try_execute_order(db: Session, order: OrderModel):
+    """Попытка исполнить ордер"""
+    logger = logging.getLogger(__name__)
+    logger.info(f"[ORDER] Trying to execute order: id={order.id}, direction={order.direction}, ticker={order.ticker}, qty={order.qty}, price={order.price}")
+
     remaining_qty = order.qty - order.filled
+    original_qty = order.qty
+    taker_cancelled = False
+    stp_mode = SelfTradePrevention(settings.SELF_TRADE_PREVENTION)
     
-    for opposite_order in opposite_orders:
-        if remaining_qty == 0:
+    for opposite_order in _iter_opposite_orders(db, order):
+        if remaining_qty == 0 or taker_cancelled:
             break
+        
+        # Предотвращение сделки с самим собой применяется при обходе уровней,
+        # а не фильтром в запросе: выборка идет по индексу в порядке цена-время
+        if opposite_order.user_id == order.user_id:
+            remaining_qty, taker_cancelled = await _prevent_self_trade(
+                db, order, opposite_order, remaining_qty, stp_mode
+            )
+            continue
             
         available_qty = opposite_order.qty - opposite_order.filled
         execute_qty = min(remaining_qty, available_qty)
@@ -252,11 +626,13 @@ async def try_execute_order(db: Session, order: OrderModel):
         try:
             # Создаем транзакцию
             transaction = Transaction(
+                id=uuid4(),
                 ticker=order.ticker,
                 amount=execute_qty,
                 price=execute_price,
                 buyer_id=order.user_id if order.direction == Direction.BUY else opposite_order.user_id,
-                seller_id=opposite_order.user_id if order.direction == Direction.BUY else order.user_id
+                seller_id=opposite_order.user_id if order.direction == Direction.BUY else order.user_id,
+                timestamp=datetime.utcnow()
             )
             
             logger.info(f"[TRANSACTION] Creating new transaction: ticker={order.ticker}, amount={execute_qty}, price={execute_price}")
@@ -264,18 +640,18 @@ async def try_execute_order(db: Session, order: OrderModel):
             # Обновляем балансы в правильном порядке
             if order.direction == Direction.BUY:
                 # Сначала списываем средства
-                await balance_service.withdraw(db, order.user_id, "RUB", execute_qty * execute_price)
-                await balance_service.withdraw(db, opposite_order.user_id, order.ticker, execute_qty)
+                await balance_service.withdraw(db, order.user_id, "RUB", execute_qty * execute_price, reason="trade")
+                await balance_service.withdraw(db, opposite_order.user_id, order.ticker, execute_qty, reason="trade")
                 # Затем зачисляем
-                await balance_service.deposit(db, opposite_order.user_id, "RUB", execute_qty * execute_price)
-                await balance_service.deposit(db, order.user_id, order.ticker, execute_qty)
+                await balance_service.deposit(db, opposite_order.user_id, "RUB", execute_qty * execute_price, reason="trade")
+                await balance_service.deposit(db, order.user_id, order.ticker, execute_qty, reason="trade")
             else:
                 # Сначала списываем средства
-                await balance_service.withdraw(db, opposite_order.user_id, "RUB", execute_qty * execute_price)
-                await balance_service.withdraw(db, order.user_id, order.ticker, execute_qty)
+                await balance_service.withdraw(db, opposite_order.user_id, "RUB", execute_qty * execute_price, reason="trade")
+                await balance_service.withdraw(db, order.user_id, order.ticker, execute_qty, reason="trade")
                 # Затем зачисляем
-                await balance_service.deposit(db, order.user_id, "RUB", execute_qty * execute_price)
-                await balance_service.deposit(db, opposite_order.user_id, order.ticker, execute_qty)
+                await balance_service.deposit(db, order.user_id, "RUB", execute_qty * execute_price, reason="trade")
+                await balance_service.deposit(db, opposite_order.user_id, order.ticker, execute_qty, reason="trade")
             
             # Обновляем ордера
             order.filled += execute_qty
@@ -289,19 +665,52 @@ async def try_execute_order(db: Session, order: OrderModel):
             remaining_qty -= execute_qty
             
             db.add(transaction)
+            outbox_service.add_event(db, outbox_service.TRADE, {
+                "transaction_id": str(transaction.id),
+                "ticker": transaction.ticker,
+                "amount": transaction.amount,
+                "price": transaction.price,
+                "buyer_id": str(transaction.buyer_id),
+                "seller_id": str(transaction.seller_id),
+                "taker_order_id": str(order.id),
+                "maker_order_id": str(opposite_order.id),
+                "timestamp": transaction.timestamp.isoformat(),
+            })
+            outbox_service.add_event(db, outbox_service.ORDER_UPDATED, outbox_service.order_payload(opposite_order))
+            await candle_service.apply_trade(
+                db, transaction.ticker, transaction.price, transaction.amount, transaction.timestamp
+            )
             db.commit()
             logger.info(f"[TRANSACTION] Successfully executed transaction: id={transaction.id}")
             
+            mark_write(opposite_order.user_id)
+            book_service.sync_order(opposite_order)
+            ticker_service.record_trade(
+                transaction.ticker, transaction.price, transaction.amount, transaction.timestamp
+            )
+            market_cache.bump(market_cache.transactions_resource(transaction.ticker))
+            
         except Exception as e:
             db.rollback()
             logger.error(f"[TRANSACTION] Failed to execute transaction: {str(e)}")
             continue
     
-    if remaining_qty == 0:
+    # Остаток IOC и FOK ордеров не выставляется в стакан
+    if remaining_qty > 0 and order.time_in_force in (TimeInForce.IOC, TimeInForce.FOK):
+        taker_cancelled = True
+    
+    if taker_cancelled:
+        order.status = OrderStatus.CANCELLED
+    elif remaining_qty == 0:
         order.status = OrderStatus.EXECUTED
     elif order.filled > 0:
         order.status = OrderStatus.PARTIALLY_EXECUTED
     
+    if taker_cancelled:
+        outbox_service.add_event(db, outbox_service.ORDER_CANCELLED, outbox_service.order_payload(order))
+    elif order.filled > 0 or order.qty != original_qty:
+        outbox_service.add_event(db, outbox_service.ORDER_UPDATED, outbox_service.order_payload(order))
+    
     try:
         db.commit()
         logger.info(f"[ORDER] Successfully updated order status: id={order.id}, status={order.status}")
@@ -0,0 +1,71 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import delete
+from typing import Any, Dict
+from datetime import datetime, timedelta
+from app.models.outbox import OutboxEvent as OutboxEventModel
+from app.models.order import Order as OrderModel
+from app.schemas.outbox import OutboxEvent, EventBatch
+import logging
+
+# Типы событий
+ORDER_CREATED = "order.created"
+ORDER_UPDATED = "order.updated"
+ORDER_CANCELLED = "order.cancelled"
+TRADE = "trade"
+BALANCE_CHANGED = "balance.changed"
+
+# Максимальный размер пачки ленты изменений
+MAX_BATCH_SIZE = 1000
+
+def add_event(db: Session, event_type: str, payload: Dict[str, Any]):
+    """Добавление события в сессию. Фиксируется тем же commit, что и изменение состояния."""
+    db.add(OutboxEventModel(event_type=event_type, payload=payload))
+
+def order_payload(order: OrderModel) -> Dict[str, Any]:
+    """Состояние ордера для события"""
+    return {
+        "order_id": str(order.id),
+        "user_id": str(order.user_id),
+        "ticker": order.ticker,
+        "direction": order.direction.value,
+        "status": order.status.value,
+        "qty": order.qty,
+        "price": order.price,
+        "filled": order.filled or 0,
+    }
+
+async def get_events(db: Session, after: int = 0, limit: int = 100) -> EventBatch:
+    """Пачка событий с id больше курсора after в порядке записи.
+    Потребитель сохраняет next_after после обработки пачки и продолжает с него,
+    поэтому при сбое события будут доставлены повторно (at-least-once).
+
+    Курсор id > after опирается на то, что все изменения фиксирует один писатель
+    (поток записи одного процесса): id выдаются и фиксируются в одном порядке.
+    При нескольких одновременных писателях транзакция с меньшим id может
+    зафиксироваться после того, как потребитель прошел его, и событие будет пропущено."""
+    limit = max(1, min(limit, MAX_BATCH_SIZE))
+    events = db.query(OutboxEventModel).filter(
+        OutboxEventModel.id > after
+    ).order_by(OutboxEventModel.id).limit(limit).all()
+
+    return EventBatch(
+        events=[OutboxEvent.model_validate(event) for event in events],
+        next_after=events[-1].id if events else after
+    )
+
+async def prune_events(db: Session, retention_days: int) -> int:
+    """Удаление событий старше окна хранения"""
+    logger = logging.getLogger(__name__)
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    try:
+        deleted = db.execute(
+            delete(OutboxEventModel).where(OutboxEventModel.timestamp < cutoff)
+        ).rowcount
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[OUTBOX] Failed to prune events: {str(e)}")
+        raise
+    if deleted:
+        logger.info(f"[OUTBOX] Pruned {deleted} events older than {cutoff.isoformat()}")
+    return deleted
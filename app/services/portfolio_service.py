@@ -0,0 +1,65 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from typing import Dict
+from uuid import UUID
+from app.models.balance import Balance
+from app.models.order import Order as OrderModel
+from app.schemas.order import OrderStatus, Direction
+from app.schemas.portfolio import Position, Portfolio
+from app.services import user_service, book_service, ticker_service
+
+async def _reserved_from_db(db: Session, user_id: UUID) -> Dict[str, int]:
+    """Резерв по активным лимитным ордерам из БД, пока стаканы не загружены"""
+    reserved: Dict[str, int] = {}
+    rows = db.execute(
+        select(OrderModel.ticker, OrderModel.direction, OrderModel.price, OrderModel.qty, OrderModel.filled).where(
+            OrderModel.user_id == user_id,
+            OrderModel.status == OrderStatus.NEW,
+            OrderModel.price.isnot(None)
+        )
+    )
+    for ticker, direction, price, qty, filled in rows:
+        if direction == Direction.BUY:
+            reserved["RUB"] = reserved.get("RUB", 0) + (qty - filled) * price
+        else:
+            reserved[ticker] = reserved.get(ticker, 0) + (qty - filled)
+    return reserved
+
+async def get_portfolio(db: Session, user_id: UUID) -> Portfolio:
+    """Оценка балансов и резерва по ценам из памяти.
+    Из БД читаются только балансы пользователя; цены и резерв берутся
+    из стаканов и статистики сделок, обновляемых при каждом исполнении."""
+    await user_service.get_user(db, user_id)
+
+    balances = {
+        ticker: amount
+        for ticker, amount in db.execute(
+            select(Balance.ticker, Balance.amount).where(Balance.user_id == user_id)
+        )
+    }
+    if book_service.is_ready():
+        reserved = book_service.reserved(user_id)
+    else:
+        reserved = await _reserved_from_db(db, user_id)
+
+    positions = []
+    unpriced = []
+    total_value = 0
+    for ticker in sorted(balances.keys() | reserved.keys()):
+        amount = balances.get(ticker, 0)
+        mark_price = ticker_service.mark_price(ticker)
+        value = amount * mark_price if mark_price is not None else None
+        if value is None:
+            unpriced.append(ticker)
+        else:
+            total_value += value
+        positions.append(Position(
+            ticker=ticker,
+            amount=amount,
+            reserved=reserved.get(ticker, 0),
+            available=amount - reserved.get(ticker, 0),
+            mark_price=mark_price,
+            value=value
+        ))
+
+    return Portfolio(positions=positions, total_value=total_value, unpriced=unpriced)
@@ -0,0 +1,330 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, delete
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from datetime import datetime, timezone
+from uuid import UUID
+import asyncio
+import time
+from app.core.config import settings
+from app.core import offload
+from app.models.base import SessionLocal
+from app.models.balance import Balance
+from app.models.order import Order as OrderModel, OrderArchive
+from app.models.outbox import OutboxEvent as OutboxEventModel
+from app.models.reconciliation import ReconciliationState, ExpectedBalance, ExpectedFill
+from app.models.transaction import Transaction
+from app.schemas.order import OrderStatus
+from app.schemas.reconciliation import Discrepancy, ReconciliationReport
+from app.services import outbox_service, book_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Размер пачки при чтении ленты событий
+READ_BATCH_SIZE = 5000
+# Сколько последних расхождений хранится для отчета
+MAX_DISCREPANCIES = 1000
+
+# Курсор ленты событий: все события с id <= _watermark уже сверены.
+# Курсор и ожидаемые значения хранятся в БД и загружаются при первом запуске в процессе
+_watermark: Optional[int] = None
+# Ожидаемые по сделкам и пополнениям балансы (user_id, ticker) -> amount
+_expected_balances: Dict[Tuple[str, str], int] = {}
+# Ожидаемый по сделкам filled активных ордеров: order_id -> filled
+_expected_filled: Dict[str, int] = {}
+_discrepancies: Deque[Discrepancy] = deque(maxlen=MAX_DISCREPANCIES)
+_stats: Dict[str, float] = {"runs": 0, "events": 0, "last_run_seconds": 0.0}
+_last_run: Optional[datetime] = None
+
+def _report(kind: str, subject: str, expected, actual):
+    logger.warning(f"[RECONCILE] {kind} mismatch: {subject} expected={expected} actual={actual}")
+    _discrepancies.append(Discrepancy(
+        kind=kind,
+        subject=subject,
+        expected=str(expected),
+        actual=str(actual),
+        detected_at=datetime.now(timezone.utc)
+    ))
+
+def clear():
+    """Сброс состояния сверки в памяти; сохраненное в БД состояние не меняется"""
+    global _watermark
+    _watermark = None
+    _expected_balances.clear()
+    _expected_filled.clear()
+
+def _add(balances: Dict[Tuple[str, str], int], key: Tuple[str, str], delta: int):
+    balances[key] = balances.get(key, 0) + delta
+
+def _load_state(db: Session) -> bool:
+    """Загрузка курсора и ожидаемых значений, сохраненных прошлыми запусками"""
+    global _watermark
+    state = db.get(ReconciliationState, 1)
+    if state is None:
+        return False
+    _watermark = state.watermark
+    _expected_balances.clear()
+    _expected_balances.update({
+        (str(user_id), ticker): amount
+        for user_id, ticker, amount in db.execute(
+            select(ExpectedBalance.user_id, ExpectedBalance.ticker, ExpectedBalance.amount)
+        )
+    })
+    _expected_filled.clear()
+    _expected_filled.update({
+        str(order_id): filled
+        for order_id, filled in db.execute(select(ExpectedFill.order_id, ExpectedFill.filled))
+    })
+    logger.info(f"[RECONCILE] Resuming from outbox watermark {_watermark}")
+    return True
+
+def _seed(db: Session):
+    """Однократный расчет ожидаемого состояния по журналу.
+    Балансы - сумма сделок из transactions и пополнений и списаний из ленты событий,
+    filled активных ордеров - сумма их сделок из ленты. Если начало ленты уже удалено
+    или пуста (нумерация событий начинается с 1), история пополнений неполна и за исходное
+    состояние берутся таблицы balances и orders."""
+    global _watermark
+    _watermark, first_id = db.execute(
+        select(func.coalesce(func.max(OutboxEventModel.id), 0), func.min(OutboxEventModel.id))
+    ).one()
+    actual = {
+        (str(user_id), ticker): amount
+        for user_id, ticker, amount in db.execute(select(Balance.user_id, Balance.ticker, Balance.amount))
+    }
+    complete = first_id == 1 or not actual
+    active = {
+        str(order_id): filled
+        for order_id, filled in db.execute(
+            select(OrderModel.id, OrderModel.filled).where(OrderModel.status == OrderStatus.NEW)
+        )
+    }
+
+    if not complete:
+        logger.warning("[RECONCILE] Outbox history is incomplete, seeding from current balances and orders")
+        balances = dict(actual)
+        filled = dict(active)
+    else:
+        balances = {}
+        trades = db.execute(
+            select(
+                Transaction.buyer_id, Transaction.seller_id, Transaction.ticker,
+                func.sum(Transaction.amount), func.sum(Transaction.amount * Transaction.price)
+            ).group_by(Transaction.buyer_id, Transaction.seller_id, Transaction.ticker)
+        )
+        for buyer_id, seller_id, ticker, amount, cost in trades:
+            _add(balances, (str(buyer_id), "RUB"), -cost)
+            _add(balances, (str(buyer_id), ticker), amount)
+            _add(balances, (str(seller_id), "RUB"), cost)
+            _add(balances, (str(seller_id), ticker), -amount)
+
+        filled = dict.fromkeys(active, 0)
+        events = db.execute(
+            select(OutboxEventModel.event_type, OutboxEventModel.payload).where(
+                OutboxEventModel.event_type.in_((outbox_service.BALANCE_CHANGED, outbox_service.TRADE))
+            ).order_by(OutboxEventModel.id).execution_options(yield_per=READ_BATCH_SIZE)
+        )
+        for event_type, payload in events:
+            if event_type == outbox_service.TRADE:
+                for order_id in (payload["taker_order_id"], payload["maker_order_id"]):
+                    if order_id in filled:
+                        filled[order_id] += payload["amount"]
+            elif payload.get("reason") != "trade":
+                _add(balances, (payload["user_id"], payload["ticker"]), payload["delta"])
+
+    _expected_balances.clear()
+    _expected_balances.update(balances)
+    _expected_filled.clear()
+    _expected_filled.update(filled)
+    logger.info(
+        f"[RECONCILE] Seeded {len(balances)} balances and {len(filled)} orders at outbox watermark {_watermark}"
+    )
+
+    # Расхождения, накопленные до первого запуска, видны сразу
+    _check_balances(db, set(balances) | set(actual))
+    _check_orders(db, set(filled))
+    _save_state(db, set(balances), set(active))
+
+def _save_state(db: Session, balance_keys: Set[Tuple[str, str]], order_ids: Set[str]):
+    """Сохранение курсора и изменившихся ожидаемых значений одной транзакцией"""
+    db.merge(ReconciliationState(id=1, watermark=_watermark))
+    for user_id, ticker in balance_keys:
+        db.merge(ExpectedBalance(
+            user_id=UUID(user_id), ticker=ticker, amount=_expected_balances[(user_id, ticker)]
+        ))
+    finished = []
+    for order_id in order_ids:
+        if order_id in _expected_filled:
+            db.merge(ExpectedFill(order_id=UUID(order_id), filled=_expected_filled[order_id]))
+        else:
+            finished.append(UUID(order_id))
+    if finished:
+        db.execute(delete(ExpectedFill).where(ExpectedFill.order_id.in_(finished)))
+    db.commit()
+
+def _trade_deltas(payload: dict) -> List[Tuple[Tuple[str, str], int]]:
+    """Изменения балансов, которые должна вызвать сделка"""
+    cost = payload["amount"] * payload["price"]
+    return [
+        ((payload["buyer_id"], "RUB"), -cost),
+        ((payload["buyer_id"], payload["ticker"]), payload["amount"]),
+        ((payload["seller_id"], "RUB"), cost),
+        ((payload["seller_id"], payload["ticker"]), -payload["amount"]),
+    ]
+
+async def reconcile(db: Session) -> int:
+    """Инкрементальная сверка по событиям после курсора.
+
+    Проверяется, что:
+    - баланс, ожидаемый по сделкам и пополнениям, совпадает с итогом в событии
+      и с таблицей balances;
+    - изменения балансов с reason=trade в точности соответствуют сделкам;
+    - filled активных ордеров равен сумме их сделок;
+    - стаканы в памяти совпадают с активными ордерами в БД для затронутых тикеров.
+
+    Самый первый запуск рассчитывает ожидаемое состояние по журналу (_seed) и сверяет
+    его целиком. Курсор и ожидаемые значения сохраняются в БД после каждого запуска,
+    поэтому после перезапуска сверка продолжается с сохраненного курсора.
+    Между чтением событий и состояния нет await, поэтому в пределах процесса
+    сверка видит согласованный срез."""
+    global _watermark, _last_run
+    started = time.perf_counter()
+
+    if _watermark is None and not _load_state(db):
+        _seed(db)
+        return 0
+
+    touched_balances: Set[Tuple[str, str]] = set()
+    touched_orders: Set[str] = set()
+    touched_tickers: Set[str] = set()
+    trade_residual: Dict[Tuple[str, str], int] = {}
+    processed = 0
+
+    rows = db.execute(
+        select(OutboxEventModel.id, OutboxEventModel.event_type, OutboxEventModel.payload).where(
+            OutboxEventModel.id > _watermark
+        ).order_by(OutboxEventModel.id).execution_options(yield_per=READ_BATCH_SIZE)
+    )
+    for event_id, event_type, payload in rows:
+        processed += 1
+        _watermark = event_id
+
+        if event_type == outbox_service.BALANCE_CHANGED:
+            key = (payload["user_id"], payload["ticker"])
+            expected = _expected_balances.get(key, 0) + payload["delta"]
+            if expected != payload["amount"]:
+                _report("balance_chain", f"{key[0]}/{key[1]}", expected, payload["amount"])
+            # Ожидаемое значение ведется по приращениям, а не по итогу из события
+            _expected_balances[key] = expected
+            touched_balances.add(key)
+            if payload.get("reason") == "trade":
+                trade_residual[key] = trade_residual.get(key, 0) - payload["delta"]
+
+        elif event_type == outbox_service.TRADE:
+            for key, delta in _trade_deltas(payload):
+                trade_residual[key] = trade_residual.get(key, 0) + delta
+            for order_id in (payload["taker_order_id"], payload["maker_order_id"]):
+                if order_id in _expected_filled:
+                    _expected_filled[order_id] += payload["amount"]
+                    touched_orders.add(order_id)
+            touched_tickers.add(payload["ticker"])
+
+        elif event_type == outbox_service.ORDER_CREATED:
+            _expected_filled[payload["order_id"]] = payload["filled"]
+            touched_orders.add(payload["order_id"])
+            touched_tickers.add(payload["ticker"])
+
+        elif event_type in (outbox_service.ORDER_UPDATED, outbox_service.ORDER_CANCELLED):
+            if payload["order_id"] in _expected_filled:
+                touched_orders.add(payload["order_id"])
+            touched_tickers.add(payload["ticker"])
+
+    for key, residual in trade_residual.items():
+        if residual:
+            _report("trade_balance", f"{key[0]}/{key[1]}", residual, 0)
+
+    _check_balances(db, touched_balances)
+    _check_orders(db, touched_orders)
+    _check_books(db, touched_tickers)
+    _save_state(db, touched_balances, touched_orders)
+
+    elapsed = time.perf_counter() - started
+    _stats["runs"] += 1
+    _stats["events"] += processed
+    _stats["last_run_seconds"] = round(elapsed, 6)
+    _last_run = datetime.now(timezone.utc)
+    return processed
+
+def _check_balances(db: Session, keys: Set[Tuple[str, str]]):
+    """Сравнение ожидаемых балансов с таблицей balances"""
+    if not keys:
+        return
+    users = {UUID(user_id) for user_id, _ in keys}
+    actual = {
+        (str(user_id), ticker): amount
+        for user_id, ticker, amount in db.execute(
+            select(Balance.user_id, Balance.ticker, Balance.amount).where(Balance.user_id.in_(users))
+        )
+    }
+    for key in keys:
+        expected = _expected_balances.get(key, 0)
+        if actual.get(key, 0) != expected:
+            _report("balance", f"{key[0]}/{key[1]}", expected, actual.get(key, 0))
+
+def _check_orders(db: Session, order_ids: Set[str]):
+    """Сравнение filled ордеров с суммой их сделок.
+    Завершенные ордера после проверки перестают отслеживаться."""
+    if not order_ids:
+        return
+    ids = [UUID(order_id) for order_id in order_ids]
+    rows = list(db.execute(
+        select(OrderModel.id, OrderModel.filled, OrderModel.status).where(OrderModel.id.in_(ids))
+    ))
+    rows += list(db.execute(
+        select(OrderArchive.id, OrderArchive.filled, OrderArchive.status).where(OrderArchive.id.in_(ids))
+    ))
+    for order_id, filled, status in rows:
+        key = str(order_id)
+        if filled != _expected_filled[key]:
+            _report("order_filled", key, _expected_filled[key], filled)
+        if status != OrderStatus.NEW:
+            del _expected_filled[key]
+
+def _check_books(db: Session, tickers: Set[str]):
+    """Сравнение стаканов в памяти с активными лимитными ордерами в БД"""
+    if not tickers or not book_service.is_ready():
+        return
+    for ticker in tickers:
+        expected = book_service.get_db_levels(db, ticker)
+        actual = book_service.get_levels(ticker)
+        for level in expected.keys() | actual.keys():
+            if expected.get(level, 0) != actual.get(level, 0):
+                _report(
+                    "book", f"{ticker} {level[0].value} {level[1]}",
+                    expected.get(level, 0), actual.get(level, 0)
+                )
+
+def get_report() -> ReconciliationReport:
+    """Состояние сверки и последние найденные расхождения"""
+    return ReconciliationReport(
+        watermark=_watermark,
+        last_run=_last_run,
+        runs=int(_stats["runs"]),
+        events_processed=int(_stats["events"]),
+        last_run_seconds=_stats["last_run_seconds"],
+        tracked_balances=len(_expected_balances),
+        tracked_orders=len(_expected_filled),
+        discrepancies=list(_discrepancies)
+    )
+
+async def run_reconciler():
+    """Периодическая сверка балансов, ордеров и стаканов"""
+    while True:
+        try:
+            with SessionLocal() as db:
+                # В потоке записи сверка не пересекается с изменениями
+                await offload.run_write(reconcile, db)
+        except Exception as e:
+            logger.error(f"[RECONCILE] Reconciliation failed: {str(e)}")
+        await asyncio.sleep(settings.RECONCILE_INTERVAL_SECONDS)
@@ -0,0 +1,252 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+import asyncio
+import mmap
+import os
+import struct
+import time
+import zlib
+from app.core.config import settings
+from app.core import offload
+from app.models.base import SessionLocal
+from app.models.order import Order as OrderModel
+from app.models.outbox import OutboxEvent as OutboxEventModel
+from app.schemas.order import Direction, TimeInForce
+from app.services import book_service, outbox_service
+from app.services.book_service import BookOrder
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Формат файла снимка (little-endian):
+#   заголовок: magic, курсор ленты событий, время снимка (нс), число тикеров, число заявок
+#   тикеры: длина (uint16) и UTF-8
+#   заявки: записи фиксированной длины _RECORD
+#   CRC32 всего предшествующего содержимого
+_MAGIC = b"EXSNAP01"
+_HEADER = struct.Struct("<8sqqII")
+_TICKER_LENGTH = struct.Struct("<H")
+# id, user_id, индекс тикера, direction, time_in_force, post_only, есть цена, price, qty, filled, timestamp (нс)
+_RECORD = struct.Struct("<16s16sHBBBBqqqq")
+_CRC = struct.Struct("<I")
+
+_DIRECTIONS = [Direction.BUY, Direction.SELL]
+_TIME_IN_FORCE = [None, TimeInForce.GTC, TimeInForce.IOC, TimeInForce.FOK]
+_POST_ONLY = [None, False, True]
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Сколько идентификаторов ордеров читается из БД за один запрос при догоне
+CATCH_UP_BATCH_SIZE = 1000
+
+# Метрики последних снимка и восстановления
+_metrics: Dict[str, Dict[str, float]] = {}
+
+def _to_ns(timestamp: datetime) -> int:
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    delta = timestamp - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+
+def _from_ns(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value // 1000)
+
+def encode(seq: int, entries: List[BookOrder], created_at: datetime) -> bytes:
+    """Сериализация заявок и курсора ленты событий в формат снимка"""
+    tickers: Dict[str, int] = {}
+    for entry in entries:
+        tickers.setdefault(entry.ticker, len(tickers))
+
+    buffer = bytearray(_HEADER.pack(_MAGIC, seq, _to_ns(created_at), len(tickers), len(entries)))
+    for ticker in tickers:
+        name = ticker.encode()
+        buffer += _TICKER_LENGTH.pack(len(name)) + name
+
+    offset = len(buffer)
+    buffer.extend(bytes(_RECORD.size * len(entries)))
+    for entry in entries:
+        _RECORD.pack_into(
+            buffer, offset,
+            entry.id.bytes,
+            entry.user_id.bytes,
+            tickers[entry.ticker],
+            _DIRECTIONS.index(entry.direction),
+            _TIME_IN_FORCE.index(entry.time_in_force),
+            _POST_ONLY.index(entry.post_only),
+            entry.price is not None,
+            entry.price or 0,
+            entry.qty,
+            entry.filled,
+            _to_ns(entry.timestamp)
+        )
+        offset += _RECORD.size
+
+    buffer += _CRC.pack(zlib.crc32(buffer))
+    return bytes(buffer)
+
+def decode(data) -> Tuple[int, datetime, List[BookOrder]]:
+    """Чтение снимка из буфера (bytes или mmap): курсор ленты, время снимка и заявки"""
+    with memoryview(data) as view:
+        if len(view) < _HEADER.size + _CRC.size:
+            raise ValueError("snapshot is truncated")
+        if zlib.crc32(view[:-_CRC.size]) != _CRC.unpack_from(view, len(view) - _CRC.size)[0]:
+            raise ValueError("snapshot checksum mismatch")
+        magic, seq, created_ns, ticker_count, order_count = _HEADER.unpack_from(view, 0)
+        if magic != _MAGIC:
+            raise ValueError("unknown snapshot format")
+
+        offset = _HEADER.size
+        tickers = []
+        for _ in range(ticker_count):
+            (length,) = _TICKER_LENGTH.unpack_from(view, offset)
+            offset += _TICKER_LENGTH.size
+            tickers.append(bytes(view[offset:offset + length]).decode())
+            offset += length
+
+        if offset + _RECORD.size * order_count + _CRC.size != len(view):
+            raise ValueError("snapshot is truncated")
+        # Пользователей намного меньше, чем заявок: их UUID создаются по одному разу
+        users: Dict[bytes, UUID] = {}
+        entries = []
+        with view[offset:offset + _RECORD.size * order_count] as records:
+            for (order_id, user_id, ticker, direction, time_in_force, post_only, has_price,
+                 price, qty, filled, timestamp) in _RECORD.iter_unpack(records):
+                user = users.get(user_id)
+                if user is None:
+                    user = users[user_id] = UUID(bytes=user_id)
+                entries.append(BookOrder(
+                    UUID(bytes=order_id), user, tickers[ticker], _DIRECTIONS[direction],
+                    price if has_price else None, qty, filled, _from_ns(timestamp),
+                    _TIME_IN_FORCE[time_in_force], _POST_ONLY[post_only]
+                ))
+    return seq, _from_ns(created_ns), entries
+
+def _write_file(path: str, content: bytes):
+    """Атомарная запись: читатель видит либо прежний, либо новый снимок целиком"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+async def _capture(db: Session) -> Tuple[int, List[BookOrder]]:
+    """Курсор ленты событий и копия активных заявок в одной точке.
+    Выполняется в потоке записи (или в цикле событий без await между чтениями),
+    поэтому между ними не фиксируется ни одно изменение ордеров."""
+    with book_service.exclusive():
+        seq = db.execute(select(func.coalesce(func.max(OutboxEventModel.id), 0))).scalar()
+        return seq, book_service.export_orders()
+
+async def take_snapshot(db: Session, path: Optional[str] = None) -> Dict[str, float]:
+    """Снимок активных заявок в файл. Исполнение приостанавливается только
+    на копирование ссылок на заявки; сериализация и запись идут в отдельном потоке."""
+    path = path or settings.SNAPSHOT_PATH
+    if not book_service.is_ready():
+        raise RuntimeError("books are not loaded")
+    started = time.perf_counter()
+    seq, entries = await offload.run_write(_capture, db)
+    captured = time.perf_counter()
+    content = await asyncio.to_thread(encode, seq, entries, datetime.now(timezone.utc))
+    await asyncio.to_thread(_write_file, path, content)
+    elapsed = time.perf_counter() - started
+
+    _metrics["snapshot"] = {
+        "outbox_seq": seq,
+        "orders": len(entries),
+        "bytes": len(content),
+        "capture_seconds": round(captured - started, 6),
+        "seconds": round(elapsed, 6),
+    }
+    logger.info(f"[SNAPSHOT] Wrote {len(entries)} orders at outbox seq {seq} to {path} in {elapsed:.3f}s")
+    return dict(_metrics["snapshot"])
+
+def _read_file(path: str) -> Tuple[int, datetime, List[BookOrder]]:
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return decode(data)
+
+def _changed_orders(db: Session, seq: int) -> Set[UUID]:
+    """Ордера, затронутые событиями после курсора снимка"""
+    changed: Set[UUID] = set()
+    rows = db.execute(
+        select(OutboxEventModel.event_type, OutboxEventModel.payload).where(
+            OutboxEventModel.id > seq
+        ).order_by(OutboxEventModel.id).execution_options(yield_per=CATCH_UP_BATCH_SIZE)
+    )
+    for event_type, payload in rows:
+        if event_type == outbox_service.TRADE:
+            changed.add(UUID(payload["taker_order_id"]))
+            changed.add(UUID(payload["maker_order_id"]))
+        elif event_type in (outbox_service.ORDER_CREATED, outbox_service.ORDER_UPDATED, outbox_service.ORDER_CANCELLED):
+            changed.add(UUID(payload["order_id"]))
+    return changed
+
+async def restore(db: Session, path: Optional[str] = None) -> bool:
+    """Восстановление стаканов из снимка и догон по ленте событий после него.
+    Текущее состояние затронутых после снимка ордеров читается из БД.
+    Возвращает False, если снимка нет, он поврежден или лента событий уже
+    очищена дальше его курсора; тогда стаканы нужно загрузить из БД целиком."""
+    path = path or settings.SNAPSHOT_PATH
+    if not path or not os.path.exists(path):
+        return False
+    started = time.perf_counter()
+    try:
+        seq, created_at, entries = await asyncio.to_thread(_read_file, path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"[SNAPSHOT] Cannot read snapshot {path}: {str(e)}")
+        return False
+    loaded = time.perf_counter()
+
+    # События до курсора должны сохраниться: иначе часть изменений после снимка могла быть удалена
+    covered = db.execute(
+        select(OutboxEventModel.id).where(OutboxEventModel.id <= seq).limit(1)
+    ).first()
+    if covered is None:
+        logger.warning(f"[SNAPSHOT] Outbox no longer covers snapshot seq {seq}, falling back to full load")
+        return False
+
+    # Изменения из потока записи ждут, пока стаканы не будут согласованы с БД
+    with book_service.exclusive():
+        book_service.restore(entries)
+        changed = list(_changed_orders(db, seq))
+        found: Set[UUID] = set()
+        for start in range(0, len(changed), CATCH_UP_BATCH_SIZE):
+            for order in db.query(OrderModel).filter(OrderModel.id.in_(changed[start:start + CATCH_UP_BATCH_SIZE])):
+                found.add(order.id)
+                book_service.sync_order(order)
+        # Ордера, перенесенные в архив, завершены
+        for order_id in set(changed) - found:
+            book_service.discard(order_id)
+        book_service.mark_ready()
+
+    elapsed = time.perf_counter() - started
+    _metrics["restore"] = {
+        "outbox_seq": seq,
+        "snapshot_age_seconds": round((datetime.now(timezone.utc) - created_at).total_seconds(), 3),
+        "orders": len(entries),
+        "changed_orders": len(changed),
+        "load_seconds": round(loaded - started, 6),
+        "seconds": round(elapsed, 6),
+    }
+    logger.info(
+        f"[SNAPSHOT] Restored {len(entries)} orders from seq {seq} and caught up "
+        f"{len(changed)} changed orders in {elapsed:.3f}s"
+    )
+    return True
+
+def metrics() -> Dict[str, Dict[str, float]]:
+    """Метрики последних снимка и восстановления"""
+    return {name: dict(values) for name, values in _metrics.items()}
+
+async def run_snapshotter():
+    """Периодическая запись снимка стаканов"""
+    while True:
+        await asyncio.sleep(settings.SNAPSHOT_INTERVAL_SECONDS)
+        try:
+            with SessionLocal() as db:
+                await take_snapshot(db)
+        except Exception as e:
+            logger.error(f"[SNAPSHOT] Snapshot failed: {str(e)}")
@@ -0,0 +1,159 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from app.models.instrument import Instrument
+from app.models.transaction import Transaction
+from app.schemas.instrument import Ticker
+from app.services import book_service
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Окно скользящей статистики
+STATS_WINDOW = timedelta(hours=24)
+
+def _to_naive_utc(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+class TickerStats:
+    """Скользящая статистика сделок по инструменту.
+    Максимум и минимум поддерживаются монотонными очередями,
+    поэтому обновление и чтение стоят O(1) в амортизированном смысле."""
+
+    def __init__(self):
+        self.trades: Deque[Tuple[datetime, int, int]] = deque()  # (timestamp, price, amount)
+        self.volume = 0
+        self.maxima: Deque[Tuple[datetime, int]] = deque()  # цены по убыванию
+        self.minima: Deque[Tuple[datetime, int]] = deque()  # цены по возрастанию
+        self.last_price: Optional[int] = None
+
+    def add(self, timestamp: datetime, price: int, amount: int):
+        self.trades.append((timestamp, price, amount))
+        self.volume += amount
+        while self.maxima and self.maxima[-1][1] <= price:
+            self.maxima.pop()
+        self.maxima.append((timestamp, price))
+        while self.minima and self.minima[-1][1] >= price:
+            self.minima.pop()
+        self.minima.append((timestamp, price))
+        self.last_price = price
+
+    def expire(self, cutoff: datetime):
+        """Удаление сделок, вышедших за окно"""
+        while self.trades and self.trades[0][0] < cutoff:
+            self.volume -= self.trades.popleft()[2]
+        while self.maxima and self.maxima[0][0] < cutoff:
+            self.maxima.popleft()
+        while self.minima and self.minima[0][0] < cutoff:
+            self.minima.popleft()
+
+    @property
+    def high(self) -> Optional[int]:
+        return self.maxima[0][1] if self.maxima else None
+
+    @property
+    def low(self) -> Optional[int]:
+        return self.minima[0][1] if self.minima else None
+
+_stats: Dict[str, TickerStats] = {}
+# Сделки учитываются в потоке записи, а статистика читается из цикла событий
+_lock = threading.Lock()
+
+def record_trade(ticker: str, price: int, amount: int, timestamp: datetime):
+    """Учет новой сделки в скользящей статистике"""
+    with _lock:
+        stats = _stats.get(ticker)
+        if stats is None:
+            stats = _stats[ticker] = TickerStats()
+        stats.add(_to_naive_utc(timestamp), price, amount)
+
+async def load_stats(db: Session):
+    """Загрузка сделок за последнее окно из БД.
+    Статистика собирается в новом словаре и заменяет текущую целиком,
+    поэтому читатели не видят частично загруженное окно."""
+    global _stats
+    stats: Dict[str, TickerStats] = {}
+    cutoff = datetime.utcnow() - STATS_WINDOW
+    rows = db.execute(
+        select(
+            Transaction.ticker,
+            Transaction.price,
+            Transaction.amount,
+            Transaction.timestamp
+        ).where(Transaction.timestamp >= cutoff).order_by(Transaction.timestamp)
+    )
+    count = 0
+    for ticker, price, amount, timestamp in rows:
+        ticker_stats = stats.get(ticker)
+        if ticker_stats is None:
+            ticker_stats = stats[ticker] = TickerStats()
+        ticker_stats.add(_to_naive_utc(timestamp), price, amount)
+        count += 1
+    
+    # Последняя цена инструментов без сделок в окне: по одному запросу на инструмент по индексу
+    tickers = db.execute(select(Instrument.ticker).where(Instrument.is_active == True)).scalars().all()
+    for ticker in tickers:
+        if ticker in stats:
+            continue
+        last_price = db.execute(
+            select(Transaction.price).where(Transaction.ticker == ticker)
+            .order_by(Transaction.timestamp.desc()).limit(1)
+        ).scalar()
+        if last_price is not None:
+            stats[ticker] = TickerStats()
+            stats[ticker].last_price = last_price
+
+    with _lock:
+        _stats = stats
+    logger.info(f"[TICKER] Loaded {count} trades into rolling statistics")
+
+def mark_price(ticker: str) -> Optional[int]:
+    """Цена для оценки позиций: последняя сделка, иначе середина спреда,
+    иначе единственная лучшая цена. Не обращается к БД."""
+    if ticker == "RUB":
+        return 1
+    stats = _stats.get(ticker)
+    if stats is not None and stats.last_price is not None:
+        return stats.last_price
+    if not book_service.is_ready():
+        # Пока стаканы загружаются, блокировка стаканов занята, а БД здесь не читается
+        return None
+    best_bid, best_ask = book_service.best_prices(ticker)
+    if best_bid is not None and best_ask is not None:
+        return (best_bid + best_ask) // 2
+    return best_bid if best_bid is not None else best_ask
+
+async def get_tickers(db: Session) -> List[Ticker]:
+    """Сводка по всем активным инструментам"""
+    cutoff = datetime.utcnow() - STATS_WINDOW
+    tickers = db.execute(
+        select(Instrument.ticker).where(Instrument.is_active == True).order_by(Instrument.ticker)
+    ).scalars().all()
+
+    result = []
+    for ticker in tickers:
+        if book_service.is_ready():
+            best_bid, best_ask = book_service.best_prices(ticker)
+        else:
+            best_bid, best_ask = book_service.get_db_best_prices(db, ticker)
+        with _lock:
+            stats = _stats.get(ticker)
+            if stats is None:
+                result.append(Ticker(ticker=ticker, best_bid=best_bid, best_ask=best_ask))
+                continue
+            stats.expire(cutoff)
+            result.append(Ticker(
+                ticker=ticker,
+                last_price=stats.last_price,
+                volume_24h=stats.volume,
+                high_24h=stats.high,
+                low_24h=stats.low,
+                best_bid=best_bid,
+                best_ask=best_ask
+            ))
+    return result
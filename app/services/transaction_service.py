@@ -1,28 +1,157 @@
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import select, union_all, literal
+from fastapi import HTTPException
+from typing import List, Optional
+from datetime import datetime, timezone
+from uuid import UUID
 from app.models.transaction import Transaction as TransactionModel
-from app.schemas.transaction import Transaction
+from app.schemas.order import Direction
+from app.schemas.transaction import Transaction, Fill
 from app.services import instrument_service
+from app.core.serialization import dumps, packb
 import logging
 
+# Максимальное число сделок пользователя в одном ответе
+MAX_FILLS_LIMIT = 1000
+
+# Все выборки читают только нужные колонки и строятся по индексам (ticker, timestamp),
+# (buyer_id, timestamp) и (seller_id, timestamp), которые включают эти колонки,
+# поэтому сделки не загружаются как ORM-объекты и строки таблицы не читаются.
+
+def _naive_utc(moment: datetime) -> datetime:
+    """Время сделок хранится в UTC без часового пояса"""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _time_range(query, since: Optional[datetime], until: Optional[datetime]):
+    """Фильтр по времени сделки: since включительно, until не включительно"""
+    if since is not None:
+        query = query.where(TransactionModel.timestamp >= _naive_utc(since))
+    if until is not None:
+        query = query.where(TransactionModel.timestamp < _naive_utc(until))
+    return query
+
+def _trades_query(ticker: str, limit: int, since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Последние сделки по тикеру"""
+    query = select(
+        TransactionModel.ticker,
+        TransactionModel.amount,
+        TransactionModel.price,
+        TransactionModel.timestamp
+    ).where(TransactionModel.ticker == ticker)
+    return _time_range(query, since, until).order_by(TransactionModel.timestamp.desc()).limit(limit)
+
+def _side_query(user_column, direction: Direction, user_id: UUID, ticker: Optional[str],
+                since: Optional[datetime], until: Optional[datetime], limit: int):
+    """Последние сделки пользователя на одной стороне (покупатель или продавец)"""
+    query = select(
+        TransactionModel.id,
+        TransactionModel.ticker,
+        literal(direction.value).label("direction"),
+        TransactionModel.amount,
+        TransactionModel.price,
+        TransactionModel.timestamp
+    ).where(user_column == user_id)
+    if ticker is not None:
+        query = query.where(TransactionModel.ticker == ticker)
+    return _time_range(query, since, until).order_by(TransactionModel.timestamp.desc()).limit(limit)
+
+def _fills_query(user_id: UUID, ticker: Optional[str], since: Optional[datetime],
+                 until: Optional[datetime], limit: int):
+    """Последние сделки пользователя с обеих сторон одним запросом.
+    Условие buyer_id = :user OR seller_id = :user не использует индексы,
+    поэтому каждая сторона выбирается отдельно и результаты объединяются."""
+    sides = [
+        select(_side_query(column, direction, user_id, ticker, since, until, limit).subquery())
+        for column, direction in (
+            (TransactionModel.buyer_id, Direction.BUY),
+            (TransactionModel.seller_id, Direction.SELL),
+        )
+    ]
+    fills = union_all(*sides).subquery()
+    return select(fills).order_by(fills.c.timestamp.desc()).limit(limit)
+
 async def get_transaction_history(db: Session, ticker: str, limit: int = 10) -> List[Transaction]:
     """Получение истории сделок"""
     logger = logging.getLogger(__name__)
     logger.info(f"Getting transaction history for {ticker}, limit: {limit}")
-    
+
     # Проверяем существование инструмента
     await instrument_service.get_instrument(db, ticker)
-    
-    transactions = db.query(TransactionModel).filter(
-        TransactionModel.ticker == ticker
-    ).order_by(TransactionModel.timestamp.desc()).limit(limit).all()
-    
-    # Конвертируем в схему согласно OpenAPI
-    return [
-        Transaction(
-            ticker=tx.ticker,
-            amount=tx.amount,
-            price=tx.price,
-            timestamp=tx.timestamp
-        ) for tx in transactions
-    ] 
\ No newline at end of file
+
+    return [Transaction(**row._mapping) for row in db.execute(_trades_query(ticker, limit))]
+
+async def _trade_rows(db: Session, ticker: str, limit: int) -> List[dict]:
+    await instrument_service.get_instrument(db, ticker)
+    return [dict(row._mapping) for row in db.execute(_trades_query(ticker, limit))]
+
+async def get_transaction_history_json(db: Session, ticker: str, limit: int = 10) -> bytes:
+    """История сделок, сериализованная в JSON сразу из строк выборки"""
+    return dumps(await _trade_rows(db, ticker, limit))
+
+async def get_transaction_history_msgpack(db: Session, ticker: str, limit: int = 10) -> bytes:
+    """История сделок в MessagePack"""
+    return packb(await _trade_rows(db, ticker, limit))
+
+def _check_fills_request(limit: int, since: Optional[datetime], until: Optional[datetime]):
+    if limit < 1 or limit > MAX_FILLS_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Лимит должен быть от 1 до {MAX_FILLS_LIMIT}")
+    if since is not None and until is not None and _naive_utc(since) >= _naive_utc(until):
+        raise HTTPException(status_code=400, detail="Неверный интервал времени")
+
+def _fill_row_to_dict(row) -> dict:
+    return {
+        "transaction_id": row.id,
+        "ticker": row.ticker,
+        "direction": row.direction,
+        "amount": row.amount,
+        "price": row.price,
+        "timestamp": row.timestamp,
+    }
+
+async def _fill_rows(
+    db: Session,
+    user_id: UUID,
+    ticker: Optional[str],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    limit: int
+) -> List[dict]:
+    _check_fills_request(limit, since, until)
+    if ticker is not None:
+        await instrument_service.get_instrument(db, ticker)
+    return [_fill_row_to_dict(row) for row in db.execute(_fills_query(user_id, ticker, since, until, limit))]
+
+async def get_fills(
+    db: Session,
+    user_id: UUID,
+    ticker: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 100
+) -> List[Fill]:
+    """Сделки пользователя, новые первыми"""
+    return [Fill(**row) for row in await _fill_rows(db, user_id, ticker, since, until, limit)]
+
+async def get_fills_json(
+    db: Session,
+    user_id: UUID,
+    ticker: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 100
+) -> bytes:
+    """Сделки пользователя, сериализованные в JSON"""
+    return dumps(await _fill_rows(db, user_id, ticker, since, until, limit))
+
+async def get_fills_msgpack(
+    db: Session,
+    user_id: UUID,
+    ticker: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 100
+) -> bytes:
+    """Сделки пользователя в MessagePack"""
+    return packb(await _fill_rows(db, user_id, ticker, since, until, limit))
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 from app.models.user import User
+from app.models.base import mark_write
 from app.schemas.user import NewUser, UserRole
 from app.core.security import create_api_key
 from uuid import UUID, uuid4
@@ -28,6 +29,7 @@ async def create_user(db: Session, user_data: NewUser) -> User:
         # Обновляем api_key с реальным id пользователя
         user.api_key = create_api_key(user.id)
         db.commit()
+        mark_write(user.id)
         logger.info(f"Successfully created user {user.id} (name: {user.name})")
     except Exception as e:
         db.rollback()
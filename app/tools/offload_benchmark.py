@@ -0,0 +1,173 @@
+"""Сравнение выполнения запросов к БД в цикле событий и в пуле потоков.
+
+Запускает одновременных клиентов, которые читают балансы и стакан и выставляют
+лимитные заявки через сервисы приложения, сначала без пула (DB_OFFLOAD_THREADS=0),
+затем с заданным числом потоков. Печатает пропускную способность и задержки.
+
+Пример:
+    python -m app.tools.offload_benchmark --threads 8 --clients 32 --latency-ms 2
+
+--latency-ms добавляет задержку перед каждым SQL-запросом и имитирует
+сетевую задержку до PostgreSQL: на локальном SQLite запросы почти не ждут.
+Каждый прогон пересоздает схему БД из DATABASE_URL (по умолчанию временный
+файл SQLite), поэтому указывать рабочую базу нельзя.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+# Модули приложения импортируются внутри функций: настройки читаются при импорте,
+# а переменные окружения по умолчанию задаются в main()
+
+TICKER = "MEM"
+
+async def _prepare(users: int) -> List[object]:
+    """Схема, инструменты и пользователи с балансами"""
+    from app.tools.simulator import _prepare_database
+    from app.models.base import SessionLocal
+    from app.schemas.instrument import Instrument
+    from app.schemas.user import NewUser
+    from app.services import instrument_service, user_service, balance_service, book_service, ticker_service
+
+    _prepare_database()
+    user_ids = []
+    with SessionLocal() as db:
+        for ticker in ("RUB", TICKER):
+            await instrument_service.add_instrument(db, Instrument(ticker=ticker, name=ticker))
+        for index in range(users):
+            user = await user_service.create_user(db, NewUser(name=f"bench-{index}"))
+            await balance_service.deposit(db, user.id, "RUB", 10 ** 9)
+            await balance_service.deposit(db, user.id, TICKER, 10 ** 6)
+            user_ids.append(user.id)
+        await book_service.load_books(db)
+        await ticker_service.load_stats(db)
+    return user_ids
+
+async def _client(rng: random.Random, user_ids: List[object], requests: int, write_ratio: float,
+                  latencies: Dict[str, List[float]]):
+    from fastapi import HTTPException
+    from app.core import offload
+    from app.models.base import SessionLocal
+    from app.schemas.order import LimitOrderBody
+    from app.services import balance_service, order_service
+
+    for _ in range(requests):
+        user_id = rng.choice(user_ids)
+        started = time.perf_counter()
+        with SessionLocal() as db:
+            if rng.random() < write_ratio:
+                kind = "write"
+                order = LimitOrderBody(
+                    direction=rng.choice(["BUY", "SELL"]),
+                    ticker=TICKER,
+                    qty=rng.randint(1, 5),
+                    price=rng.randint(95, 105)
+                )
+                try:
+                    await offload.run_write(order_service.create_order, db, user_id, order)
+                except HTTPException:
+                    pass
+            elif rng.random() < 0.5:
+                kind = "read"
+                await offload.run_read(balance_service.get_user_balances, db, user_id)
+            else:
+                kind = "read"
+                await offload.run_read(order_service.get_orderbook_json, db, TICKER, 10)
+        latencies[kind].append(time.perf_counter() - started)
+
+async def _probe_loop(stop: asyncio.Event, lags: List[float], interval: float = 0.01):
+    """Задержка цикла событий: насколько позже срабатывает sleep(interval)"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - started - interval))
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 3)
+
+async def _run(threads: int, args, user_ids: List[object]) -> dict:
+    from app.core import offload
+
+    offload.reads = offload.OffloadPool("db-read", threads)
+    offload.writes = offload.OffloadPool("db-write", 1 if threads > 0 else 0)
+
+    latencies: Dict[str, List[float]] = {"read": [], "write": []}
+    lags: List[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe_loop(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        _client(random.Random(args.seed + index), user_ids, args.requests, args.write_ratio, latencies)
+        for index in range(args.clients)
+    ])
+    wall = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    result = {
+        "threads": threads,
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(args.clients * args.requests / wall, 1),
+        "loop_lag_ms": {"p99": _percentile(lags, 0.99), "max": _percentile(lags, 1.0)},
+        "offload": offload.metrics(),
+    }
+    for kind, values in latencies.items():
+        result[f"{kind}_ms"] = {
+            "count": len(values),
+            "p50": _percentile(values, 0.5),
+            "p99": _percentile(values, 0.99),
+            "max": _percentile(values, 1.0),
+        }
+    offload.reads.shutdown()
+    offload.writes.shutdown()
+    return result
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Сравнение выполнения запросов к БД в цикле событий и в пуле потоков")
+    parser.add_argument("--threads", type=int, default=8, help="потоков чтения во втором прогоне")
+    parser.add_argument("--clients", type=int, default=32, help="одновременных клиентов")
+    parser.add_argument("--requests", type=int, default=50, help="запросов на клиента")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="доля заявок среди запросов")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="задержка перед каждым SQL-запросом")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="CRITICAL")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level)
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "exchange-offload-benchmark.db"))
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("ADMIN_API_KEY", "benchmark")
+    # Пул соединений должен вмещать все потоки и клиентов в цикле событий
+    os.environ.setdefault("DB_POOL_SIZE", str(max(args.threads + 1, 5)))
+    os.environ.setdefault("DB_MAX_OVERFLOW", str(args.clients))
+
+    from sqlalchemy import event
+    from app.models.base import engine
+
+    if args.latency_ms > 0:
+        delay = args.latency_ms / 1000
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _network_delay(conn, cursor, statement, parameters, context, executemany):
+            time.sleep(delay)
+
+    results = []
+    for threads in (0, args.threads):
+        user_ids = asyncio.run(_prepare(args.users))
+        results.append(asyncio.run(_run(threads, args, user_ids)))
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+"""Детерминированный симулятор рынка для регрессионной проверки движка исполнения.
+
+Генерирует поток заявок по seed (пуассоновский поток, случайное блуждание цены,
+доля отмен и изменений) или воспроизводит записанный журнал операций в формате
+JSON Lines и прогоняет его через order_service напрямую, без HTTP.
+После прогона проверяются инварианты и печатается пропускная способность.
+
+Пример:
+    python -m app.tools.simulator --seed 42 --orders 5000 --record flow.jsonl
+    python -m app.tools.simulator --replay flow.jsonl
+
+Каждый прогон пересоздает схему БД из DATABASE_URL (по умолчанию временный
+файл SQLite), поэтому указывать рабочую базу нельзя.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional
+from uuid import UUID
+
+# Модули приложения импортируются внутри функций: настройки читаются при импорте,
+# а переменные окружения по умолчанию задаются в main()
+
+# Журнал операций, по одной операции на строку:
+#   {"op": "instrument", "ticker": "MEM"}
+#   {"op": "user", "user": 0}
+#   {"op": "deposit", "user": 0, "ticker": "RUB", "amount": 1000000}
+#   {"seq": 5, "t": 0.12, "op": "create", "user": 0, "body": {...}}
+#   {"seq": 6, "t": 0.13, "op": "cancel", "user": 0, "ref": 5}
+#   {"seq": 7, "t": 0.15, "op": "amend", "user": 0, "ref": 5, "body": {"price": 101}}
+# ref - seq операции create, создавшей ордер; t - время поступления в потоке.
+
+def generate(
+    seed: int,
+    orders: int,
+    users: int,
+    tickers: List[str],
+    rate: float = 100.0,
+    cancel_ratio: float = 0.2,
+    amend_ratio: float = 0.05,
+    market_ratio: float = 0.1,
+    ioc_ratio: float = 0.05,
+    aggressive_ratio: float = 0.3,
+    start_price: int = 1000,
+    volatility: float = 2.0,
+    spread: int = 10,
+    max_qty: int = 10
+) -> Iterator[dict]:
+    """Поток операций, полностью определяемый seed"""
+    rng = random.Random(seed)
+
+    for ticker in ["RUB", *tickers]:
+        yield {"op": "instrument", "ticker": ticker}
+    # Балансы с запасом, чтобы заявки не отклонялись из-за нехватки средств
+    for user in range(users):
+        yield {"op": "user", "user": user}
+        yield {"op": "deposit", "user": user, "ticker": "RUB", "amount": 10 ** 9}
+        for ticker in tickers:
+            yield {"op": "deposit", "user": user, "ticker": ticker, "amount": 10 ** 6}
+
+    mid = {ticker: start_price for ticker in tickers}
+    # Созданные лимитные заявки, которые можно отменить или изменить: (seq, user, ticker)
+    open_refs = []
+    clock = 0.0
+    for seq in range(orders):
+        clock += rng.expovariate(rate)
+        roll = rng.random()
+
+        if open_refs and roll < cancel_ratio:
+            ref, user, _ = open_refs.pop(rng.randrange(len(open_refs)))
+            yield {"seq": seq, "t": round(clock, 6), "op": "cancel", "user": user, "ref": ref}
+            continue
+
+        if open_refs and roll < cancel_ratio + amend_ratio:
+            index = rng.randrange(len(open_refs))
+            ref, user, ticker = open_refs[index]
+            if rng.random() < 0.5:
+                body = {"qty": rng.randint(1, max_qty)}
+            else:
+                # Замена создает новый ордер, дальше на него ссылаются по seq изменения
+                body = {"price": max(1, mid[ticker] + rng.randint(-spread, spread))}
+                open_refs[index] = (seq, user, ticker)
+            yield {"seq": seq, "t": round(clock, 6), "op": "amend", "user": user, "ref": ref, "body": body}
+            continue
+
+        ticker = rng.choice(tickers)
+        mid[ticker] = max(1, round(mid[ticker] + rng.gauss(0, volatility)))
+        user = rng.randrange(users)
+        direction = "BUY" if rng.random() < 0.5 else "SELL"
+        body = {"direction": direction, "ticker": ticker, "qty": rng.randint(1, max_qty)}
+
+        if rng.random() >= market_ratio:
+            offset = rng.randint(0, spread)
+            if rng.random() < aggressive_ratio:
+                offset = -offset
+            body["price"] = max(1, mid[ticker] - offset if direction == "BUY" else mid[ticker] + offset)
+            if rng.random() < ioc_ratio:
+                body["time_in_force"] = "IOC"
+            else:
+                open_refs.append((seq, user, ticker))
+
+        yield {"seq": seq, "t": round(clock, 6), "op": "create", "user": user, "body": body}
+
+def read_log(path: str) -> Iterator[dict]:
+    """Операции из журнала JSON Lines"""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+class Simulator:
+    """Исполнение журнала операций через сервисы и проверка инвариантов"""
+
+    def __init__(self, check_every: int = 100):
+        self.check_every = check_every
+        self.users: Dict[int, object] = {}
+        self.refs: Dict[int, object] = {}
+        self.deposits: Dict[str, int] = {}
+        self.tickers: List[str] = []
+        self.violations: List[str] = []
+        self.latencies: List[float] = []
+        self.counts: Dict[str, int] = {}
+        self.rejects: Dict[str, int] = {}
+        self.trades = 0
+        self.busy = 0.0
+        self._trade_cursor = 0
+
+    async def run(self, operations: Iterator[dict]):
+        from app.models.base import SessionLocal
+        from app.services import book_service
+
+        with SessionLocal() as db:
+            await book_service.load_books(db)
+
+        for index, operation in enumerate(operations, 1):
+            await self._execute(SessionLocal, operation)
+            if self.check_every and index % self.check_every == 0:
+                self.check_state()
+        self.check_state()
+
+    async def _execute(self, session_factory, operation: dict):
+        from fastapi import HTTPException
+        from app.schemas.instrument import Instrument
+        from app.schemas.order import LimitOrderBody, MarketOrderBody, AmendOrderBody
+        from app.schemas.user import NewUser
+        from app.services import instrument_service, user_service, balance_service, order_service
+
+        op = operation["op"]
+        self.counts[op] = self.counts.get(op, 0) + 1
+        with session_factory() as db:
+            if op == "instrument":
+                await instrument_service.add_instrument(db, Instrument(ticker=operation["ticker"], name=operation["ticker"]))
+                if operation["ticker"] != "RUB":
+                    self.tickers.append(operation["ticker"])
+                return
+            if op == "user":
+                user = await user_service.create_user(db, NewUser(name=f"sim-{operation['user']}"))
+                self.users[operation["user"]] = user.id
+                return
+            if op == "deposit":
+                await balance_service.deposit(db, self.users[operation["user"]], operation["ticker"], operation["amount"])
+                self.deposits[operation["ticker"]] = self.deposits.get(operation["ticker"], 0) + operation["amount"]
+                return
+
+            user_id = self.users[operation["user"]]
+            if op != "create" and operation["ref"] not in self.refs:
+                # Ордер не был создан: исходная заявка отклонена
+                self.rejects["unknown ref"] = self.rejects.get("unknown ref", 0) + 1
+                return
+            started = time.perf_counter()
+            try:
+                if op == "create":
+                    body = operation["body"]
+                    order_data = LimitOrderBody(**body) if "price" in body else MarketOrderBody(**body)
+                    result = await order_service.create_order(db, user_id, order_data)
+                    self.refs[operation["seq"]] = result.order_id
+                elif op == "cancel":
+                    await order_service.cancel_order(db, self.refs[operation["ref"]], user_id)
+                elif op == "amend":
+                    result = await order_service.amend_order(
+                        db, self.refs[operation["ref"]], user_id, AmendOrderBody(**operation["body"])
+                    )
+                    self.refs[operation["seq"]] = result.order_id
+                else:
+                    raise ValueError(f"Unknown operation: {op}")
+            except HTTPException as e:
+                self.rejects[e.detail] = self.rejects.get(e.detail, 0) + 1
+                # Отклоненное изменение оставляет прежний ордер
+                if op == "amend":
+                    self.refs[operation["seq"]] = self.refs[operation["ref"]]
+            finally:
+                elapsed = time.perf_counter() - started
+                self.busy += elapsed
+                self.latencies.append(elapsed)
+
+            self._check_fills(db)
+
+    def _violation(self, message: str):
+        self.violations.append(message)
+
+    def _check_fills(self, db):
+        """Сделки последней операции: цена не хуже лимита тейкера,
+        уровни обходятся от лучшего к худшему, внутри уровня - по времени"""
+        from sqlalchemy import select
+        from app.models.order import Order as OrderModel
+        from app.models.outbox import OutboxEvent
+        from app.services import outbox_service
+
+        fills = db.execute(
+            select(OutboxEvent.id, OutboxEvent.payload).where(
+                OutboxEvent.id > self._trade_cursor,
+                OutboxEvent.event_type == outbox_service.TRADE
+            ).order_by(OutboxEvent.id)
+        ).all()
+        if not fills:
+            return
+        self._trade_cursor = fills[-1][0]
+        self.trades += len(fills)
+
+        order_ids = {payload[key] for _, payload in fills for key in ("taker_order_id", "maker_order_id")}
+        orders = {
+            str(order_id): (direction, price, timestamp)
+            for order_id, direction, price, timestamp in db.execute(
+                select(OrderModel.id, OrderModel.direction, OrderModel.price, OrderModel.timestamp).where(
+                    OrderModel.id.in_([UUID(order_id) for order_id in order_ids])
+                )
+            )
+        }
+
+        previous: Dict[str, tuple] = {}
+        for _, payload in fills:
+            taker = orders.get(payload["taker_order_id"])
+            maker = orders.get(payload["maker_order_id"])
+            if taker is None or maker is None:
+                continue
+            direction, limit, _ = taker
+            price = payload["price"]
+            if limit is not None and (price > limit if direction.value == "BUY" else price < limit):
+                self._violation(f"trade {payload['transaction_id']} at {price} violates taker limit {limit}")
+
+            last = previous.get(payload["taker_order_id"])
+            if last is not None:
+                last_price, last_timestamp = last
+                worse = price < last_price if direction.value == "BUY" else price > last_price
+                if worse:
+                    self._violation(f"trade {payload['transaction_id']} at {price} is better than earlier fill at {last_price}")
+                if price == last_price and maker[2] < last_timestamp:
+                    self._violation(f"trade {payload['transaction_id']} skipped an older order at price {price}")
+            previous[payload["taker_order_id"]] = (price, maker[2])
+
+    def check_state(self):
+        """Сохранение RUB и каждого тикера, отсутствие пересечения стакана,
+        совпадение стаканов и счетчиков активных заявок в памяти с БД"""
+        from sqlalchemy import select, func
+        from app.models.base import SessionLocal
+        from app.models.balance import Balance
+        from app.models.order import Order as OrderModel
+        from app.schemas.order import OrderStatus
+        from app.services import book_service
+
+        with SessionLocal() as db:
+            totals = dict(db.execute(select(Balance.ticker, func.sum(Balance.amount)).group_by(Balance.ticker)).all())
+            for ticker, deposited in self.deposits.items():
+                if totals.get(ticker, 0) != deposited:
+                    self._violation(f"{ticker} not conserved: deposited {deposited}, balances hold {totals.get(ticker, 0)}")
+
+            for ticker in self.tickers:
+                best_bid, best_ask = book_service.best_prices(ticker)
+                if best_bid is not None and best_ask is not None and best_bid >= best_ask:
+                    self._violation(f"{ticker} book crossed: bid {best_bid} >= ask {best_ask}")
+                if book_service.get_levels(ticker) != book_service.get_db_levels(db, ticker):
+                    self._violation(f"{ticker} in-memory book differs from active orders in DB")
+
+            open_orders = dict(db.execute(
+                select(OrderModel.user_id, func.count()).where(
+                    OrderModel.status == OrderStatus.NEW
+                ).group_by(OrderModel.user_id)
+            ).all())
+            for user_id in self.users.values():
+                if book_service.open_order_count(user_id) != open_orders.get(user_id, 0):
+                    self._violation(
+                        f"open orders of {user_id}: index {book_service.open_order_count(user_id)}, "
+                        f"DB {open_orders.get(user_id, 0)}"
+                    )
+
+    def summary(self, wall: float) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3)
+
+        engine_ops = len(latencies)
+        return {
+            "operations": self.counts,
+            "trades": self.trades,
+            "rejects": self.rejects,
+            "wall_seconds": round(wall, 3),
+            "engine_seconds": round(self.busy, 3),
+            "engine_ops_per_second": round(engine_ops / self.busy, 1) if self.busy else 0.0,
+            "trades_per_second": round(self.trades / self.busy, 1) if self.busy else 0.0,
+            "latency_ms": {"p50": percentile(0.5), "p99": percentile(0.99), "max": percentile(1.0)},
+            "violations": self.violations[:100],
+            "violation_count": len(self.violations),
+        }
+
+def _prepare_database():
+    """Пересоздание схемы и сброс состояния в памяти"""
+    import glob
+    import importlib
+    from app.models.base import Base, engine
+
+    models_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+    for path in glob.glob(os.path.join(models_dir, "*.py")):
+        importlib.import_module("app.models." + os.path.basename(path)[:-3])
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Детерминированный симулятор рынка")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--orders", type=int, default=2000, help="число операций с заявками")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tickers", default="MEM,DOGE")
+    parser.add_argument("--rate", type=float, default=100.0, help="интенсивность пуассоновского потока, заявок в секунду")
+    parser.add_argument("--cancel-ratio", type=float, default=0.2)
+    parser.add_argument("--amend-ratio", type=float, default=0.05)
+    parser.add_argument("--market-ratio", type=float, default=0.1)
+    parser.add_argument("--volatility", type=float, default=2.0, help="стандартное отклонение шага цены")
+    parser.add_argument("--replay", help="воспроизвести журнал операций вместо генерации")
+    parser.add_argument("--record", help="записать исполненные операции в журнал")
+    parser.add_argument("--check-every", type=int, default=100, help="проверять инварианты каждые N операций")
+    parser.add_argument("--log-level", default="CRITICAL")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level)
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "exchange-simulator.db"))
+    os.environ.setdefault("SECRET_KEY", "simulator")
+    os.environ.setdefault("ADMIN_API_KEY", "simulator")
+    _prepare_database()
+
+    if args.replay:
+        operations = list(read_log(args.replay))
+    else:
+        operations = list(generate(
+            seed=args.seed,
+            orders=args.orders,
+            users=args.users,
+            tickers=args.tickers.split(","),
+            rate=args.rate,
+            cancel_ratio=args.cancel_ratio,
+            amend_ratio=args.amend_ratio,
+            market_ratio=args.market_ratio,
+            volatility=args.volatility
+        ))
+    if args.record:
+        with open(args.record, "w") as f:
+            for operation in operations:
+                f.write(json.dumps(operation) + "\n")
+
+    simulator = Simulator(check_every=args.check_every)
+    started = time.perf_counter()
+    asyncio.run(simulator.run(iter(operations)))
+    result = simulator.summary(time.perf_counter() - started)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 1 if simulator.violations else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
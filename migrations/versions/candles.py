@@ -0,0 +1,50 @@
+"""candles
+
+Revision ID: candles
+Revises: initial
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'candles'
+down_revision = 'initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Применение миграции:
+    1. Создание таблицы свечей OHLCV
+    """
+    op.create_table(
+        'candles',
+        sa.Column('ticker', sa.String(), nullable=False),
+        sa.Column('interval', sa.String(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('open', sa.Integer(), nullable=False),
+        sa.Column('high', sa.Integer(), nullable=False),
+        sa.Column('low', sa.Integer(), nullable=False),
+        sa.Column('close', sa.Integer(), nullable=False),
+        sa.Column('volume', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(
+            ['ticker'], ['instruments.ticker'],
+            ondelete='CASCADE',
+            name='candle_instrument_fk'
+        ),
+        # Первичный ключ покрывает выборку последних свечей по тикеру и интервалу
+        sa.PrimaryKeyConstraint('ticker', 'interval', 'timestamp'),
+        sa.CheckConstraint("interval IN ('1m', '5m', '1h', '1d')", name='candle_interval_check')
+    )
+
+
+def downgrade() -> None:
+    """
+    Откат миграции:
+    1. Удаление таблицы свечей
+    """
+    op.drop_table('candles')
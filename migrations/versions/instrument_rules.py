@@ -0,0 +1,43 @@
+"""instrument_rules
+
+Revision ID: instrument_rules
+Revises: trade_indexes
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'instrument_rules'
+down_revision = 'trade_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Применение миграции:
+    1. Добавление шага цены и размера лота инструмента (по умолчанию 1)
+    2. Добавление допустимого диапазона цены
+    3. Ограничения на положительные шаг цены и размер лота
+    """
+    op.add_column('instruments', sa.Column('tick_size', sa.Integer(), nullable=False, server_default='1'))
+    op.add_column('instruments', sa.Column('lot_size', sa.Integer(), nullable=False, server_default='1'))
+    op.add_column('instruments', sa.Column('min_price', sa.Integer(), nullable=True))
+    op.add_column('instruments', sa.Column('max_price', sa.Integer(), nullable=True))
+    op.create_check_constraint('ck_instruments_tick_size', 'instruments', 'tick_size > 0')
+    op.create_check_constraint('ck_instruments_lot_size', 'instruments', 'lot_size > 0')
+
+
+def downgrade() -> None:
+    """
+    Откат миграции:
+    1. Удаление ограничений
+    2. Удаление колонок торговых параметров
+    """
+    op.drop_constraint('ck_instruments_lot_size', 'instruments', type_='check')
+    op.drop_constraint('ck_instruments_tick_size', 'instruments', type_='check')
+    for column in ('max_price', 'min_price', 'lot_size', 'tick_size'):
+        op.drop_column('instruments', column)
@@ -0,0 +1,35 @@
+"""matching_index
+
+Revision ID: matching_index
+Revises: outbox
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'matching_index'
+down_revision = 'outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Применение миграции:
+    1. Индекс для обхода встречных ордеров в порядке цена-время
+    """
+    op.create_index(
+        'ix_orders_matching',
+        'orders',
+        ['ticker', 'direction', 'status', 'price', 'timestamp', 'id']
+    )
+
+
+def downgrade() -> None:
+    """
+    Откат миграции:
+    1. Удаление индекса исполнения
+    """
+    op.drop_index('ix_orders_matching', table_name='orders')
@@ -0,0 +1,38 @@
+"""order_updated_at
+
+Revision ID: order_updated_at
+Revises: instrument_rules
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'order_updated_at'
+down_revision = 'instrument_rules'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Применение миграции:
+    1. Добавление времени последнего изменения ордера (для существующих - время миграции)
+    2. Индекс для выборки завершенных ордеров при архивировании
+    """
+    op.add_column('orders', sa.Column(
+        'updated_at', sa.DateTime(), nullable=False, server_default=sa.text("(now() AT TIME ZONE 'utc')")
+    ))
+    op.create_index('ix_orders_status_updated_at', 'orders', ['status', 'updated_at'])
+
+
+def downgrade() -> None:
+    """
+    Откат миграции:
+    1. Удаление индекса
+    2. Удаление колонки updated_at
+    """
+    op.drop_index('ix_orders_status_updated_at', table_name='orders')
+    op.drop_column('orders', 'updated_at')
@@ -0,0 +1,42 @@
+"""outbox
+
+Revision ID: outbox
+Revises: partitioning
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'outbox'
+down_revision = 'partitioning'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Применение миграции:
+    1. Создание таблицы событий для ленты изменений (transactional outbox)
+    """
+    op.create_table(
+        'outbox_events',
+        sa.Column('id', sa.BigInteger(), sa.Identity(always=False), nullable=False),
+        sa.Column('event_type', sa.String(), nullable=False),
+        sa.Column('payload', postgresql.JSONB(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False, server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_events_timestamp', 'outbox_events', ['timestamp'])
+
+
+def downgrade() -> None:
+    """
+    Откат миграции:
+    1. Удаление таблицы событий
+    """
+    op.drop_index('ix_outbox_events_timestamp', table_name='outbox_events')
+    op.drop_table('outbox_events')
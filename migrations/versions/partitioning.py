@@ -0,0 +1,140 @@
+"""partitioning
+
+Revision ID: partitioning
+Revises: candles
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from datetime import date, datetime, timezone
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'partitioning'
+down_revision = 'candles'
+branch_labels = None
+depends_on = None
+
+# На сколько месяцев вперед создаются секции
+MONTHS_AHEAD = 3
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _create_monthly_partitions(table: str, first: date) -> None:
+    """Создание месячных секций от first до MONTHS_AHEAD месяцев вперед"""
+    lower = first.replace(day=1)
+    last = _add_months(datetime.now(timezone.utc).date().replace(day=1), MONTHS_AHEAD)
+    while lower <= last:
+        upper = _add_months(lower, 1)
+        op.execute(
+            f"CREATE TABLE {table}_{lower:%Y%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        lower = upper
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+
+def _oldest(table: str) -> date:
+    """Дата самой старой строки таблицы (или текущая дата для пустой таблицы)"""
+    oldest = op.get_bind().execute(sa.text(f"SELECT min(timestamp) FROM {table}")).scalar()
+    return oldest.date() if oldest else datetime.now(timezone.utc).date()
+
+
+def upgrade() -> None:
+    """
+    Применение миграции:
+    1. Перенос transactions в таблицу, секционированную по timestamp
+    2. Создание секционированного архива завершенных ордеров
+    """
+    # Переносим существующую таблицу сделок
+    op.execute("ALTER TABLE transactions RENAME TO transactions_legacy")
+    op.execute("ALTER TABLE transactions_legacy RENAME CONSTRAINT transactions_pkey TO transactions_legacy_pkey")
+    op.drop_index('ix_transactions_ticker', table_name='transactions_legacy')
+    op.drop_index('ix_transactions_timestamp', table_name='transactions_legacy')
+
+    op.execute("""
+        CREATE TABLE transactions (
+            id UUID NOT NULL,
+            ticker VARCHAR NOT NULL,
+            buyer_id UUID NOT NULL,
+            seller_id UUID NOT NULL,
+            amount INTEGER NOT NULL,
+            price INTEGER NOT NULL,
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT transactions_pkey PRIMARY KEY (id, timestamp),
+            CONSTRAINT transaction_buyer_fk FOREIGN KEY (buyer_id) REFERENCES users (id) ON DELETE CASCADE,
+            CONSTRAINT transaction_seller_fk FOREIGN KEY (seller_id) REFERENCES users (id) ON DELETE CASCADE,
+            CONSTRAINT transaction_instrument_fk FOREIGN KEY (ticker) REFERENCES instruments (ticker) ON DELETE CASCADE,
+            CONSTRAINT transaction_amount_check CHECK (amount > 0),
+            CONSTRAINT transaction_price_check CHECK (price > 0),
+            CONSTRAINT transaction_different_users_check CHECK (buyer_id != seller_id)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    _create_monthly_partitions('transactions', _oldest('transactions_legacy'))
+    op.execute("INSERT INTO transactions SELECT id, ticker, buyer_id, seller_id, amount, price, timestamp FROM transactions_legacy")
+    op.drop_table('transactions_legacy')
+
+    op.create_index('ix_transactions_ticker_timestamp', 'transactions', ['ticker', 'timestamp'])
+
+    # Архив завершенных ордеров
+    op.execute("""
+        CREATE TABLE orders_archive (
+            id UUID NOT NULL,
+            user_id UUID NOT NULL,
+            ticker VARCHAR NOT NULL,
+            direction direction NOT NULL,
+            status order_status NOT NULL,
+            qty INTEGER NOT NULL,
+            price INTEGER,
+            filled INTEGER NOT NULL DEFAULT 0,
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            CONSTRAINT orders_archive_pkey PRIMARY KEY (id, timestamp),
+            CONSTRAINT order_archive_user_fk FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+            CONSTRAINT order_archive_instrument_fk FOREIGN KEY (ticker) REFERENCES instruments (ticker) ON DELETE CASCADE
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    _create_monthly_partitions('orders_archive', _oldest('orders'))
+
+    op.create_index('ix_orders_archive_id', 'orders_archive', ['id'])
+    op.create_index('ix_orders_archive_user_id', 'orders_archive', ['user_id'])
+
+
+def downgrade() -> None:
+    """
+    Откат миграции:
+    1. Возврат архивных ордеров в orders и удаление архива
+    2. Перенос сделок в обычную таблицу
+    """
+    op.execute("INSERT INTO orders SELECT id, user_id, ticker, direction, status, qty, price, filled, timestamp FROM orders_archive")
+    op.drop_table('orders_archive')
+
+    op.execute("ALTER TABLE transactions RENAME TO transactions_partitioned")
+    op.execute("ALTER TABLE transactions_partitioned RENAME CONSTRAINT transactions_pkey TO transactions_partitioned_pkey")
+    op.drop_index('ix_transactions_ticker_timestamp', table_name='transactions_partitioned')
+    op.create_table(
+        'transactions',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('ticker', sa.String(), nullable=False),
+        sa.Column('buyer_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('seller_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('amount', sa.Integer(), nullable=False),
+        sa.Column('price', sa.Integer(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False, server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.ForeignKeyConstraint(['buyer_id'], ['users.id'], ondelete='CASCADE', name='transaction_buyer_fk'),
+        sa.ForeignKeyConstraint(['seller_id'], ['users.id'], ondelete='CASCADE', name='transaction_seller_fk'),
+        sa.ForeignKeyConstraint(['ticker'], ['instruments.ticker'], ondelete='CASCADE', name='transaction_instrument_fk'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.CheckConstraint('amount > 0', name='transaction_amount_check'),
+        sa.CheckConstraint('price > 0', name='transaction_price_check'),
+        sa.CheckConstraint('buyer_id != seller_id', name='transaction_different_users_check')
+    )
+    op.execute("INSERT INTO transactions SELECT id, ticker, buyer_id, seller_id, amount, price, timestamp FROM transactions_partitioned")
+    op.drop_table('transactions_partitioned')
+    op.create_index('ix_transactions_ticker', 'transactions', ['ticker'])
+    op.create_index('ix_transactions_timestamp', 'transactions', ['timestamp'])
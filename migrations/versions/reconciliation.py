@@ -0,0 +1,55 @@
+"""reconciliation
+
+Revision ID: reconciliation
+Revises: order_updated_at
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'reconciliation'
+down_revision = 'order_updated_at'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Применение миграции:
+    1. Таблица курсора сверки
+    2. Таблица ожидаемых балансов
+    3. Таблица ожидаемого исполненного объема активных ордеров
+    """
+    op.create_table(
+        'reconciliation_state',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('watermark', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'reconciliation_balances',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('ticker', sa.String(), nullable=False),
+        sa.Column('amount', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'ticker')
+    )
+    op.create_table(
+        'reconciliation_orders',
+        sa.Column('order_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('filled', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('order_id')
+    )
+
+
+def downgrade() -> None:
+    """
+    Откат миграции:
+    1. Удаление таблиц сверки
+    """
+    op.drop_table('reconciliation_orders')
+    op.drop_table('reconciliation_balances')
+    op.drop_table('reconciliation_state')
@@ -0,0 +1,50 @@
+"""time_in_force
+
+Revision ID: time_in_force
+Revises: matching_index
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'time_in_force'
+down_revision = 'matching_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Применение миграции:
+    1. Создание типа time_in_force
+    2. Добавление срока действия и признака post-only в ордера и архив ордеров
+    """
+    time_in_force = postgresql.ENUM('GTC', 'IOC', 'FOK', name='time_in_force')
+    time_in_force.create(op.get_bind(), checkfirst=True)
+
+    for table in ('orders', 'orders_archive'):
+        op.add_column(table, sa.Column(
+            'time_in_force',
+            postgresql.ENUM('GTC', 'IOC', 'FOK', name='time_in_force', create_type=False),
+            nullable=False,
+            server_default='GTC'
+        ))
+        op.add_column(table, sa.Column(
+            'post_only', sa.Boolean(), nullable=False, server_default=sa.text('false')
+        ))
+
+
+def downgrade() -> None:
+    """
+    Откат миграции:
+    1. Удаление колонок срока действия и post-only
+    2. Удаление типа time_in_force
+    """
+    for table in ('orders_archive', 'orders'):
+        op.drop_column(table, 'post_only')
+        op.drop_column(table, 'time_in_force')
+    postgresql.ENUM(name='time_in_force').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,54 @@
+"""trade_indexes
+
+Revision ID: trade_indexes
+Revises: time_in_force
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'trade_indexes'
+down_revision = 'time_in_force'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Применение миграции:
+    1. Покрывающий индекс ленты сделок по тикеру
+    2. Покрывающие индексы сделок пользователя на стороне покупателя и продавца
+    """
+    op.drop_index('ix_transactions_ticker_timestamp', table_name='transactions')
+    op.create_index(
+        'ix_transactions_ticker_timestamp',
+        'transactions',
+        ['ticker', 'timestamp'],
+        postgresql_include=['amount', 'price']
+    )
+    op.create_index(
+        'ix_transactions_buyer_timestamp',
+        'transactions',
+        ['buyer_id', 'timestamp'],
+        postgresql_include=['id', 'ticker', 'amount', 'price']
+    )
+    op.create_index(
+        'ix_transactions_seller_timestamp',
+        'transactions',
+        ['seller_id', 'timestamp'],
+        postgresql_include=['id', 'ticker', 'amount', 'price']
+    )
+
+
+def downgrade() -> None:
+    """
+    Откат миграции:
+    1. Удаление индексов сделок пользователя
+    2. Индекс ленты сделок без включенных колонок
+    """
+    op.drop_index('ix_transactions_seller_timestamp', table_name='transactions')
+    op.drop_index('ix_transactions_buyer_timestamp', table_name='transactions')
+    op.drop_index('ix_transactions_ticker_timestamp', table_name='transactions')
+    op.create_index('ix_transactions_ticker_timestamp', 'transactions', ['ticker', 'timestamp'])
@@ -0,0 +1,44 @@
+import glob
+import importlib
+import os
+import tempfile
+
+import pytest
+
+# Настройки читаются при импорте модулей приложения, поэтому окружение задается до них
+_db_dir = tempfile.mkdtemp(prefix="exchange-tests-")
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(_db_dir, "primary.db"))
+# Отдельный файл заменяет реплику: репликации нет, поэтому видно, в какую БД ушел запрос
+os.environ.setdefault("READ_DATABASE_URL", "sqlite:///" + os.path.join(_db_dir, "replica.db"))
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("ADMIN_API_KEY", "test")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from app.models.base import Base, SessionLocal, engine, read_engine
+from app.services import book_service, reconciliation_service
+
+for path in glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "models", "*.py")):
+    importlib.import_module("app.models." + os.path.basename(path)[:-3])
+
+@pytest.fixture
+def db():
+    """Сессия основной БД с чистой схемой (в основной БД и реплике), пустыми стаканами и состоянием сверки в памяти"""
+    for target in (engine, read_engine):
+        Base.metadata.drop_all(target)
+        Base.metadata.create_all(target)
+    book_service.clear()
+    reconciliation_service.clear()
+    with SessionLocal() as session:
+        yield session
+    book_service.clear()
+    reconciliation_service.clear()
+
+@pytest.fixture
+def client(db, monkeypatch):
+    """HTTP-клиент прогретого приложения без фоновых задач запуска"""
+    from fastapi.testclient import TestClient
+    from app.core import startup
+    from app.main import app
+
+    monkeypatch.setattr(startup, "_ready", True)
+    return TestClient(app)
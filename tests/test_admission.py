@@ -0,0 +1,22 @@
+"""Контроль допуска и пробы здоровья"""
+from fastapi.testclient import TestClient
+
+from app.core.rate_limit import admission
+from app.main import app
+
+def test_probes_bypass_admission_control(monkeypatch):
+    monkeypatch.setattr(admission, "max_inflight", 1)
+    client = TestClient(app)
+
+    # Проба не учитывает саму себя: при свободном лимите проверка допуска проходит
+    ready = client.get("/health/ready").json()
+    assert ready["checks"]["admission"] is True
+    assert ready["queue"]["inflight_requests"] == 0
+
+    # При исчерпанном лимите запросы API сбрасываются, а проба живости отвечает
+    monkeypatch.setattr(admission, "inflight", 1)
+    assert client.get("/api/v1/public/instrument").status_code == 429
+    assert client.get("/health/live").status_code == 200
+    ready = client.get("/health/ready")
+    assert ready.status_code == 503
+    assert ready.json()["checks"]["admission"] is False
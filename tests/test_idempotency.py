@@ -0,0 +1,104 @@
+"""Ключи идемпотентности"""
+import asyncio
+from uuid import UUID, uuid4
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.idempotency import IdempotencyStore
+from app.models.order import Order as OrderModel
+from app.services import order_service
+
+ADMIN = {"Authorization": "TOKEN test"}
+
+@pytest.fixture
+def trader(client):
+    """Заголовки пользователя с балансами RUB и MEM"""
+    for ticker, name in (("RUB", "Российский рубль"), ("MEM", "Memcoin")):
+        client.post("/api/v1/admin/instrument", json={"ticker": ticker, "name": name}, headers=ADMIN)
+    user = client.post("/api/v1/public/register", json={"name": "trader"}).json()
+    for ticker in ("RUB", "MEM"):
+        client.post("/api/v1/admin/balance/deposit", json={"user_id": user["id"], "ticker": ticker, "amount": 1000}, headers=ADMIN)
+    return {"Authorization": "TOKEN " + user["api_key"]}
+
+def _post_order(client, headers, key, price=100):
+    return client.post(
+        "/api/v1/order",
+        json={"direction": "BUY", "ticker": "MEM", "qty": 1, "price": price},
+        headers={**headers, "Idempotency-Key": key}
+    )
+
+def test_replay_returns_stored_result(client, db, trader):
+    key = str(uuid4())
+    first = _post_order(client, trader, key)
+    second = _post_order(client, trader, key)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert "idempotent-replayed" not in first.headers
+    assert second.headers["idempotent-replayed"] == "true"
+    assert db.query(OrderModel).count() == 1
+
+def test_same_key_with_other_parameters_is_rejected(client, db, trader):
+    key = str(uuid4())
+    assert _post_order(client, trader, key).status_code == 200
+    response = _post_order(client, trader, key, price=101)
+    assert response.status_code == 422
+    assert db.query(OrderModel).count() == 1
+
+def test_order_committed_before_failed_execution_is_replayed(client, db, trader, monkeypatch):
+    async def failing_execution(db, order):
+        raise HTTPException(status_code=400, detail="Ошибка при исполнении ордера")
+
+    monkeypatch.setattr(order_service, "try_execute_order", failing_execution)
+    key = str(uuid4())
+    assert _post_order(client, trader, key).status_code == 400
+
+    # Ордер уже зафиксирован: повтор не создает второй
+    retry = _post_order(client, trader, key)
+    assert retry.status_code == 200
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert db.query(OrderModel).one().id == UUID(retry.json()["order_id"])
+
+def test_failed_attempt_without_result_can_be_retried(client, trader):
+    user_id = client.post("/api/v1/public/register", json={"name": "empty"}).json()["id"]
+    key = str(uuid4())
+    body = {"user_id": user_id, "ticker": "RUB", "amount": 10}
+    headers = {**ADMIN, "Idempotency-Key": key}
+
+    assert client.post("/api/v1/admin/balance/withdraw", json=body, headers=headers).status_code == 400
+    client.post("/api/v1/admin/balance/deposit", json=body, headers=ADMIN)
+    assert client.post("/api/v1/admin/balance/withdraw", json=body, headers=headers).status_code == 200
+
+def test_concurrent_duplicates_run_once():
+    store = IdempotencyStore(ttl=60, max_entries=10)
+    calls = []
+
+    async def operation(remember):
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(*[store.run(("key",), "fingerprint", operation) for _ in range(3)])
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert sorted(results, key=lambda item: item[1]) == [("result", False), ("result", True), ("result", True)]
+
+def test_concurrent_duplicate_with_other_parameters_is_rejected():
+    store = IdempotencyStore(ttl=60, max_entries=10)
+
+    async def operation(remember):
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def scenario():
+        first = asyncio.ensure_future(store.run(("key",), "a", operation))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as error:
+            await store.run(("key",), "b", operation)
+        assert error.value.status_code == 422
+        return await first
+
+    assert asyncio.run(scenario()) == ("result", False)
@@ -0,0 +1,92 @@
+"""Торговые параметры инструментов: лот, шаг цены и ценовой диапазон"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+from app.models.base import ReadSessionLocal, read_engine
+from app.models.instrument import Instrument as InstrumentModel
+from app.models.order import Order as OrderModel
+from app.schemas.instrument import Instrument, InstrumentRules
+from app.schemas.order import AmendOrderBody, LimitOrderBody, MarketOrderBody, OrderStatus
+from app.schemas.user import NewUser
+from app.services import balance_service, instrument_service, order_service, user_service
+
+RULES = InstrumentRules(tick_size=5, lot_size=10, min_price=50, max_price=200)
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+@pytest.fixture
+def trader(db, monkeypatch):
+    """Пользователь с балансами и инструмент MEM с лотом 10, шагом 5 и диапазоном [50, 200]"""
+    monkeypatch.setattr(instrument_service, "_specs", {})
+    for ticker, name in (("RUB", "Российский рубль"), ("MEM", "Memcoin")):
+        _run(instrument_service.add_instrument(db, Instrument(ticker=ticker, name=name)))
+    _run(instrument_service.update_instrument_rules(db, "MEM", RULES))
+    user = _run(user_service.create_user(db, NewUser(name="trader")))
+    _run(balance_service.deposit(db, user.id, "RUB", 100000))
+    _run(balance_service.deposit(db, user.id, "MEM", 1000))
+    return user.id
+
+def _rejected(coroutine) -> str:
+    with pytest.raises(HTTPException) as error:
+        _run(coroutine)
+    assert error.value.status_code == 400
+    return error.value.detail
+
+@pytest.mark.parametrize("qty, price, detail", [
+    (15, 100, "Объем должен быть кратен размеру лота (10)"),
+    (10, 102, "Цена должна быть кратна шагу цены (5)"),
+    (10, 45, "Цена вне допустимого диапазона"),
+    (10, 205, "Цена вне допустимого диапазона"),
+])
+def test_limit_order_rules(db, trader, qty, price, detail):
+    body = LimitOrderBody(direction="BUY", ticker="MEM", qty=qty, price=price)
+    assert _rejected(order_service.create_order(db, trader, body)) == detail
+    assert db.query(OrderModel).count() == 0
+
+    valid = LimitOrderBody(direction="BUY", ticker="MEM", qty=20, price=200)
+    assert _run(order_service.create_order(db, trader, valid)).success
+
+def test_market_order_checks_only_lot(db, trader):
+    body = MarketOrderBody(direction="SELL", ticker="MEM", qty=5)
+    assert _rejected(order_service.create_order(db, trader, body)) == "Объем должен быть кратен размеру лота (10)"
+
+def test_amend_in_place_checks_lot(db, trader):
+    order_id = _run(order_service.create_order(db, trader, LimitOrderBody(direction="SELL", ticker="MEM", qty=30, price=100))).order_id
+
+    detail = _rejected(order_service.amend_order(db, order_id, trader, AmendOrderBody(qty=25)))
+    assert detail == "Объем должен быть кратен размеру лота (10)"
+    assert _run(order_service.amend_order(db, order_id, trader, AmendOrderBody(qty=20))).order_id == order_id
+    db.expire_all()
+    assert db.get(OrderModel, order_id).qty == 20
+
+@pytest.mark.parametrize("changes, detail", [
+    ({"price": 102}, "Цена должна быть кратна шагу цены (5)"),
+    ({"price": 250}, "Цена вне допустимого диапазона"),
+    ({"qty": 35}, "Объем должен быть кратен размеру лота (10)"),
+])
+def test_amend_replace_checks_rules(db, trader, changes, detail):
+    order_id = _run(order_service.create_order(db, trader, LimitOrderBody(direction="SELL", ticker="MEM", qty=30, price=100))).order_id
+
+    assert _rejected(order_service.amend_order(db, order_id, trader, AmendOrderBody(**changes))) == detail
+    # Отклоненная замена не трогает исходный ордер
+    db.expire_all()
+    order = db.get(OrderModel, order_id)
+    assert (order.status, order.qty, order.price) == (OrderStatus.NEW, 30, 100)
+    assert db.query(OrderModel).count() == 1
+
+def test_replica_read_does_not_cache_stale_rules(db, trader):
+    # Реплика отстает: в ней инструмент еще без торговых параметров
+    with read_engine.begin() as connection:
+        connection.execute(insert(InstrumentModel).values(ticker="MEM", name="Memcoin", is_active=True))
+
+    with ReadSessionLocal() as read_db:
+        assert _run(instrument_service.get_instrument_spec(read_db, "MEM")).lot_size == 1
+
+    # Проверка заявки видит параметры из основной БД, а не закэшированные с реплики
+    body = LimitOrderBody(direction="BUY", ticker="MEM", qty=5, price=100)
+    assert _rejected(order_service.create_order(db, trader, body)) == "Объем должен быть кратен размеру лота (10)"
+    assert instrument_service._specs["MEM"][1].lot_size == 10
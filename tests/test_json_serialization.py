@@ -0,0 +1,72 @@
+"""Ответы *_json совпадают побайтно с сериализацией по response_model"""
+import asyncio
+
+import pytest
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute, serialize_response
+
+from app.main import app
+from app.schemas.instrument import Instrument
+from app.schemas.order import LimitOrderBody
+from app.schemas.user import NewUser
+from app.services import balance_service, book_service, instrument_service, order_service, user_service
+
+def _route(path: str) -> APIRoute:
+    return next(route for route in app.routes if isinstance(route, APIRoute) and route.path == path and "GET" in route.methods)
+
+def _response_model_bytes(path: str, content) -> bytes:
+    """Тело ответа, которое FastAPI построил бы из content по response_model маршрута"""
+    route = _route(path)
+    value = asyncio.run(serialize_response(field=route.response_field, response_content=content))
+    response_class = route.response_class
+    if isinstance(response_class, DefaultPlaceholder):
+        response_class = response_class.value
+    return response_class(value).body
+
+@pytest.fixture
+def market(db):
+    """Два пользователя с балансами и активными заявками, в том числе
+    частично исполненной и post-only"""
+    async def prepare():
+        await instrument_service.add_instrument(db, Instrument(ticker="RUB", name="Российский рубль"))
+        await instrument_service.add_instrument(db, Instrument(ticker="MEM", name="Memcoin"))
+        seller = await user_service.create_user(db, NewUser(name="seller"))
+        buyer = await user_service.create_user(db, NewUser(name="buyer"))
+        for user in (seller, buyer):
+            await balance_service.deposit(db, user.id, "RUB", 100000)
+            await balance_service.deposit(db, user.id, "MEM", 1000)
+        await order_service.create_order(db, seller.id, LimitOrderBody(direction="SELL", ticker="MEM", qty=10, price=100))
+        await order_service.create_order(db, seller.id, LimitOrderBody(direction="SELL", ticker="MEM", qty=5, price=110))
+        await order_service.create_order(db, buyer.id, LimitOrderBody(direction="BUY", ticker="MEM", qty=4, price=100))
+        await order_service.create_order(db, buyer.id, LimitOrderBody(direction="BUY", ticker="MEM", qty=3, price=90, post_only=True))
+        await order_service.create_order(db, buyer.id, LimitOrderBody(direction="BUY", ticker="MEM", qty=2, price=95))
+        return seller.id, buyer.id
+
+    return asyncio.run(prepare())
+
+@pytest.fixture(params=["database", "memory"])
+def source(request, db, market):
+    """Чтение из БД (стаканы не загружены) и из стаканов в памяти"""
+    if request.param == "memory":
+        asyncio.run(book_service.load_books(db))
+    return request.param
+
+def test_user_orders_json_matches_response_model(db, market, source):
+    for user_id in market:
+        expected = _response_model_bytes("/api/v1/order", asyncio.run(order_service.get_user_orders(db, user_id)))
+        actual = asyncio.run(order_service.get_user_orders_json(db, user_id))
+        assert expected.startswith(b"[{")
+        assert actual == expected
+
+def test_orderbook_json_matches_response_model(db, market, source):
+    for limit in (1, 10):
+        expected = _response_model_bytes(
+            "/api/v1/public/orderbook/{ticker}", asyncio.run(order_service.get_orderbook(db, "MEM", limit))
+        )
+        assert asyncio.run(order_service.get_orderbook_json(db, "MEM", limit)) == expected
+
+def test_user_balances_json_matches_response_model(db, market):
+    for user_id in market:
+        expected = _response_model_bytes("/api/v1/balance", asyncio.run(balance_service.get_user_balances(db, user_id)))
+        assert expected.startswith(b"{\"")
+        assert asyncio.run(balance_service.get_user_balances_json(db, user_id)) == expected
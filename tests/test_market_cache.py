@@ -0,0 +1,54 @@
+"""Условные GET публичных рыночных данных"""
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.schemas.instrument import Instrument
+from app.services import instrument_service, market_cache, order_service
+
+@pytest.fixture
+def instruments(db):
+    for ticker, name in (("RUB", "Российский рубль"), ("MEM", "Memcoin")):
+        asyncio.run(instrument_service.add_instrument(db, Instrument(ticker=ticker, name=name)))
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ('"a-1"', True),
+    ('W/"a-1"', True),
+    ('"b", W/"a-1" , "c"', True),
+    ("*", True),
+    ('"a-10"', False),
+    ('"a-1-msgpack"', False),
+    ('a-1', False),
+])
+def test_etag_matches(header, matches):
+    assert market_cache.etag_matches(header, '"a-1"') is matches
+
+def test_orderbook_conditional_get(client, instruments):
+    response = client.get("/api/v1/public/orderbook/MEM")
+    tag = response.headers["etag"]
+    assert response.status_code == 200
+
+    assert client.get("/api/v1/public/orderbook/MEM", headers={"If-None-Match": f'"other", W/{tag}'}).status_code == 304
+    assert client.get("/api/v1/public/orderbook/MEM", headers={"If-None-Match": "*"}).status_code == 304
+    # ETag, начинающийся с текущего, не считается совпадением
+    assert client.get("/api/v1/public/orderbook/MEM", headers={"If-None-Match": tag[:-1] + '5"'}).status_code == 200
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_orderbook_respects_fast_json_flag(client, instruments, monkeypatch, fast):
+    monkeypatch.setattr(settings, "FAST_JSON_RESPONSES", fast)
+    calls = []
+    for name in ("get_orderbook_json", "get_orderbook_model_json"):
+        original = getattr(order_service, name)
+
+        async def spy(*args, _name=name, _original=original):
+            calls.append(_name)
+            return await _original(*args)
+
+        monkeypatch.setattr(order_service, name, spy)
+
+    market_cache.bump(market_cache.orderbook_resource("MEM"))
+    response = client.get("/api/v1/public/orderbook/MEM")
+    assert response.json() == {"bid_levels": [], "ask_levels": []}
+    assert calls[0] == ("get_orderbook_json" if fast else "get_orderbook_model_json")
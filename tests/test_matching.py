@@ -0,0 +1,191 @@
+"""Обход встречных ордеров при исполнении"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.models.base import SessionLocal
+from app.models.order import Order as OrderModel
+from app.schemas.instrument import Instrument
+from app.schemas.order import AmendOrderBody, LimitOrderBody, OrderStatus
+from app.schemas.user import NewUser
+from app.services import balance_service, instrument_service, order_service, user_service
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+def _user(db, name: str, rub: int = 100000, mem: int = 1000):
+    user = _run(user_service.create_user(db, NewUser(name=name)))
+    _run(balance_service.deposit(db, user.id, "RUB", rub))
+    _run(balance_service.deposit(db, user.id, "MEM", mem))
+    return user.id
+
+def _order(db, user_id, direction: str, qty: int, price: int, **kwargs):
+    body = LimitOrderBody(direction=direction, ticker="MEM", qty=qty, price=price, **kwargs)
+    return _run(order_service.create_order(db, user_id, body)).order_id
+
+@pytest.fixture
+def instruments(db):
+    for ticker, name in (("RUB", "Российский рубль"), ("MEM", "Memcoin")):
+        _run(instrument_service.add_instrument(db, Instrument(ticker=ticker, name=name)))
+
+def test_walk_pages_past_skipped_makers(db, instruments, monkeypatch):
+    monkeypatch.setattr(settings, "MATCH_BATCH_SIZE", 2)
+    broke = _user(db, "broke", mem=5)
+    seller = _user(db, "seller")
+    buyer = _user(db, "buyer")
+
+    # Ордера продавца без средств пропускаются и остаются NEW на нескольких пачках
+    skipped = [_order(db, broke, "SELL", 1, 100) for _ in range(5)]
+    _run(balance_service.withdraw(db, broke, "MEM", 5))
+    first = _order(db, seller, "SELL", 2, 101)
+    second = _order(db, seller, "SELL", 2, 101)
+    third = _order(db, seller, "SELL", 2, 102)
+
+    _order(db, buyer, "BUY", 5, 102)
+
+    statuses = {order.id: order.status for order in db.query(OrderModel)}
+    assert all(statuses[order_id] == OrderStatus.NEW for order_id in skipped)
+    assert statuses[first] == OrderStatus.EXECUTED
+    assert statuses[second] == OrderStatus.EXECUTED
+    assert statuses[third] == OrderStatus.PARTIALLY_EXECUTED
+    assert _run(balance_service.get_user_balances(db, buyer))["MEM"] == 1005
+
+def _trades(db) -> int:
+    from app.models.transaction import Transaction
+    return db.query(Transaction).count()
+
+def test_fok_skips_makers_without_funds(db, instruments):
+    broke = _user(db, "broke", mem=5)
+    seller = _user(db, "seller")
+    buyer = _user(db, "buyer")
+    _order(db, broke, "SELL", 5, 100)
+    _run(balance_service.withdraw(db, broke, "MEM", 5))
+    _order(db, seller, "SELL", 3, 100)
+
+    # Сырой объем стакана 8, но исполнить можно только 3
+    with pytest.raises(HTTPException) as error:
+        _order(db, buyer, "BUY", 5, 100, time_in_force="FOK")
+    assert error.value.status_code == 400
+    assert _trades(db) == 0
+
+    _order(db, buyer, "BUY", 3, 100, time_in_force="FOK")
+    assert _trades(db) == 1
+
+def test_fok_tracks_maker_funds_across_orders(db, instruments):
+    bidder = _user(db, "bidder", rub=400)
+    seller = _user(db, "seller")
+    _order(db, bidder, "BUY", 2, 100)
+    _order(db, bidder, "BUY", 2, 100)
+    _run(balance_service.withdraw(db, bidder, "RUB", 100))
+
+    # Средств покупателя хватает только на первый из его ордеров
+    with pytest.raises(HTTPException):
+        _order(db, seller, "SELL", 4, 100, time_in_force="FOK")
+    assert _trades(db) == 0
+    assert _run(balance_service.get_user_balances(db, bidder))["RUB"] == 300
+
+    _order(db, seller, "SELL", 2, 100, time_in_force="FOK")
+    assert _trades(db) == 1
+
+@pytest.mark.parametrize("mode, accepted", [
+    ("CANCEL_OLDEST", True),
+    ("CANCEL_NEWEST", False),
+    ("DECREMENT_BOTH", False),
+])
+def test_fok_applies_self_trade_prevention(db, instruments, monkeypatch, mode, accepted):
+    monkeypatch.setattr(settings, "SELF_TRADE_PREVENTION", mode)
+    seller = _user(db, "seller")
+    trader = _user(db, "trader")
+    own = _order(db, trader, "SELL", 2, 100)
+    _order(db, seller, "SELL", 2, 101)
+
+    if accepted:
+        order_id = _order(db, trader, "BUY", 2, 101, time_in_force="FOK")
+        assert db.get(OrderModel, order_id).status == OrderStatus.EXECUTED
+        assert db.get(OrderModel, own).status == OrderStatus.CANCELLED
+    else:
+        with pytest.raises(HTTPException):
+            _order(db, trader, "BUY", 2, 101, time_in_force="FOK")
+        assert db.get(OrderModel, own).status == OrderStatus.NEW
+        assert _trades(db) == 0
+
+def _amend(db, user_id, order_id, **changes):
+    body = AmendOrderBody(**changes)
+    return _run(order_service.amend_order(db, order_id, user_id, body)).order_id
+
+def test_amend_reduction_keeps_priority(db, instruments):
+    seller = _user(db, "seller")
+    buyer = _user(db, "buyer")
+    first = _order(db, seller, "SELL", 5, 100)
+    second = _order(db, seller, "SELL", 5, 100)
+    timestamp = db.get(OrderModel, first).timestamp
+
+    # Уменьшение на месте не меняет id и время, ордер остается первым в очереди
+    assert _amend(db, seller, first, qty=3) == first
+    order = db.get(OrderModel, first)
+    assert (order.qty, order.timestamp) == (3, timestamp)
+
+    _order(db, buyer, "BUY", 2, 100)
+    db.expire_all()
+    assert db.get(OrderModel, first).filled == 2
+    assert db.get(OrderModel, second).filled == 0
+
+def test_amend_reduction_below_filled_is_rejected(db, instruments):
+    seller = _user(db, "seller")
+    buyer = _user(db, "buyer")
+    order_id = _order(db, seller, "SELL", 5, 100)
+    partial = _order(db, seller, "SELL", 5, 101)
+    # Исполненный объем задаем напрямую: после сделки ордер уходит из стакана
+    db.get(OrderModel, order_id).filled = 2
+    db.commit()
+
+    for qty in (1, 2):
+        with pytest.raises(HTTPException) as error:
+            _amend(db, seller, order_id, qty=qty)
+        assert error.value.status_code == 400
+    db.expire_all()
+    assert db.get(OrderModel, order_id).qty == 5
+
+    _amend(db, seller, order_id, qty=3)
+    db.expire_all()
+    assert db.get(OrderModel, order_id).qty == 3
+
+    # Частично исполненный ордер изменить нельзя
+    _run(order_service.cancel_order(db, order_id, seller))
+    _order(db, buyer, "BUY", 2, 101)
+    db.expire_all()
+    assert db.get(OrderModel, partial).status == OrderStatus.PARTIALLY_EXECUTED
+    with pytest.raises(HTTPException):
+        _amend(db, seller, partial, qty=3)
+
+def test_amend_price_replaces_atomically(db, instruments, monkeypatch):
+    seller = _user(db, "seller")
+    buyer = _user(db, "buyer")
+    _order(db, seller, "SELL", 3, 105)
+    order_id = _order(db, buyer, "BUY", 3, 100)
+
+    commits = []
+    commit = db.commit
+    monkeypatch.setattr(db, "commit", lambda: commits.append(1) or commit())
+    seen = {}
+
+    def on_created(result):
+        # К моменту ответа отмена и замена уже зафиксированы одним commit
+        seen["commits"] = len(commits)
+        with SessionLocal() as other:
+            seen["old"] = other.get(OrderModel, order_id).status
+            seen["new"] = other.get(OrderModel, result.order_id).status
+
+    body = AmendOrderBody(price=105)
+    replacement = _run(order_service.amend_order(db, order_id, buyer, body, on_created)).order_id
+    assert replacement != order_id
+    assert seen == {"commits": 1, "old": OrderStatus.CANCELLED, "new": OrderStatus.NEW}
+
+    # Новый ордер исполняется против стакана, старый остается отмененным
+    db.expire_all()
+    assert db.get(OrderModel, order_id).status == OrderStatus.CANCELLED
+    assert db.get(OrderModel, replacement).status == OrderStatus.EXECUTED
+    assert _trades(db) == 1
+    assert _run(balance_service.get_user_balances(db, buyer))["MEM"] == 1003
@@ -0,0 +1,125 @@
+"""Согласование формата MessagePack"""
+import asyncio
+import uuid
+
+import msgpack
+import pytest
+from starlette.requests import Request
+
+from app.core.serialization import MSGPACK_MEDIA_TYPE, _MsgpackRequest, _datetime_ns, wants_msgpack
+from app.models.order import Order as OrderModel
+from app.models.transaction import Transaction as TransactionModel
+
+ADMIN = {"Authorization": "TOKEN test"}
+MSGPACK = {"Accept": MSGPACK_MEDIA_TYPE}
+
+def _request(headers: dict, body: bytes = b"") -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    }
+    return Request(scope, receive)
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, False),
+    ("application/json", False),
+    ("*/*", False),
+    ("application/msgpack", True),
+    ("application/x-msgpack", True),
+    ("application/vnd.msgpack", True),
+    ("application/msgpack;q=0", False),
+    ("application/msgpack; q=0.0, */*", False),
+    ("application/json, application/msgpack;q=0.5", False),
+    ("application/json;q=0.5, application/msgpack", True),
+    ("application/msgpack, */*", True),
+    ("application/msgpack;q=0.8, application/*;q=0.9", False),
+    ("application/msgpack;q=abc", False),
+])
+def test_accept_negotiation(accept, expected):
+    headers = {"Accept": accept} if accept is not None else {}
+    assert wants_msgpack(_request(headers)) is expected
+
+def test_request_body_uuid_bin_becomes_string():
+    value = uuid.uuid4()
+    raw = _request({}, msgpack.packb({"id": value.bytes, "qty": 1}))
+    request = _MsgpackRequest(raw.scope, raw.receive)
+    assert asyncio.run(request.body()) == b'{"id":"%s","qty":1}' % str(value).encode()
+
+def _register(client, name: str):
+    """Пользователь с балансами: заголовок авторизации и id"""
+    user = client.post("/api/v1/public/register", json={"name": name}).json()
+    for ticker in ("RUB", "MEM"):
+        client.post("/api/v1/admin/balance/deposit", json={"user_id": user["id"], "ticker": ticker, "amount": 1000}, headers=ADMIN)
+    return {"Authorization": f"TOKEN {user['api_key']}"}, uuid.UUID(user["id"])
+
+def _trade(client):
+    """Сделка между двумя пользователями по цене 100"""
+    for direction, name in (("SELL", "seller"), ("BUY", "buyer")):
+        headers, _ = _register(client, name)
+        client.post("/api/v1/order", json={"direction": direction, "ticker": "MEM", "qty": 1, "price": 100}, headers=headers)
+
+@pytest.fixture
+def trader(client):
+    for ticker, name in (("RUB", "Российский рубль"), ("MEM", "Memcoin")):
+        client.post("/api/v1/admin/instrument", json={"ticker": ticker, "name": name}, headers=ADMIN)
+    return _register(client, "trader")
+
+def test_msgpack_request_body(client, db, trader):
+    headers, user_id = trader
+    body = msgpack.packb({"direction": "BUY", "ticker": "MEM", "qty": 2, "price": 90})
+    response = client.post("/api/v1/order", content=body, headers={**headers, "Content-Type": MSGPACK_MEDIA_TYPE})
+    assert response.status_code == 200
+    order = db.get(OrderModel, uuid.UUID(response.json()["order_id"]))
+    assert (order.user_id, order.qty, order.price) == (user_id, 2, 90)
+
+    # Тело проверяется той же схемой, что и JSON
+    invalid = msgpack.packb({"direction": "BUY", "ticker": "MEM", "qty": 0, "price": 90})
+    assert client.post("/api/v1/order", content=invalid, headers={**headers, "Content-Type": MSGPACK_MEDIA_TYPE}).status_code == 422
+    broken = client.post("/api/v1/order", content=b"\xc1", headers={**headers, "Content-Type": MSGPACK_MEDIA_TYPE})
+    assert broken.status_code == 400
+
+def test_msgpack_orders_use_uuid_bin_and_ns_timestamps(client, db, trader):
+    headers, user_id = trader
+    order_id = uuid.UUID(client.post(
+        "/api/v1/order", json={"direction": "SELL", "ticker": "MEM", "qty": 1, "price": 100}, headers=headers
+    ).json()["order_id"])
+
+    response = client.get("/api/v1/order", headers={**headers, **MSGPACK})
+    assert response.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    [order] = msgpack.unpackb(response.content)
+    assert order["id"] == order_id.bytes
+    assert order["user_id"] == user_id.bytes
+    assert order["timestamp"] == _datetime_ns(db.get(OrderModel, order_id).timestamp)
+    assert order["timestamp"] % 1000 == 0
+
+    # q=0 исключает MessagePack
+    response = client.get("/api/v1/order", headers={**headers, "Accept": "application/msgpack;q=0, */*"})
+    assert response.json()[0]["id"] == str(order_id)
+
+def test_msgpack_transactions_use_ns_timestamps(client, db, trader):
+    _trade(client)
+    [trade] = msgpack.unpackb(client.get("/api/v1/public/transactions/MEM", headers=MSGPACK).content)
+    timestamp = db.query(TransactionModel).one().timestamp
+    assert trade == {"ticker": "MEM", "amount": 1, "price": 100, "timestamp": _datetime_ns(timestamp)}
+
+@pytest.mark.parametrize("path", ["/api/v1/public/orderbook/MEM", "/api/v1/public/transactions/MEM"])
+def test_etag_per_format(client, trader, path):
+    # После сделки чтения рыночных данных идут в основную БД, где есть инструмент
+    _trade(client)
+
+    json_tag = client.get(path).headers["etag"]
+    msgpack_response = client.get(path, headers=MSGPACK)
+    msgpack_tag = msgpack_response.headers["etag"]
+    assert msgpack_response.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert json_tag != msgpack_tag
+
+    # Тег одного формата не подходит к ответу в другом
+    assert client.get(path, headers={**MSGPACK, "If-None-Match": json_tag}).status_code == 200
+    assert client.get(path, headers={"If-None-Match": msgpack_tag}).status_code == 200
+    assert client.get(path, headers={**MSGPACK, "If-None-Match": msgpack_tag}).status_code == 304
+    assert client.get(path, headers={"If-None-Match": json_tag}).status_code == 304
@@ -0,0 +1,105 @@
+"""Лента изменений"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.outbox import OutboxEvent as OutboxEventModel
+from app.schemas.instrument import Instrument
+from app.schemas.order import LimitOrderBody
+from app.schemas.user import NewUser
+from app.services import balance_service, instrument_service, order_service, outbox_service, user_service
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+@pytest.fixture
+def trade(db):
+    """Два пользователя, пополнения и одна сделка"""
+    for ticker, name in (("RUB", "Российский рубль"), ("MEM", "Memcoin")):
+        _run(instrument_service.add_instrument(db, Instrument(ticker=ticker, name=name)))
+    seller = _run(user_service.create_user(db, NewUser(name="seller")))
+    buyer = _run(user_service.create_user(db, NewUser(name="buyer")))
+    _run(balance_service.deposit(db, seller.id, "MEM", 10))
+    _run(balance_service.deposit(db, buyer.id, "RUB", 1000))
+    sell = _run(order_service.create_order(db, seller.id, LimitOrderBody(direction="SELL", ticker="MEM", qty=5, price=100)))
+    buy = _run(order_service.create_order(db, buyer.id, LimitOrderBody(direction="BUY", ticker="MEM", qty=2, price=100)))
+    return seller.id, buyer.id, sell.order_id, buy.order_id
+
+def _all_events(db):
+    return _run(outbox_service.get_events(db, 0, outbox_service.MAX_BATCH_SIZE)).events
+
+def test_events_are_paged_in_order(db, trade):
+    events = _all_events(db)
+    ids = [event.id for event in events]
+    assert ids == sorted(ids)
+
+    paged, after = [], 0
+    while True:
+        batch = _run(outbox_service.get_events(db, after, 3))
+        assert len(batch.events) <= 3
+        if not batch.events:
+            assert batch.next_after == after
+            break
+        paged += batch.events
+        after = batch.next_after
+    assert [event.id for event in paged] == ids
+    assert after == ids[-1]
+
+def test_limit_is_clamped(db, trade):
+    assert len(_run(outbox_service.get_events(db, 0, 0)).events) == 1
+    assert len(_run(outbox_service.get_events(db, 0, 10 ** 6)).events) == len(_all_events(db))
+
+def test_event_payloads(db, trade):
+    seller, buyer, sell, buy = trade
+    events = _all_events(db)
+    types = [event.event_type for event in events]
+    assert types.count(outbox_service.ORDER_CREATED) == 2
+    assert types.count(outbox_service.TRADE) == 1
+
+    created = next(event.payload for event in events if event.event_type == outbox_service.ORDER_CREATED)
+    assert created == {
+        "order_id": str(sell), "user_id": str(seller), "ticker": "MEM", "direction": "SELL",
+        "status": "NEW", "qty": 5, "price": 100, "filled": 0,
+    }
+
+    fill = next(event.payload for event in events if event.event_type == outbox_service.TRADE)
+    assert (fill["buyer_id"], fill["seller_id"]) == (str(buyer), str(seller))
+    assert (fill["taker_order_id"], fill["maker_order_id"]) == (str(buy), str(sell))
+    assert (fill["amount"], fill["price"]) == (2, 100)
+
+    # Каждое изменение баланса несет приращение и итог; сделка меняет четыре баланса
+    changes = [event.payload for event in events if event.event_type == outbox_service.BALANCE_CHANGED]
+    assert [change["reason"] for change in changes].count("trade") == 4
+    buyer_rub = [change for change in changes if change["user_id"] == str(buyer) and change["ticker"] == "RUB"]
+    assert [(change["delta"], change["amount"]) for change in buyer_rub] == [(1000, 1000), (-200, 800)]
+
+def test_prune_events(db, trade):
+    events = _all_events(db)
+    old = [event.id for event in events[:3]]
+    db.query(OutboxEventModel).filter(OutboxEventModel.id.in_(old)).update(
+        {OutboxEventModel.timestamp: datetime.utcnow() - timedelta(days=10)}, synchronize_session=False
+    )
+    db.commit()
+
+    assert _run(outbox_service.prune_events(db, 7)) == 3
+    remaining = _all_events(db)
+    assert [event.id for event in remaining] == [event.id for event in events[3:]]
+    # Курсор потребителя, прошедшего удаленные события, продолжает работать
+    assert _run(outbox_service.get_events(db, old[-1], 100)).events == remaining
+
+def test_admin_feed_reads_off_the_loop(client, trade, monkeypatch):
+    from app.core import offload
+
+    calls = []
+    run_read = offload.run_read
+
+    async def recording_run_read(func, *args):
+        calls.append(func)
+        return await run_read(func, *args)
+
+    monkeypatch.setattr(offload, "run_read", recording_run_read)
+    response = client.get("/api/v1/admin/events", params={"after": 0, "limit": 2}, headers={"Authorization": "TOKEN test"})
+    assert response.status_code == 200
+    assert len(response.json()["events"]) == 2
+    assert calls == [outbox_service.get_events]
@@ -0,0 +1,58 @@
+"""Маршрутизация сессий чтения между основной БД и репликой"""
+import asyncio
+
+from sqlalchemy import insert, select
+
+from app.core.config import settings
+from app.models import base
+from app.models.base import ReadSessionLocal, prefer_primary, read_engine
+from app.models.user import User
+from app.schemas.user import NewUser
+from app.services import user_service
+
+def _create_user(db, name: str) -> User:
+    return asyncio.run(user_service.create_user(db, NewUser(name=name)))
+
+def test_reads_go_to_replica(db):
+    assert read_engine is not base.engine
+    # Строка есть только в реплике
+    with read_engine.begin() as connection:
+        connection.execute(insert(User).values(name="replica", api_key="key-replica"))
+
+    with ReadSessionLocal() as read_db:
+        assert read_db.execute(select(User.name)).scalars().all() == ["replica"]
+        assert read_db.query(User).filter(User.name == "replica").first() is not None
+
+def test_read_your_writes_through_prefer_primary(db):
+    user = _create_user(db, "writer")
+
+    # Реплика еще не получила запись: без переключения пользователь не виден
+    with ReadSessionLocal() as read_db:
+        assert read_db.get(User, user.id) is None
+
+    # create_user отметил запись, prefer_primary направляет чтения в основную БД
+    with ReadSessionLocal() as read_db:
+        read_db = prefer_primary(read_db, user.id)
+        assert read_db.get(User, user.id).name == "writer"
+
+    # Для других ключей чтения по-прежнему идут на реплику
+    with ReadSessionLocal() as read_db:
+        read_db = prefer_primary(read_db, "other")
+        assert read_db.get(User, user.id) is None
+
+def test_read_your_writes_window_expires(db, monkeypatch):
+    monkeypatch.setattr(settings, "REPLICA_READ_YOUR_WRITES_SECONDS", 0.0)
+    user = _create_user(db, "expired")
+
+    with ReadSessionLocal() as read_db:
+        read_db = prefer_primary(read_db, user.id)
+        assert read_db.get(User, user.id) is None
+
+def test_flush_from_read_session_goes_to_primary(db):
+    with ReadSessionLocal() as read_db:
+        read_db.add(User(name="flushed", api_key="key-flushed"))
+        read_db.commit()
+
+    assert db.query(User).filter(User.name == "flushed").first() is not None
+    with read_engine.connect() as connection:
+        assert connection.execute(select(User).where(User.name == "flushed")).first() is None
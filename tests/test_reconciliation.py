@@ -0,0 +1,118 @@
+"""Сверка балансов и ордеров с журналом"""
+import asyncio
+
+import pytest
+
+from app.models.balance import Balance
+from app.models.order import Order as OrderModel
+from app.schemas.instrument import Instrument
+from app.schemas.order import LimitOrderBody
+from app.schemas.user import NewUser
+from app.services import balance_service, instrument_service, order_service, reconciliation_service, user_service
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+@pytest.fixture
+def users(db):
+    """Продавец и покупатель с одной сделкой между ними"""
+    for ticker, name in (("RUB", "Российский рубль"), ("MEM", "Memcoin")):
+        _run(instrument_service.add_instrument(db, Instrument(ticker=ticker, name=name)))
+    seller = _run(user_service.create_user(db, NewUser(name="seller"))).id
+    buyer = _run(user_service.create_user(db, NewUser(name="buyer"))).id
+    _run(balance_service.deposit(db, seller, "MEM", 10))
+    _run(balance_service.deposit(db, buyer, "RUB", 1000))
+    _order(db, seller, "SELL", 2, 100)
+    _order(db, buyer, "BUY", 2, 100)
+    return seller, buyer
+
+def _order(db, user_id, direction: str, qty: int, price: int):
+    body = LimitOrderBody(direction=direction, ticker="MEM", qty=qty, price=price)
+    return _run(order_service.create_order(db, user_id, body)).order_id
+
+def _kinds(report):
+    return sorted({discrepancy.kind for discrepancy in report.discrepancies})
+
+def _tamper_balance(db, user_id, ticker: str, delta: int):
+    """Изменение баланса в обход ленты событий"""
+    db.query(Balance).filter(Balance.user_id == user_id, Balance.ticker == ticker).update(
+        {Balance.amount: Balance.amount + delta}, synchronize_session=False
+    )
+    db.commit()
+
+@pytest.fixture(autouse=True)
+def _discrepancies():
+    reconciliation_service._discrepancies.clear()
+    yield
+    reconciliation_service._discrepancies.clear()
+
+def test_clean_ledger_has_no_discrepancies(db, users):
+    seller, buyer = users
+    _run(reconciliation_service.reconcile(db))
+    _order(db, buyer, "BUY", 3, 90)
+    _run(balance_service.withdraw(db, seller, "RUB", 50))
+    assert _run(reconciliation_service.reconcile(db)) > 0
+
+    report = reconciliation_service.get_report()
+    assert report.discrepancies == []
+    assert report.tracked_orders == 1
+
+def test_seed_detects_balance_written_before_first_run(db, users):
+    seller, _ = users
+    _tamper_balance(db, seller, "RUB", 50)
+
+    # Ожидаемый баланс считается по сделкам и пополнениям, а не берется из таблицы
+    _run(reconciliation_service.reconcile(db))
+    assert _kinds(reconciliation_service.get_report()) == ["balance"]
+    discrepancy = reconciliation_service.get_report().discrepancies[0]
+    assert (discrepancy.subject, discrepancy.expected, discrepancy.actual) == (f"{seller}/RUB", "200", "250")
+
+def test_balance_written_outside_events(db, users):
+    seller, _ = users
+    _run(reconciliation_service.reconcile(db))
+    _tamper_balance(db, seller, "RUB", 50)
+    _run(balance_service.deposit(db, seller, "RUB", 10))
+
+    _run(reconciliation_service.reconcile(db))
+    assert _kinds(reconciliation_service.get_report()) == ["balance", "balance_chain"]
+    assert {(d.expected, d.actual) for d in reconciliation_service.get_report().discrepancies} == {("210", "260")}
+
+def test_partial_fill_without_trade(db, users):
+    _, buyer = users
+    before = _order(db, buyer, "BUY", 5, 90)
+    _run(reconciliation_service.reconcile(db))
+    after = _order(db, buyer, "BUY", 5, 80)
+    _run(reconciliation_service.reconcile(db))
+
+    # Исполнение без сделки у ордеров, созданных и до, и после первого запуска
+    for order_id in (before, after):
+        db.get(OrderModel, order_id).filled = 2
+    db.commit()
+    for order_id in (before, after):
+        _run(order_service.cancel_order(db, order_id, buyer))
+
+    _run(reconciliation_service.reconcile(db))
+    report = reconciliation_service.get_report()
+    assert {(d.kind, d.subject, d.expected, d.actual) for d in report.discrepancies} == {
+        ("order_filled", str(before), "0", "2"),
+        ("order_filled", str(after), "0", "2"),
+    }
+    assert report.tracked_orders == 0
+
+def test_state_survives_restart(db, users):
+    seller, buyer = users
+    order_id = _order(db, buyer, "BUY", 5, 90)
+    _run(reconciliation_service.reconcile(db))
+    watermark = reconciliation_service.get_report().watermark
+
+    # Изменения между остановкой и перезапуском сверяются с сохраненного курсора
+    reconciliation_service.clear()
+    _tamper_balance(db, seller, "MEM", -1)
+    _run(balance_service.deposit(db, seller, "MEM", 1))
+
+    _run(reconciliation_service.reconcile(db))
+    report = reconciliation_service.get_report()
+    assert report.watermark > watermark
+    assert report.tracked_orders == 1
+    assert _kinds(report) == ["balance", "balance_chain"]
+    assert reconciliation_service._expected_filled == {str(order_id): 0}
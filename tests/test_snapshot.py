@@ -0,0 +1,118 @@
+"""Снимки стаканов и догон по ленте событий"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.order import Order as OrderModel, OrderArchive
+from app.models.outbox import OutboxEvent
+from app.schemas.instrument import Instrument
+from app.schemas.order import Direction, LimitOrderBody, OrderStatus, TimeInForce
+from app.schemas.user import NewUser
+from app.services import (
+    archive_service, balance_service, book_service, instrument_service, order_service, snapshot_service, user_service
+)
+from app.services.book_service import BookOrder
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+def _fields(entry: BookOrder) -> tuple:
+    return tuple(getattr(entry, name) for name in BookOrder.__slots__)
+
+def test_encode_decode_round_trip():
+    user = uuid.uuid4()
+    aware = datetime(2026, 10, 19, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    entries = [
+        BookOrder(uuid.uuid4(), user, "MEM", Direction.BUY, 100, 5, 2, aware, TimeInForce.GTC, True),
+        BookOrder(uuid.uuid4(), user, "MEM", Direction.SELL, 110, 3, 0, aware.replace(tzinfo=None)),
+        BookOrder(uuid.uuid4(), uuid.uuid4(), "ЮНИ", Direction.SELL, None, 7, 0, aware, TimeInForce.IOC, False),
+    ]
+    created_at = datetime(2026, 10, 19, 13, 0, tzinfo=timezone.utc)
+
+    seq, decoded_at, decoded = snapshot_service.decode(snapshot_service.encode(42, entries, created_at))
+    assert (seq, decoded_at) == (42, created_at)
+    assert [_fields(entry) for entry in decoded] == [_fields(entry) for entry in entries]
+    # Время без часового пояса в стаканах считается UTC
+    assert all(entry.timestamp == aware and entry.timestamp.tzinfo is not None for entry in decoded)
+
+@pytest.mark.parametrize("damage", [
+    lambda data: data[:-1],
+    lambda data: data[:10],
+    lambda data: data[:20] + bytes([data[20] ^ 1]) + data[21:],
+    lambda data: b"X" + data[1:],
+])
+def test_decode_rejects_damaged_snapshot(damage):
+    entry = BookOrder(uuid.uuid4(), uuid.uuid4(), "MEM", Direction.BUY, 100, 5, 0, datetime.now(timezone.utc))
+    data = snapshot_service.encode(1, [entry], datetime.now(timezone.utc))
+    with pytest.raises(ValueError):
+        snapshot_service.decode(damage(data))
+
+@pytest.fixture
+def market(db):
+    for ticker, name in (("RUB", "Российский рубль"), ("MEM", "Memcoin")):
+        _run(instrument_service.add_instrument(db, Instrument(ticker=ticker, name=name)))
+    users = []
+    for name in ("maker", "taker"):
+        user = _run(user_service.create_user(db, NewUser(name=name)))
+        _run(balance_service.deposit(db, user.id, "RUB", 100000))
+        _run(balance_service.deposit(db, user.id, "MEM", 1000))
+        users.append(user.id)
+    _run(book_service.load_books(db))
+    return users
+
+def _order(db, user_id, direction: str, qty: int, price: int):
+    body = LimitOrderBody(direction=direction, ticker="MEM", qty=qty, price=price)
+    return _run(order_service.create_order(db, user_id, body)).order_id
+
+def test_restore_catches_up_after_snapshot(db, market, tmp_path):
+    maker, taker = market
+    kept = _order(db, maker, "SELL", 5, 120)
+    filled = _order(db, maker, "SELL", 2, 100)
+    partial = _order(db, maker, "SELL", 4, 101)
+    cancelled = _order(db, maker, "BUY", 3, 90)
+    archived = _order(db, maker, "BUY", 3, 80)
+    path = str(tmp_path / "books.snap")
+    _run(snapshot_service.take_snapshot(db, path))
+
+    # Изменения после курсора снимка: новые, исполненные, отмененные и архивные ордера
+    created = _order(db, maker, "BUY", 1, 85)
+    _order(db, taker, "BUY", 3, 101)
+    _run(order_service.cancel_order(db, cancelled, maker))
+    _run(order_service.cancel_order(db, archived, maker))
+    db.query(OrderModel).filter(OrderModel.id == archived).update(
+        {OrderModel.updated_at: datetime.utcnow() - timedelta(days=2)}, synchronize_session=False
+    )
+    db.commit()
+    assert _run(archive_service.archive_orders(db, retention_days=1)) == 1
+    assert db.query(OrderArchive).filter(OrderArchive.id == archived).count() == 1
+
+    book_service.clear()
+    assert _run(snapshot_service.restore(db, path))
+    assert book_service.is_ready()
+
+    statuses = {order_id: db.get(OrderModel, order_id).status for order_id in (kept, filled, partial, cancelled)}
+    assert statuses == {
+        kept: OrderStatus.NEW, filled: OrderStatus.EXECUTED,
+        partial: OrderStatus.PARTIALLY_EXECUTED, cancelled: OrderStatus.CANCELLED,
+    }
+    assert {entry.id for entry in book_service.export_orders()} == {kept, created}
+    assert book_service.get_levels("MEM") == book_service.get_db_levels(db, "MEM")
+
+    # Заявки из снимка и прочитанные при догоне сравнимы по времени
+    orders = _run(order_service.get_user_orders(db, maker))
+    assert [order.id for order in orders] == [kept, created]
+    assert snapshot_service.metrics()["restore"]["changed_orders"] == 6
+
+def test_restore_falls_back_when_outbox_is_pruned(db, market, tmp_path):
+    maker, _ = market
+    _order(db, maker, "SELL", 5, 120)
+    path = str(tmp_path / "books.snap")
+    _run(snapshot_service.take_snapshot(db, path))
+
+    db.query(OutboxEvent).delete()
+    db.commit()
+    book_service.clear()
+    assert not _run(snapshot_service.restore(db, path))
+    assert not _run(snapshot_service.restore(db, str(tmp_path / "missing.snap")))
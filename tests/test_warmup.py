@@ -0,0 +1,94 @@
+"""Работа сервиса во время прогрева"""
+import asyncio
+import threading
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import startup
+from app.main import app
+from app.schemas.instrument import Instrument
+from app.schemas.order import LimitOrderBody
+from app.schemas.user import NewUser
+from app.services import balance_service, book_service, instrument_service, order_service, ticker_service, user_service
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+@contextmanager
+def _loading_books():
+    """Блокировка стаканов занята другим потоком, как во время загрузки.
+    Если код внутри блока ждет блокировку, поток отпускает ее по таймауту и тест падает."""
+    acquired, release = threading.Event(), threading.Event()
+    timed_out = []
+
+    def hold():
+        with book_service.exclusive():
+            acquired.set()
+            if not release.wait(5):
+                timed_out.append(True)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    acquired.wait(5)
+    try:
+        yield
+    finally:
+        release.set()
+        thread.join()
+    assert not timed_out, "book lock was awaited during warm-up"
+
+@pytest.fixture
+def market(db, monkeypatch):
+    """Инструменты, пользователь и по одному ордеру на покупку и продажу без сделок"""
+    monkeypatch.setattr(ticker_service, "_stats", {})
+    for ticker, name in (("RUB", "Российский рубль"), ("MEM", "Memcoin")):
+        _run(instrument_service.add_instrument(db, Instrument(ticker=ticker, name=name)))
+    user = _run(user_service.create_user(db, NewUser(name="trader")))
+    _run(balance_service.deposit(db, user.id, "RUB", 1000))
+    _run(balance_service.deposit(db, user.id, "MEM", 10))
+    for direction, price in (("BUY", 90), ("SELL", 110)):
+        body = LimitOrderBody(direction=direction, ticker="MEM", qty=1, price=price)
+        _run(order_service.create_order(db, user.id, body))
+    book_service.clear()
+    return user
+
+def test_order_changes_rejected_until_ready(db, market, monkeypatch):
+    monkeypatch.setattr(startup, "_ready", False)
+    client = TestClient(app)
+    headers = {"Authorization": f"TOKEN {market.api_key}"}
+    body = {"direction": "BUY", "ticker": "MEM", "qty": 1, "price": 100}
+
+    with _loading_books():
+        # Проба готовности не ждет блокировку стаканов
+        assert client.get("/health/ready").status_code == 503
+        response = client.post("/api/v1/order", json=body, headers=headers)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+    monkeypatch.setattr(startup, "_ready", True)
+    assert client.post("/api/v1/order", json=body, headers=headers).status_code == 200
+
+def test_tickers_read_best_prices_from_db_while_loading(db, market):
+    with _loading_books():
+        tickers = {ticker.ticker: ticker for ticker in _run(ticker_service.get_tickers(db))}
+        assert (tickers["MEM"].best_bid, tickers["MEM"].best_ask) == (90, 110)
+        assert ticker_service.mark_price("MEM") is None
+
+    _run(book_service.load_books(db))
+    assert ticker_service.mark_price("MEM") == 100
+
+def test_load_stats_replaces_window(db, market):
+    seller = _run(user_service.create_user(db, NewUser(name="seller")))
+    _run(balance_service.deposit(db, seller.id, "MEM", 10))
+    _run(book_service.load_books(db))
+    _run(order_service.create_order(db, seller.id, LimitOrderBody(direction="SELL", ticker="MEM", qty=1, price=90)))
+
+    # Повторная загрузка заменяет окно, а не добавляет сделки к уже учтенным
+    previous = ticker_service._stats
+    for _ in range(2):
+        _run(ticker_service.load_stats(db))
+    assert ticker_service._stats is not previous
+    tickers = {ticker.ticker: ticker for ticker in _run(ticker_service.get_tickers(db))}
+    assert (tickers["MEM"].last_price, tickers["MEM"].volume_24h) == (90, 1)